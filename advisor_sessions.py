@@ -0,0 +1,341 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from collections import OrderedDict, deque
+
+from gemini_advisor_service import (
+    start_advisor_chat, stream_advisor_chunks, compact_history, estimate_prompt_tokens,
+    ADVISOR_MOCK_RESPONSE, ADVISOR_ERROR_RESPONSE, ADVISOR_INTERRUPTED_NOTICE,
+)
+from answer_cache import normalize_question
+from db_pool import tune_connection
+
+ADVISOR_SESSION_TTL = int(os.getenv('ADVISOR_SESSION_TTL', 1800)) # Idle seconds before a session leaves memory (its transcript stays in SQLite)
+ADVISOR_MAX_SESSIONS = int(os.getenv('ADVISOR_MAX_SESSIONS', 200)) # Sessions kept in memory per worker
+ADVISOR_SESSION_MEMORY_MB = float(os.getenv('ADVISOR_SESSION_MEMORY_MB', 32)) # Approximate transcript memory per worker
+ADVISOR_TRANSCRIPT_RETENTION_DAYS = int(os.getenv('ADVISOR_TRANSCRIPT_RETENTION_DAYS', 30))
+ADVISOR_METRICS_WINDOW = 200 # Recent turns kept per worker for prompt size and latency stats
+
+class AdvisorSessionNotFound(Exception):
+    """Raised when a session id is unknown or belongs to another user."""
+
+def init_advisor_sessions_schema(conn):
+    """Transcripts live in the database, so a session can be resumed by any worker or after a restart."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS advisor_sessions (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            user_context TEXT, -- JSON, sent to the model as the conversation preamble
+            message_count INTEGER NOT NULL DEFAULT 0,
+            summary TEXT, -- Running summary of messages compacted out of the prompt
+            summary_covered INTEGER NOT NULL DEFAULT 0, -- How many leading messages the summary covers
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS advisor_messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            role TEXT NOT NULL, -- user, model
+            text TEXT NOT NULL,
+            prompt_tokens INTEGER, -- Estimated prompt size of the turn (model messages only)
+            latency_ms REAL, -- Time to the complete reply (model messages only)
+            created_at REAL NOT NULL,
+            FOREIGN KEY (session_id) REFERENCES advisor_sessions (id)
+        )
+    ''')
+    # Columns added after the tables were introduced
+    session_columns = {row[1] for row in conn.execute('PRAGMA table_info(advisor_sessions)')}
+    if 'summary' not in session_columns:
+        conn.execute('ALTER TABLE advisor_sessions ADD COLUMN summary TEXT')
+        conn.execute('ALTER TABLE advisor_sessions ADD COLUMN summary_covered INTEGER NOT NULL DEFAULT 0')
+    message_columns = {row[1] for row in conn.execute('PRAGMA table_info(advisor_messages)')}
+    if 'prompt_tokens' not in message_columns:
+        conn.execute('ALTER TABLE advisor_messages ADD COLUMN prompt_tokens INTEGER')
+        conn.execute('ALTER TABLE advisor_messages ADD COLUMN latency_ms REAL')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_advisor_messages_session ON advisor_messages (session_id, id)')
+    conn.commit()
+
+class _Session:
+    """An advisor conversation held in memory: its transcript and the live Gemini chat."""
+
+    def __init__(self, session_id, user_id, user_context, messages, summary=None, summary_covered=0):
+        self.id = session_id
+        self.user_id = user_id
+        self.user_context = user_context
+        self.messages = messages # [{'role': 'user' | 'model', 'text': ...}]
+        self.summary = summary # messages[:summary_covered] are only sent to Gemini as this summary
+        self.summary_covered = summary_covered
+        self.chat = None # Started lazily; None again after a failed turn so it is rebuilt from messages
+        self.lock = threading.Lock() # One turn at a time per session
+        self.last_used = time.time()
+        self.size = sum(_message_size(message) for message in messages)
+
+def _message_size(message):
+    # The text is held twice: in our transcript and in the Gemini chat history
+    return 2 * len(message['text'].encode('utf-8'))
+
+class AdvisorSessionStore:
+    """
+    Advisor chat sessions keyed by session id. Each worker keeps recently used sessions (with
+    their Gemini chat objects) in an LRU bounded by ADVISOR_MAX_SESSIONS, ADVISOR_SESSION_TTL and
+    ADVISOR_SESSION_MEMORY_MB; every completed turn is also written to SQLite, and a session that
+    isn't in memory (evicted, restarted or served by another worker) is rebuilt from there.
+    """
+
+    def __init__(self, database, ttl_seconds=ADVISOR_SESSION_TTL, max_sessions=ADVISOR_MAX_SESSIONS,
+                 max_bytes=int(ADVISOR_SESSION_MEMORY_MB * 1024 * 1024), answer_cache=None):
+        self.database = database
+        self.answer_cache = answer_cache # Optional AnswerCache for first-turn replies
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+        self._bytes = 0
+        self._evictions = 0
+        self._loads = 0
+        self._turn_metrics = deque(maxlen=ADVISOR_METRICS_WINDOW)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.database, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return tune_connection(conn)
+
+    def _evict(self, now):
+        """Drops idle sessions, then the least recently used ones while over the count or memory cap. Holds self._lock."""
+        for session_id in [sid for sid, s in self._sessions.items() if now - s.last_used > self.ttl_seconds]:
+            self._drop(session_id)
+        while self._sessions and (len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes):
+            self._drop(next(iter(self._sessions)))
+
+    def _drop(self, session_id):
+        session = self._sessions.pop(session_id)
+        self._bytes -= session.size
+        self._evictions += 1
+
+    def create(self, user_id, user_context=None):
+        """Starts a new session for a user and returns its id."""
+        session_id = uuid.uuid4().hex
+        now = time.time()
+        conn = self._connect()
+        try:
+            # Old transcripts are pruned here rather than on a schedule
+            cutoff = now - ADVISOR_TRANSCRIPT_RETENTION_DAYS * 86400
+            conn.execute(
+                'DELETE FROM advisor_messages WHERE session_id IN (SELECT id FROM advisor_sessions WHERE updated_at < ?)',
+                (cutoff,)
+            )
+            conn.execute('DELETE FROM advisor_sessions WHERE updated_at < ?', (cutoff,))
+            conn.execute(
+                'INSERT INTO advisor_sessions (id, user_id, user_context, created_at, updated_at) VALUES (?, ?, ?, ?, ?)',
+                (session_id, user_id, json.dumps(user_context or {}), now, now)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+        session = _Session(session_id, user_id, user_context or {}, [])
+        with self._lock:
+            self._sessions[session_id] = session
+            self._evict(now)
+        return session_id
+
+    def open(self, session_id, user_id):
+        """
+        Returns the in-memory session, reloading it from SQLite if it isn't cached here or another
+        worker has added turns since. Raises AdvisorSessionNotFound for unknown or foreign ids.
+        """
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                'SELECT user_context, message_count, summary, summary_covered FROM advisor_sessions '
+                'WHERE id = ? AND user_id = ?',
+                (session_id, user_id)
+            ).fetchone()
+            if row is None:
+                raise AdvisorSessionNotFound(session_id)
+
+            now = time.time()
+            with self._lock:
+                session = self._sessions.get(session_id)
+                if session is not None and len(session.messages) == row['message_count']:
+                    session.last_used = now
+                    self._sessions.move_to_end(session_id)
+                    return session
+
+            messages = [
+                {'role': message['role'], 'text': message['text']}
+                for message in conn.execute(
+                    'SELECT role, text FROM advisor_messages WHERE session_id = ? ORDER BY id', (session_id,)
+                )
+            ]
+        finally:
+            conn.close()
+
+        session = _Session(session_id, user_id, json.loads(row['user_context'] or '{}'), messages,
+                           row['summary'], row['summary_covered'])
+        with self._lock:
+            previous = self._sessions.pop(session_id, None)
+            if previous is not None:
+                self._bytes -= previous.size
+            self._sessions[session_id] = session
+            self._bytes += session.size
+            self._loads += 1
+            self._evict(now)
+        return session
+
+    def transcript(self, session_id, user_id):
+        """Returns the messages of a user's session."""
+        return list(self.open(session_id, user_id).messages)
+
+    def _record_turn(self, session, user_message, reply, metrics):
+        """Appends a completed turn to the session and to its SQLite transcript, along with the current summary."""
+        now = time.time()
+        turn = [{'role': 'user', 'text': user_message}, {'role': 'model', 'text': reply}]
+        conn = self._connect()
+        try:
+            conn.executemany(
+                'INSERT INTO advisor_messages (session_id, role, text, prompt_tokens, latency_ms, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                [
+                    (session.id, 'user', user_message, None, None, now),
+                    (session.id, 'model', reply, metrics['prompt_tokens_est'], metrics['latency_ms'], now),
+                ]
+            )
+            conn.execute(
+                'UPDATE advisor_sessions SET message_count = message_count + ?, summary = ?, summary_covered = ?, '
+                'updated_at = ? WHERE id = ?',
+                (len(turn), session.summary, session.summary_covered, now, session.id)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+        added = sum(_message_size(message) for message in turn)
+        with self._lock:
+            session.messages.extend(turn)
+            session.size += added
+            session.last_used = now
+            if self._sessions.get(session.id) is session:
+                self._bytes += added
+                self._evict(now)
+
+    def _chat(self, session):
+        # Older turns are compacted into the summary once the history budget is exceeded; the chat
+        # is then restarted with the summary and the recent turns only
+        summary, covered = compact_history(session.messages, session.summary, session.summary_covered)
+        if covered != session.summary_covered:
+            session.summary, session.summary_covered = summary, covered
+            session.chat = None
+        if session.chat is None:
+            session.chat = start_advisor_chat(session.messages[covered:], session.user_context, summary)
+        return session.chat
+
+    def send(self, session, user_message, metrics=None):
+        """Runs one turn and returns the full reply."""
+        return ''.join(self.stream(session, user_message, metrics))
+
+    def stream(self, session, user_message, metrics=None):
+        """
+        Runs one turn, yielding the reply in chunks as it is generated. Only the new message is sent
+        to Gemini; earlier turns are already in the session's chat. The turn is stored once the reply
+        is complete. A failed turn is not stored and the chat is rebuilt from the transcript next time.
+        If a metrics dict is given it is filled with the turn's estimated prompt size and latencies.
+        """
+        metrics = {} if metrics is None else metrics
+        with session.lock:
+            parts = []
+            started = time.perf_counter()
+            try:
+                chat = self._chat(session)
+                metrics.update({
+                    "prompt_tokens_est": estimate_prompt_tokens(
+                        session.messages[session.summary_covered:], session.user_context, session.summary, user_message
+                    ),
+                    "history_messages": len(session.messages) - session.summary_covered,
+                    "summarized_messages": session.summary_covered,
+                })
+                # First turns don't depend on earlier messages, so common questions (e.g. the suggested
+                # ones) can be answered from the shared cache within the user's context bucket
+                cache_first_turn = chat is not None and self.answer_cache is not None and not session.messages
+                cached = None
+                if cache_first_turn:
+                    cached, match, similarity = self.answer_cache.get(user_message, context_bucket(session.user_context))
+                    metrics["answer_cache"] = match or "miss"
+                    if cached is not None:
+                        metrics["answer_cache_similarity"] = similarity
+
+                if chat is None:
+                    parts.append(ADVISOR_MOCK_RESPONSE)
+                    yield ADVISOR_MOCK_RESPONSE
+                elif cached is not None:
+                    session.chat = None # Rebuilt from the transcript, which will include this turn
+                    metrics["first_chunk_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                    parts.append(cached)
+                    yield cached
+                else:
+                    for text in stream_advisor_chunks(chat, user_message):
+                        if not parts:
+                            metrics["first_chunk_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                        parts.append(text)
+                        yield text
+                    if cache_first_turn and _is_shareable(''.join(parts), session.user_context):
+                        self.answer_cache.set(user_message, context_bucket(session.user_context), ''.join(parts))
+            except GeneratorExit:
+                session.chat = None # The client went away mid-reply; the chat's history is incomplete
+                raise
+            except Exception as e:
+                print(f"Error during Gemini Advisor API call for session {session.id}: {e}.")
+                session.chat = None
+                yield ADVISOR_INTERRUPTED_NOTICE if parts else ADVISOR_ERROR_RESPONSE
+                return
+            metrics["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            self._record_turn(session, user_message, ''.join(parts), metrics)
+            with self._lock:
+                self._turn_metrics.append((metrics["prompt_tokens_est"], metrics["latency_ms"]))
+
+    def stats(self):
+        """
+        In-memory session count, approximate bytes held, evictions and reloads from SQLite for this
+        worker, plus prompt size and latency over its last ADVISOR_METRICS_WINDOW turns.
+        """
+        with self._lock:
+            prompt_sizes = sorted(tokens for tokens, _ in self._turn_metrics)
+            latencies = sorted(latency for _, latency in self._turn_metrics)
+            return {
+                "recent_turns": len(latencies),
+                "prompt_tokens_est_p50": _percentile(prompt_sizes, 50),
+                "prompt_tokens_est_max": prompt_sizes[-1] if prompt_sizes else None,
+                "latency_ms_p50": _percentile(latencies, 50),
+                "latency_ms_p95": _percentile(latencies, 95),
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "approx_bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self._evictions,
+                "loads_from_db": self._loads,
+            }
+
+def context_bucket(user_context):
+    """Coarse user context that cached first-turn answers are shared within: industry and risk level."""
+    industry = normalize_question(user_context.get('industry') or '') or 'any'
+    return f"{industry}|{(user_context.get('risk_level') or 'any').lower()}"
+
+def _is_shareable(answer, user_context):
+    """A reply that mentions the user's name, company or email must not be served to other users."""
+    lowered = answer.lower()
+    return not any(
+        value and len(str(value)) >= 3 and str(value).lower() in lowered
+        for value in (user_context.get(key) for key in ('first_name', 'last_name', 'company', 'email'))
+    )
+
+def _percentile(sorted_values, percent):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, len(sorted_values) * percent // 100)]
@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+AI_CACHE_PATH = os.getenv('AI_CACHE_PATH', 'ai_cache.db')
+LAST_ACCESS_RESOLUTION = 60 # Seconds; LRU order is tracked at this granularity to avoid a write on every hit
+
+def make_cache_key(*parts):
+    """Content-addressed key: SHA-256 of the JSON encoding of the given parts."""
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class PersistentCache:
+    """
+    A JSON value cache stored in SQLite, so every gunicorn worker shares it. Entries expire after
+    ttl_seconds and the least recently used ones are evicted beyond max_entries. Hit and miss
+    counters are kept in the same database.
+    """
+
+    def __init__(self, namespace, ttl_seconds, max_entries, path=AI_CACHE_PATH):
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.path = path
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute('PRAGMA journal_mode=WAL') # Readers don't block the (rare) writers
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL, -- JSON
+                created_at REAL NOT NULL,
+                last_accessed REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_cache_entries_lru ON cache_entries (namespace, last_accessed)')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS cache_stats (
+                namespace TEXT PRIMARY KEY,
+                hits INTEGER NOT NULL DEFAULT 0,
+                misses INTEGER NOT NULL DEFAULT 0,
+                evictions INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        conn.execute('INSERT OR IGNORE INTO cache_stats (namespace) VALUES (?)', (namespace,))
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            self._local.conn = conn
+        return conn
+
+    def _count(self, conn, column, amount=1):
+        conn.execute(f'UPDATE cache_stats SET {column} = {column} + ? WHERE namespace = ?', (amount, self.namespace))
+
+    def get(self, key, newer_than=None, record_stats=True):
+        """
+        Returns the cached value for key, or None on a miss or an expired entry. With newer_than,
+        entries created before that timestamp count as misses. record_stats=False leaves the
+        hit/miss counters alone (for internal polling).
+        """
+        now = time.time()
+        conn = self._connection()
+        try:
+            row = conn.execute(
+                'SELECT value, created_at, last_accessed FROM cache_entries WHERE namespace = ? AND key = ?',
+                (self.namespace, key)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds or (newer_than is not None and row[1] < newer_than):
+                if row is not None and now - row[1] > self.ttl_seconds:
+                    conn.execute('DELETE FROM cache_entries WHERE namespace = ? AND key = ?', (self.namespace, key))
+                if record_stats:
+                    self._count(conn, 'misses')
+                conn.commit()
+                return None
+            if now - row[2] > LAST_ACCESS_RESOLUTION:
+                conn.execute(
+                    'UPDATE cache_entries SET last_accessed = ? WHERE namespace = ? AND key = ?',
+                    (now, self.namespace, key)
+                )
+            if record_stats:
+                self._count(conn, 'hits')
+            conn.commit()
+            return json.loads(row[0])
+        except sqlite3.Error as e:
+            conn.rollback()
+            print(f"AI cache read error ({self.namespace}): {e}")
+            return None
+
+    def set(self, key, value):
+        """Stores a JSON-serializable value and evicts the least recently used entries over max_entries."""
+        now = time.time()
+        conn = self._connection()
+        try:
+            conn.execute(
+                'INSERT OR REPLACE INTO cache_entries (namespace, key, value, created_at, last_accessed) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (self.namespace, key, json.dumps(value), now, now)
+            )
+            # Expired entries go first, then the least recently used ones beyond the size bound
+            evicted = conn.execute(
+                'DELETE FROM cache_entries WHERE namespace = ? AND created_at < ?',
+                (self.namespace, now - self.ttl_seconds)
+            ).rowcount
+            excess = conn.execute(
+                'SELECT COUNT(*) FROM cache_entries WHERE namespace = ?', (self.namespace,)
+            ).fetchone()[0] - self.max_entries
+            if excess > 0:
+                evicted += conn.execute(
+                    'DELETE FROM cache_entries WHERE rowid IN ('
+                    'SELECT rowid FROM cache_entries WHERE namespace = ? ORDER BY last_accessed ASC LIMIT ?)',
+                    (self.namespace, excess)
+                ).rowcount
+            if evicted:
+                self._count(conn, 'evictions', evicted)
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            print(f"AI cache write error ({self.namespace}): {e}")
+
+    def delete(self, key):
+        conn = self._connection()
+        try:
+            conn.execute('DELETE FROM cache_entries WHERE namespace = ? AND key = ?', (self.namespace, key))
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            print(f"AI cache delete error ({self.namespace}): {e}")
+
+    def stats(self):
+        """Returns entry count, hits, misses, evictions and hit rate for this namespace."""
+        conn = self._connection()
+        hits, misses, evictions = conn.execute(
+            'SELECT hits, misses, evictions FROM cache_stats WHERE namespace = ?', (self.namespace,)
+        ).fetchone()
+        entries = conn.execute(
+            'SELECT COUNT(*) FROM cache_entries WHERE namespace = ?', (self.namespace,)
+        ).fetchone()[0]
+        lookups = hits + misses
+        return {
+            "namespace": self.namespace,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": hits,
+            "misses": misses,
+            "evictions": evictions,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,257 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+
+from ai_cache import AI_CACHE_PATH, make_cache_key
+
+ANSWER_CACHE_SIMILARITY = float(os.getenv('ADVISOR_ANSWER_CACHE_SIMILARITY', 0.9)) # Estimated Jaccard similarity for a near-duplicate hit; above 1 disables them
+ANSWER_CACHE_TTL = int(os.getenv('ADVISOR_ANSWER_CACHE_TTL', 7 * 24 * 3600))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv('ADVISOR_ANSWER_CACHE_MAX_ENTRIES', 5000))
+SHINGLE_SIZE = 4 # Characters per shingle; short questions need character rather than word shingles
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16 # 16 bands of 4 rows: pairs above ~0.6 similarity almost always share a band
+
+_MERSENNE_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20250101) # Fixed seed: signatures must agree across workers and restarts
+_PERM_A = _rng.integers(1, _MERSENNE_PRIME, MINHASH_PERMUTATIONS, dtype=np.uint64)
+_PERM_B = _rng.integers(0, _MERSENNE_PRIME, MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+# Words that change an answer the way a digit does ("year one" vs "year two", "5 lakh" vs "5 crore")
+NUMBER_WORDS = frozenset((
+    "zero one two three four five six seven eight nine ten eleven twelve twenty thirty forty fifty "
+    "hundred thousand lakh lakhs crore crores million billion first second third fourth fifth half quarter"
+).split())
+
+def normalize_question(text):
+    """Lowercases, drops punctuation and collapses whitespace, so trivial variations compare equal."""
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+def numeric_tokens(normalized_text):
+    """The numbers and number words in a normalized question, in order."""
+    return [token for token in normalized_text.split() if token.isdigit() or token in NUMBER_WORDS]
+
+def minhash_signature(normalized_text):
+    """MinHash signature (MINHASH_PERMUTATIONS uint32 values) of the text's character shingles."""
+    padded = f" {normalized_text} "
+    shingles = {padded[i:i + SHINGLE_SIZE] for i in range(max(1, len(padded) - SHINGLE_SIZE + 1))}
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=4).digest(), 'little') for s in shingles],
+        dtype=np.uint64
+    )
+    # (a * x + b) mod p stays below 2**63 for x < 2**32 and a < 2**31, so uint64 doesn't overflow
+    permuted = (np.outer(_PERM_A, hashes) + _PERM_B[:, None]) % _MERSENNE_PRIME
+    return permuted.min(axis=1).astype(np.uint32)
+
+def signature_similarity(a, b):
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    return float(np.mean(a == b))
+
+def _band_keys(bucket, signature):
+    rows = MINHASH_PERMUTATIONS // LSH_BANDS
+    return [
+        f"{bucket}:{band}:{hashlib.blake2b(signature[band * rows:(band + 1) * rows].tobytes(), digest_size=8).hexdigest()}"
+        for band in range(LSH_BANDS)
+    ]
+
+class AnswerCache:
+    """
+    Caches answers to questions within a context bucket, stored in SQLite so all workers share it.
+    A lookup first tries the normalized question exactly, then near-duplicate phrasings: MinHash
+    signatures are indexed by LSH band, and the most similar candidate at or above
+    similarity_threshold whose numbers match the question's (see numeric_tokens) is returned.
+    Questions differing only in a figure look alike to MinHash but need different answers.
+    Entries expire after ttl_seconds and the least recently used ones are evicted beyond
+    max_entries. Hits, near hits, misses and evictions are counted per bucket.
+    """
+
+    def __init__(self, namespace, similarity_threshold=ANSWER_CACHE_SIMILARITY, ttl_seconds=ANSWER_CACHE_TTL,
+                 max_entries=ANSWER_CACHE_MAX_ENTRIES, path=AI_CACHE_PATH):
+        self.namespace = namespace
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.path = path
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS answer_cache_entries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                namespace TEXT NOT NULL,
+                bucket TEXT NOT NULL,
+                question_key TEXT NOT NULL, -- Hash of namespace, bucket and normalized question
+                question TEXT NOT NULL, -- Normalized question
+                signature BLOB NOT NULL, -- MinHash signature, uint32 values
+                answer TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_accessed REAL NOT NULL,
+                UNIQUE (question_key)
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_answer_cache_lru ON answer_cache_entries (namespace, last_accessed)')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS answer_cache_bands (
+                band_key TEXT NOT NULL, -- bucket, band number and hash of that band's rows
+                entry_id INTEGER NOT NULL,
+                PRIMARY KEY (band_key, entry_id)
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_answer_cache_bands_entry ON answer_cache_bands (entry_id)')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS answer_cache_stats (
+                namespace TEXT NOT NULL,
+                bucket TEXT NOT NULL,
+                exact_hits INTEGER NOT NULL DEFAULT 0,
+                near_hits INTEGER NOT NULL DEFAULT 0,
+                misses INTEGER NOT NULL DEFAULT 0,
+                evictions INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (namespace, bucket)
+            )
+        ''')
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _count(self, conn, bucket, column, amount=1):
+        conn.execute('INSERT OR IGNORE INTO answer_cache_stats (namespace, bucket) VALUES (?, ?)', (self.namespace, bucket))
+        conn.execute(
+            f'UPDATE answer_cache_stats SET {column} = {column} + ? WHERE namespace = ? AND bucket = ?',
+            (amount, self.namespace, bucket)
+        )
+
+    def _question_key(self, bucket, normalized):
+        return make_cache_key(self.namespace, bucket, normalized)
+
+    def _delete_entries(self, conn, entry_ids):
+        conn.executemany('DELETE FROM answer_cache_bands WHERE entry_id = ?', [(i,) for i in entry_ids])
+        conn.executemany('DELETE FROM answer_cache_entries WHERE id = ?', [(i,) for i in entry_ids])
+
+    def get(self, question, bucket):
+        """
+        Returns (answer, match, similarity) where match is "exact", "near" or None on a miss.
+        """
+        normalized = normalize_question(question)
+        now = time.time()
+        conn = self._connection()
+        try:
+            row = conn.execute(
+                'SELECT id, answer FROM answer_cache_entries WHERE question_key = ? AND created_at >= ?',
+                (self._question_key(bucket, normalized), now - self.ttl_seconds)
+            ).fetchone()
+            match, similarity = ("exact", 1.0) if row else (None, 0.0)
+
+            if row is None and self.similarity_threshold <= 1:
+                signature = minhash_signature(normalized)
+                band_keys = _band_keys(bucket, signature)
+                candidates = conn.execute(
+                    'SELECT DISTINCT e.id, e.question, e.answer, e.signature FROM answer_cache_bands b '
+                    'JOIN answer_cache_entries e ON e.id = b.entry_id '
+                    f'WHERE b.band_key IN ({",".join("?" * len(band_keys))}) AND e.created_at >= ?',
+                    (*band_keys, now - self.ttl_seconds)
+                ).fetchall()
+                numbers = numeric_tokens(normalized)
+                for candidate in candidates:
+                    if numeric_tokens(candidate['question']) != numbers:
+                        continue
+                    candidate_similarity = signature_similarity(signature, np.frombuffer(candidate['signature'], dtype=np.uint32))
+                    if candidate_similarity >= self.similarity_threshold and candidate_similarity > similarity:
+                        row, match, similarity = candidate, "near", candidate_similarity
+
+            if row is None:
+                self._count(conn, bucket, 'misses')
+                conn.commit()
+                return None, None, 0.0
+            conn.execute('UPDATE answer_cache_entries SET last_accessed = ? WHERE id = ?', (now, row['id']))
+            self._count(conn, bucket, 'exact_hits' if match == "exact" else 'near_hits')
+            conn.commit()
+            return row['answer'], match, round(similarity, 3)
+        except sqlite3.Error as e:
+            conn.rollback()
+            print(f"Answer cache read error ({self.namespace}): {e}")
+            return None, None, 0.0
+
+    def set(self, question, bucket, answer):
+        """Stores an answer, replacing any entry for the same normalized question, then evicts."""
+        normalized = normalize_question(question)
+        signature = minhash_signature(normalized)
+        now = time.time()
+        conn = self._connection()
+        try:
+            question_key = self._question_key(bucket, normalized)
+            old = conn.execute('SELECT id FROM answer_cache_entries WHERE question_key = ?', (question_key,)).fetchone()
+            if old:
+                self._delete_entries(conn, [old['id']])
+            entry_id = conn.execute(
+                'INSERT INTO answer_cache_entries (namespace, bucket, question_key, question, signature, answer, '
+                'created_at, last_accessed) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (self.namespace, bucket, question_key, normalized, signature.tobytes(), answer, now, now)
+            ).lastrowid
+            conn.executemany(
+                'INSERT OR IGNORE INTO answer_cache_bands (band_key, entry_id) VALUES (?, ?)',
+                [(band_key, entry_id) for band_key in _band_keys(bucket, signature)]
+            )
+
+            # Expired entries go first, then the least recently used ones beyond the size bound
+            evicted = conn.execute(
+                'SELECT id, bucket FROM answer_cache_entries WHERE namespace = ? AND created_at < ?',
+                (self.namespace, now - self.ttl_seconds)
+            ).fetchall()
+            excess = conn.execute(
+                'SELECT COUNT(*) FROM answer_cache_entries WHERE namespace = ?', (self.namespace,)
+            ).fetchone()[0] - len(evicted) - self.max_entries
+            if excess > 0:
+                evicted += conn.execute(
+                    'SELECT id, bucket FROM answer_cache_entries WHERE namespace = ? AND created_at >= ? '
+                    'ORDER BY last_accessed ASC LIMIT ?',
+                    (self.namespace, now - self.ttl_seconds, excess)
+                ).fetchall()
+            if evicted:
+                self._delete_entries(conn, [row['id'] for row in evicted])
+                for row in evicted:
+                    self._count(conn, row['bucket'], 'evictions')
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            print(f"Answer cache write error ({self.namespace}): {e}")
+
+    def stats(self):
+        """Entry count, threshold and hit/miss/eviction counters, overall and per bucket."""
+        conn = self._connection()
+        entries = conn.execute(
+            'SELECT COUNT(*) FROM answer_cache_entries WHERE namespace = ?', (self.namespace,)
+        ).fetchone()[0]
+        buckets = {}
+        totals = {"exact_hits": 0, "near_hits": 0, "misses": 0, "evictions": 0}
+        for row in conn.execute(
+            'SELECT bucket, exact_hits, near_hits, misses, evictions FROM answer_cache_stats WHERE namespace = ?',
+            (self.namespace,)
+        ):
+            counts = {key: row[key] for key in totals}
+            for key in totals:
+                totals[key] += counts[key]
+            buckets[row['bucket']] = dict(counts, hit_rate=_hit_rate(counts))
+        return dict(
+            totals,
+            namespace=self.namespace,
+            entries=entries,
+            max_entries=self.max_entries,
+            ttl_seconds=self.ttl_seconds,
+            similarity_threshold=self.similarity_threshold,
+            hit_rate=_hit_rate(totals),
+            buckets=buckets,
+        )
+
+def _hit_rate(counts):
+    hits = counts["exact_hits"] + counts["near_hits"]
+    lookups = hits + counts["misses"]
+    return round(hits / lookups, 4) if lookups else 0.0
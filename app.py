@@ -2,25 +2,32 @@ import os
 import json
 import random
 import time
-import sqlite3
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, g, flash
+import threading
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, g, flash, Response, send_file
 from werkzeug.security import generate_password_hash, check_password_hash
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak, ListFlowable, ListItem
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
-from reportlab.lib.colors import HexColor, black, green, yellow, red, blue, purple, orange
-from reportlab.lib.units import inch # Import inch for spacing
-from io import BytesIO # For PDF generation
 from dotenv import load_dotenv
 import fitz # PyMuPDF
-from datetime import datetime
 from functools import wraps
 
 # Import services
-from gemini_service import get_gemini_insights, get_mock_swot_analysis, get_mock_company_comparison
+from gemini_service import get_insights_cache_stats
 from risk_calculator import calculate_better_risk_assessment # UPDATED: Import new risk calculation function
-from gemini_advisor_service import get_advisor_response # NEW: Import for advisor chat
+from risk_rules import get_ruleset
+from risk_simulation import simulate_risk_distribution, DEFAULT_SIMULATION_SAMPLES
+from rescoring import init_rescoring_schema, rescore_assessments, start_background_rescoring, get_rescoring_progress
+from insight_jobs import init_insight_jobs_schema, submit_insight_job, get_insight_job, stream_insight_job, InsightQueueFull
+from gemini_advisor_service import get_advisor_response, stream_advisor_response # NEW: Import for advisor chat
+from peer_benchmarks import PeerBenchmarks
+from organization_matching import (OrganizationIndex, parse_focus, decode_focus, INDUSTRY_CHOICES, LOCATION_SCOPE_CHOICES, ORG_MATCH_TOP_K, ORG_MATCH_MAX_K)
+from listings import page_size, InvalidCursor
+from repository import open_storage, check_query_plans, StorageError, USER_PROFILE_COLUMNS
+from advisor_sessions import AdvisorSessionStore, AdvisorSessionNotFound, init_advisor_sessions_schema
+from answer_cache import AnswerCache
+from pdf_cache import report_cache_key, get_cached_report, store_report
+from report_export import stream_reports_zip, stream_reports_merged_pdf, BULK_EXPORT_MAX_ASSESSMENTS
+from db_pool import ConnectionPool
+from write_behind import AssessmentWriter, WriteQueueFull, WRITE_BEHIND_ENABLED
+from pdf_report import format_currency_inr, render_report_pdf, report_analysis, report_inputs, PdfQueueFull
 
 load_dotenv()
 
@@ -32,170 +39,183 @@ app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024 # 16 MB limit
 # Ensure upload folder exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
-# --- Database Setup (SQLite) ---
+# --- Database Setup ---
+# Users, assessments and organizations live in the storage backend (DATABASE_BACKEND, see repository.py).
+# The local SQLite file holds them with the default backend, and node-local state (background job
+# progress, insight jobs, advisor sessions) with either.
 DATABASE = 'database.db'
+db_connections = ConnectionPool(DATABASE) # Tuned connections (WAL, busy timeout, mmap) reused across requests
+storage = open_storage(db_connections)
 
 def get_db_connection():
     if 'db' not in g:
-        g.db = sqlite3.connect(DATABASE)
-        g.db.row_factory = sqlite3.Row # This allows accessing columns by name
+        g.db = db_connections.acquire() # Rows are sqlite3.Row, so columns can be accessed by name
     return g.db
 
+def get_repository():
+    if 'repo' not in g:
+        g.repo = storage.acquire()
+    return g.repo
+
 @app.teardown_appcontext
 def close_db(e=None):
     db = g.pop('db', None)
     if db is not None:
-        db.close()
+        db_connections.release(db)
+    repo = g.pop('repo', None)
+    if repo is not None:
+        storage.release(repo)
 
 def init_db():
+    storage.migrate() # Versioned schema of users, assessments and organizations; see migrations.py
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            first_name TEXT NOT NULL,
-            last_name TEXT NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            company TEXT,
-            job_title TEXT,
-            registered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS assessments (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            project_name TEXT NOT NULL,
-            industry TEXT NOT NULL,
-            description TEXT NOT NULL,
-            budget REAL NOT NULL,
-            timeline TEXT NOT NULL,
-            location TEXT NOT NULL,
-            number_of_cofounders INTEGER NOT NULL,
-            technical_complexity INTEGER NOT NULL,
-            total_expense REAL NOT NULL,
-            total_revenue REAL NOT NULL,
-            resumes_uploaded INTEGER DEFAULT 0,
-            overall_risk REAL NOT NULL,
-            risk_level TEXT NOT NULL,
-            z_score_analysis TEXT NOT NULL, -- Store as JSON string (now stores explanation)
-            gemini_analysis TEXT, -- Store as JSON string (now stores combined SWOT and comparison)
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-    # NEW: Organizations table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS organizations (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL UNIQUE, -- User who registered/owns this organization
-            name TEXT NOT NULL UNIQUE,
-            email TEXT NOT NULL,
-            contact_person TEXT,
-            logo_url TEXT, -- Optional URL for logo
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-    conn.commit()
+    init_rescoring_schema(conn)
+    init_insight_jobs_schema(conn)
+    init_advisor_sessions_schema(conn)
 
 # Initialize the database when the app starts
 with app.app_context():
     init_db()
 
+# Per-industry sorted metric arrays for peer percentiles, kept per worker
+peer_benchmarks = PeerBenchmarks()
+
+# Inverted index of organizations by focus, for ranking funders against an assessment
+organization_index = OrganizationIndex()
+
+# Optional write-behind batching of assessment submissions, for bursts of them (e.g. workshops)
+assessment_writer = AssessmentWriter(storage) if WRITE_BEHIND_ENABLED else None
+
+# Advisor conversations, kept per worker in memory and persisted to the database
+advisor_answer_cache = AnswerCache("advisor_first_turn")
+advisor_sessions = AdvisorSessionStore(DATABASE, answer_cache=advisor_answer_cache)
+
+# Background threads belong to the process serving requests, so they start on its first request:
+# not at import, where CLI commands and a preloading gunicorn master would start them too.
+# Re-scoring starts again whenever a hot-reloaded ruleset brings a new version.
+_background_pid = None
+_rescoring_version = None
+_background_lock = threading.Lock()
+
+@app.before_request
+def start_background_work():
+    global _background_pid, _rescoring_version
+    version = get_ruleset().version
+    if _background_pid == os.getpid() and _rescoring_version == version:
+        return
+    with _background_lock:
+        if _background_pid == os.getpid() and _rescoring_version == version:
+            return
+        _background_pid, _rescoring_version = os.getpid(), version
+    # Re-score assessments stored under an older ruleset version without blocking requests
+    if os.getenv('RESCORE_IN_BACKGROUND', '1') == '1':
+        start_background_rescoring(DATABASE, storage)
+
+@app.cli.command('check-query-plans')
+def check_query_plans_command():
+    """Prints EXPLAIN QUERY PLAN for the hot queries and exits non-zero if one doesn't use its index."""
+    if storage.dialect != 'sqlite':
+        print(f"The query plan check covers the SQLite backend only; DATABASE_BACKEND is {storage.dialect}.")
+        return
+    results = check_query_plans(get_db_connection())
+    for query, plan, ok in results:
+        print(f"{'ok  ' if ok else 'FAIL'} {query}")
+        for step in plan:
+            print(f"       {step}")
+    if not all(ok for _, _, ok in results):
+        raise SystemExit(1)
+
+@app.cli.command('rebuild-assessment-stats')
+def rebuild_assessment_stats_command():
+    """Recounts the dashboard's aggregate counters from the assessments table, printing any drift."""
+    drift = get_repository().rebuild_assessment_stats()
+    for key, (stored, actual) in sorted(drift.items()):
+        print(f"{key}: {stored} -> {actual}")
+    print(f"Rebuilt assessment stats; {len(drift)} counter(s) had drifted.")
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Rebuilds the full-text indexes over organizations and assessments from their tables."""
+    get_repository().rebuild_search_index()
+    print("Rebuilt search indexes.")
+
+@app.cli.command('rescore-assessments')
+def rescore_assessments_command():
+    """Re-scores stale assessments in the foreground, printing progress."""
+    def report(job):
+        print(f"{job['rows_done']}/{job['rows_total']} rows ({job['percent_done']}%)")
+    job = rescore_assessments(DATABASE, storage, progress=report)
+    print("Nothing to re-score, or another worker is already on it." if job is None else f"Re-scoring {job['status']}.")
+
 # --- Authentication Decorator ---
+SESSION_ROLE_TTL = int(os.getenv('SESSION_ROLE_TTL', 300)) # Seconds a session's role and profile are trusted before being re-read
+SESSION_USER_KEYS = ('user_id', 'user_email', 'user_first_name', 'user_last_name', 'user_role', 'role_checked_at')
+
+def remember_user(user):
+    """
+    Stores a regular user's id, display profile and role in the session at login. Call it again
+    after changing a user's profile or role so their session picks up the change.
+    """
+    session['user_id'] = user['id']
+    session['user_email'] = user['email']
+    session['user_first_name'] = user['first_name']
+    session['user_last_name'] = user['last_name']
+    session['user_role'] = 'user'
+    session['role_checked_at'] = time.time()
+
+def current_user():
+    """The logged-in user's display profile (what base.html shows), read from the session."""
+    return {
+        "id": session['user_id'],
+        "email": session.get('user_email'),
+        "first_name": session.get('user_first_name'),
+        "last_name": session.get('user_last_name'),
+    }
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if 'user_id' not in session:
             return redirect(url_for('login'))
         
-        # Check if user is an organization - if so, redirect to main page
-        conn = get_db_connection()
-        org_check = conn.execute('SELECT id FROM organizations WHERE user_id = ?', (session['user_id'],)).fetchone()
-        # Don't close connection here - let teardown_appcontext handle it
-        
-        if org_check:
-            # User is an organization - redirect to main page with message
-            flash('Organizations cannot access the dashboard. Your information is available for users to contact you.', 'info')
-            return redirect(url_for('login'))
+        # The role is cached in the session; it is re-read from the database only once it is older
+        # than SESSION_ROLE_TTL (or missing, for sessions from before it was cached)
+        if session.get('user_role') != 'user' or time.time() - session.get('role_checked_at', 0) > SESSION_ROLE_TTL:
+            repo = get_repository()
+            user = repo.get_user(session['user_id'])
+            if user is None: # Account no longer exists
+                for key in SESSION_USER_KEYS:
+                    session.pop(key, None)
+                return redirect(url_for('login'))
+            # Check if user is an organization - if so, redirect to main page
+            org_check = repo.is_organization(session['user_id'])
+            # Don't close connection here - let teardown_appcontext handle it
+
+            if org_check:
+                # User is an organization - redirect to main page with message
+                flash('Organizations cannot access the dashboard. Your information is available for users to contact you.', 'info')
+                return redirect(url_for('login'))
+            remember_user(user)
         
         return f(*args, **kwargs)
     return decorated_function
 
-# Helper function to format currency
-def format_currency_inr(amount):
-    if amount is None:
-        return "N/A"
-    return "₹{:,}".format(int(amount))
-
 app.jinja_env.filters['format_currency_inr'] = format_currency_inr
 
-# --- Global ReportLab Styles (Defined once) ---
-# This prevents "Style 'BodyText' already defined in stylesheet" error
-_styles = getSampleStyleSheet()
-
-_styles['h1'].fontSize = 24
-_styles['h1'].spaceAfter = 20
-_styles['h1'].alignment = TA_CENTER
-_styles['h1'].textColor = HexColor('#1a202c') # gray-900
-
-_styles['h2'].fontSize = 18
-_styles['h2'].spaceBefore = 20
-_styles['h2'].spaceAfter = 10
-_styles['h2'].textColor = HexColor('#2d3748') # gray-800
-
-_styles['h3'].fontSize = 14
-_styles['h3'].spaceBefore = 15
-_styles['h3'].spaceAfter = 5
-_styles['h3'].textColor = HexColor('#4a5568') # gray-700
-
-_styles.add(ParagraphStyle(name='BodyTextCustom',
-                          parent=_styles['Normal'],
-                          fontSize=10,
-                          leading=14,
-                          spaceAfter=6,
-                          textColor=HexColor('#4a5568'))) # gray-700
-
-_styles.add(ParagraphStyle(name='ListItemStyleCustom',
-                          parent=_styles['Normal'],
-                          fontSize=10,
-                          leading=14,
-                          spaceAfter=3,
-                          leftIndent=20, # Increased indent for list items
-                          firstLineIndent=-10, # Adjust for bullet
-                          textColor=HexColor('#4a5568')))
-
-_styles.add(ParagraphStyle(name='OverallRiskStyleCustom',
-                          parent=_styles['h2'], # Inherit from h2 for font size/weight
-                          fontSize=20, # Override font size
-                          spaceBefore=15,
-                          spaceAfter=15,
-                          alignment=TA_CENTER)) # Color set dynamically
-
-_styles.add(ParagraphStyle(name='ExplanationStyleCustom',
-                          parent=_styles['BodyTextCustom'], # Parent from my custom BodyText
-                          fontSize=11,
-                          leading=16,
-                          spaceBefore=10,
-                          spaceAfter=15,
-                          textColor=HexColor('#334155'))) # slate-700
 
 
 @app.route('/')
 @login_required
 def index():
-    conn = get_db_connection()
-    user = conn.execute('SELECT * FROM users WHERE id = ?', (session['user_id'],)).fetchone()
-    # Don't close connection here - let teardown_appcontext handle it
+    user = current_user()
 
-    # Mock stats for now, can be replaced with actual DB counts later
+    # Live counts from the aggregate table the assessment triggers keep up to date
+    counts = get_repository().assessment_stats()
     stats = {
-        "total_assessments": 1247,
-        "high_risk_items": 23,
-        "medium_risk_items": 156,
-        "low_risk_items": 1068,
+        "total_assessments": counts["total"],
+        "high_risk_items": counts["by_risk_level"].get("High", 0),
+        "medium_risk_items": counts["by_risk_level"].get("Medium", 0),
+        "low_risk_items": counts["by_risk_level"].get("Low", 0),
     }
     features = [
         {"icon": "shield", "title": "Risk Assessment", "description": "Comprehensive risk evaluation with AI-powered analysis", "href": url_for('assessment')},
@@ -210,13 +230,13 @@ def login():
     if request.method == 'POST':
         email = request.form['email']
         password = request.form['password']
-        conn = get_db_connection()
-        user = conn.execute('SELECT * FROM users WHERE email = ?', (email,)).fetchone()
+        repo = get_repository()
+        user = repo.get_user_by_email(email)
         
         # Check if user is an organization
-        org_check = None
+        org_check = False
         if user:
-            org_check = conn.execute('SELECT id FROM organizations WHERE user_id = ?', (user['id'],)).fetchone()
+            org_check = repo.is_organization(user['id'])
         # Don't close connection here - let teardown_appcontext handle it
 
         if user and check_password_hash(user['password_hash'], password):
@@ -227,10 +247,7 @@ def login():
                 return redirect(url_for('login'))
             else:
                 # Regular user - allow login and redirect to dashboard
-                session['user_id'] = user['id']
-                session['user_email'] = user['email']
-                session['user_first_name'] = user['first_name']
-                session['user_last_name'] = user['last_name']
+                remember_user(user)
                 return redirect(url_for('index'))
         else:
             return render_template('login.html', error="Invalid email or password")
@@ -253,10 +270,11 @@ def register():
         org_name = request.form.get('org_name')
         contact_person = request.form.get('contact_person')
         logo_url = request.form.get('logo_url')
+        focus, focus_errors = parse_focus(request.form) # Optional industries, ticket-size range and geographic scopes
 
         errors = {}
-        conn = get_db_connection()
-        existing_user = conn.execute('SELECT id FROM users WHERE email = ?', (email,)).fetchone()
+        repo = get_repository()
+        existing_user = repo.get_user_by_email(email, 'id')
 
         if not first_name.strip(): errors['first_name'] = "First name is required"
         if not last_name.strip(): errors['last_name'] = "Last name is required"
@@ -272,74 +290,58 @@ def register():
         if register_as_organization:
             if not org_name or not org_name.strip(): errors['org_name'] = "Organization name is required."
             
-            existing_org_name = conn.execute('SELECT id FROM organizations WHERE name = ?', (org_name,)).fetchone()
+            existing_org_name = repo.organization_name_taken(org_name)
             if existing_org_name: errors['org_name'] = "An organization with this name already exists."
+            errors.update(focus_errors)
 
 
         if errors:
-            return render_template('register.html', errors=errors, form_data=request.form)
+            return render_template('register.html', errors=errors, form_data=request.form,
+                                   industry_choices=INDUSTRY_CHOICES, location_scope_choices=LOCATION_SCOPE_CHOICES)
         
         password_hash = generate_password_hash(password)
         
         try:
-            cursor = conn.cursor()
-            cursor.execute(
-                'INSERT INTO users (first_name, last_name, email, password_hash, company, job_title) VALUES (?, ?, ?, ?, ?, ?)',
-                (first_name, last_name, email, password_hash, company, job_title)
-            )
-            conn.commit()
-            user_id = cursor.lastrowid
+            user_id = repo.create_user(first_name, last_name, email, password_hash, company, job_title)
 
             # NEW: Register organization if selected
             if register_as_organization and not errors: # Re-check errors to be safe
-                cursor.execute(
-                    'INSERT INTO organizations (user_id, name, email, contact_person, logo_url) VALUES (?, ?, ?, ?, ?)',
-                    (user_id, org_name, email, contact_person, logo_url)
-                )
-                conn.commit()
+                org_id = repo.create_organization(user_id, org_name, email, contact_person, logo_url, focus)
+                organization_index.add({"id": org_id, "name": org_name, "email": email,
+                                        "contact_person": contact_person, "logo_url": logo_url, **focus})
                 
                 # For organizations: show success message and redirect to main page
                 flash('Organization successfully registered! Users can now contact you through our platform.', 'success')
                 return redirect(url_for('login'))
             else:
                 # For regular users: set session and redirect to assessment
-                session['user_id'] = user_id
-                session['user_email'] = email
-                session['user_first_name'] = first_name
-                session['user_last_name'] = last_name
+                remember_user({"id": user_id, "email": email, "first_name": first_name, "last_name": last_name})
                 return redirect(url_for('assessment'))
 
-        except sqlite3.Error as e:
-            conn.rollback()
+        except StorageError as e:
             errors['db_error'] = f"Database error: {e}"
-            return render_template('register.html', errors=errors, form_data=request.form)
-    return render_template('register.html')
+            return render_template('register.html', errors=errors, form_data=request.form,
+                                   industry_choices=INDUSTRY_CHOICES, location_scope_choices=LOCATION_SCOPE_CHOICES)
+    return render_template('register.html', industry_choices=INDUSTRY_CHOICES, location_scope_choices=LOCATION_SCOPE_CHOICES)
 
 @app.route('/logout')
 def logout():
-    session.pop('user_id', None)
-    session.pop('user_email', None)
-    session.pop('user_first_name', None)
-    session.pop('user_last_name', None)
+    for key in SESSION_USER_KEYS:
+        session.pop(key, None)
     return redirect(url_for('index'))
 
 @app.route('/assessment', methods=['GET'])
 @login_required
 def assessment():
-    conn = get_db_connection()
-    user = conn.execute('SELECT * FROM users WHERE id = ?', (session['user_id'],)).fetchone()
-    # Don't close connection here - let teardown_appcontext handle it
+    user = current_user()
     return render_template('assessment.html', user=user)
 
 @app.route('/results')
 @login_required
 def results():
-    conn = get_db_connection()
-    user = conn.execute('SELECT * FROM users WHERE id = ?', (session['user_id'],)).fetchone()
-    latest_assessment = conn.execute(
-        'SELECT * FROM assessments WHERE user_id = ? ORDER BY created_at DESC LIMIT 1',
-        (session['user_id'],)
-    ).fetchone()
+    repo = get_repository()
+    user = current_user()
+    latest_assessment = repo.latest_assessment(session['user_id']) # The page shows, and its script posts back, the whole assessment
     # Don't close connection here - let teardown_appcontext handle it
 
     if latest_assessment:
@@ -350,21 +352,20 @@ def results():
         latest_assessment_dict['z_score_analysis'] = json.loads(latest_assessment_dict['z_score_analysis'])
         if latest_assessment_dict['gemini_analysis']:
             latest_assessment_dict['gemini_analysis'] = json.loads(latest_assessment_dict['gemini_analysis'])
-        return render_template('results.html', assessment=latest_assessment_dict, user=user)
+        peers = peer_benchmarks.percentiles(repo, latest_assessment)
+        return render_template('results.html', assessment=latest_assessment_dict, user=user, peers=peers)
     
     return render_template('results.html', assessment=None, user=user)
 
 @app.route('/compare')
 @login_required
 def compare():
-    conn = get_db_connection()
-    user = conn.execute('SELECT * FROM users WHERE id = ?', (session['user_id'],)).fetchone()
+    user = current_user()
     
     # Fetch the latest assessment for AI comparison insights and overall risk display
-    latest_assessment = conn.execute(
-        'SELECT * FROM assessments WHERE user_id = ? ORDER BY created_at DESC LIMIT 1',
-        (session['user_id'],)
-    ).fetchone()
+    latest_assessment = get_repository().latest_assessment(
+        session['user_id'], 'id, project_name, overall_risk, risk_level, gemini_analysis'
+    )
     # Don't close connection here - let teardown_appcontext handle it
 
     gemini_comparison_data = None
@@ -385,19 +386,9 @@ def compare():
                            latest_assessment=latest_assessment_dict, # Pass latest assessment for risk display
                            gemini_comparison=gemini_comparison_data) # Pass AI comparison data
 
-@app.route('/advisor')
-@login_required
-def advisor():
-    conn = get_db_connection()
-    user = conn.execute('SELECT * FROM users WHERE id = ?', (session['user_id'],)).fetchone()
-    latest_assessment = conn.execute(
-        'SELECT * FROM assessments WHERE user_id = ? ORDER BY created_at DESC LIMIT 1',
-        (session['user_id'],)
-    ).fetchone()
-    # Don't close connection here - let teardown_appcontext handle it
-    
-    # Pass user details as a dictionary to the template
-    user_details = {
+def advisor_user_details(user):
+    """The user fields the advisor is given as conversation context."""
+    return {
         "first_name": user['first_name'],
         "last_name": user['last_name'],
         "email": user['email'],
@@ -405,25 +396,102 @@ def advisor():
         "job_title": user['job_title']
     } if user else {}
 
+@app.route('/advisor')
+@login_required
+def advisor():
+    user = current_user()
+    latest_assessment = get_repository().latest_assessment(
+        session['user_id'], 'id, project_name, technical_complexity, risk_level, budget'
+    )
+    # Don't close connection here - let teardown_appcontext handle it
+    
+
     # Pass latest assessment data to the template for suggested questions
-    latest_assessment_dict = None
-    if latest_assessment:
-        latest_assessment_dict = dict(latest_assessment)
-        # Ensure z_score_analysis is parsed if it's a JSON string
-        if isinstance(latest_assessment_dict.get('z_score_analysis'), str):
-            latest_assessment_dict['z_score_analysis'] = json.loads(latest_assessment_dict['z_score_analysis'])
+    latest_assessment_dict = dict(latest_assessment) if latest_assessment else None
 
-    return render_template('advisor.html', user=user, user_details=json.dumps(user_details), latest_assessment=latest_assessment_dict)
+    return render_template('advisor.html', user=user, latest_assessment=latest_assessment_dict)
 
 # NEW: Organizations List Route
 @app.route('/organizations', methods=['GET'])
 @login_required
 def organizations_list():
-    conn = get_db_connection()
-    user = conn.execute('SELECT * FROM users WHERE id = ?', (session['user_id'],)).fetchone() # For base.html
-    organizations = conn.execute('SELECT * FROM organizations ORDER BY name ASC').fetchall()
+    repo = get_repository()
+    user = current_user() # For base.html
+    query = request.args.get('q', '').strip()
+    cursor = request.args.get('cursor')
+    try:
+        organizations, next_cursor = repo.list_organizations(cursor, query=query)
+    except InvalidCursor:
+        return redirect(url_for('organizations_list', q=query or None))
+    organizations = [decode_focus(org) for org in organizations]
+    # The best fits for the user's latest assessment are shown above the first page of the directory
+    latest_assessment = matches = None
+    if not cursor and not query:
+        latest_assessment = repo.latest_assessment(session['user_id'], 'id, project_name, industry, location, budget')
+        matches = organization_index.top_matches(repo, latest_assessment) if latest_assessment and organizations else None
+        for org in matches or []:
+            org['page_cursor'] = repo.organization_page_cursor(org['name']) # "View" opens a page it's on
     # Don't close connection here - let teardown_appcontext handle it
-    return render_template('organizations_list.html', user=user, organizations=organizations)
+    return render_template('organizations_list.html', user=user, organizations=organizations, matches=matches,
+                           assessment=latest_assessment, industry_labels=dict(INDUSTRY_CHOICES),
+                           query=query, next_cursor=next_cursor, first_page=not cursor)
+
+@app.route('/api/organizations', methods=['GET'])
+@login_required
+def api_organizations():
+    # A page of the directory (?cursor=, ?limit=), or of search results over names and contacts (?q=)
+    try:
+        organizations, next_cursor = get_repository().list_organizations(
+            request.args.get('cursor'), page_size(request.args.get('limit', type=int)),
+            request.args.get('q')
+        )
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"organizations": [decode_focus(org) for org in organizations], "next_cursor": next_cursor}), 200
+
+@app.route('/history')
+@login_required
+def history():
+    user = current_user() # For base.html
+    query = request.args.get('q', '').strip()
+    cursor = request.args.get('cursor')
+    try:
+        assessments, next_cursor = get_repository().list_assessments(session['user_id'], cursor, query=query)
+    except InvalidCursor:
+        return redirect(url_for('history', q=query or None))
+    return render_template('history.html', user=user, assessments=assessments, query=query,
+                           next_cursor=next_cursor, first_page=not cursor)
+
+@app.route('/api/assessments', methods=['GET'])
+@login_required
+def api_assessments():
+    # A page of the user's past assessments, newest first (?cursor=, ?limit=), optionally searched (?q=)
+    try:
+        assessments, next_cursor = get_repository().list_assessments(
+            session['user_id'], request.args.get('cursor'),
+            page_size(request.args.get('limit', type=int)), request.args.get('q')
+        )
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"assessments": assessments, "next_cursor": next_cursor}), 200
+
+@app.route('/api/organizations/matches', methods=['GET'])
+@login_required
+def api_organization_matches():
+    # Top-k organizations for one of the user's assessments (?assessment_id=, default the latest; ?k=)
+    repo = get_repository()
+    k = min(max(request.args.get('k', ORG_MATCH_TOP_K, type=int), 1), ORG_MATCH_MAX_K)
+    assessment_id = request.args.get('assessment_id', type=int)
+    if assessment_id is None:
+        assessment = repo.latest_assessment(session['user_id'], 'id, industry, location, budget')
+    else:
+        assessment = repo.get_assessment(assessment_id, session['user_id'], 'id, industry, location, budget')
+    if assessment is None:
+        return jsonify({"error": "Assessment not found"}), 404
+    matches = organization_index.top_matches(repo, assessment, k)
+    if matches is None:
+        return jsonify({"error": "Organization matching is unavailable"}), 503
+    return jsonify({"assessment_id": assessment['id'], "k": k, "organizations": matches}), 200
 
 
 @app.route('/api/submit-assessment', methods=['POST'])
@@ -459,45 +527,88 @@ def api_submit_assessment():
         # UPDATED: Call the new risk assessment function
         risk_assessment_results = calculate_better_risk_assessment(assessment_data)
 
-        conn = get_db_connection()
+        repo = get_repository()
+        # With write-behind the insert joins the current batch; either way it has committed once this returns
+        writer = assessment_writer or repo
         try:
-            cursor = conn.cursor()
-            cursor.execute(
-                '''INSERT INTO assessments (
-                    user_id, project_name, industry, description, budget, timeline, location,
-                    number_of_cofounders, technical_complexity, total_expense, total_revenue,
-                    resumes_uploaded, overall_risk, risk_level, z_score_analysis
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                (
-                    user_id,
-                    assessment_data["project_name"],
-                    assessment_data["industry"],
-                    assessment_data["description"],
-                    assessment_data["budget"],
-                    assessment_data["timeline"],
-                    assessment_data["location"],
-                    assessment_data["number_of_cofounders"],
-                    assessment_data["technical_complexity"],
-                    assessment_data["total_expense"],
-                    assessment_data["total_revenue"],
-                    0, # resumes_uploaded_count
-                    risk_assessment_results["risk_score"], # Use new risk_score
-                    risk_assessment_results["risk_level"], # Use new risk_level
-                    json.dumps({"explanation": risk_assessment_results["explanation"]}) # Store explanation as JSON
-                )
-            )
-            conn.commit()
-        except sqlite3.Error as e:
-            conn.rollback()
+            writer.create_assessment(user_id, {
+                **assessment_data,
+                "resumes_uploaded": 0, # resumes_uploaded_count
+                "overall_risk": risk_assessment_results["risk_score"], # Use new risk_score
+                "risk_level": risk_assessment_results["risk_level"], # Use new risk_level
+                "z_score_analysis": json.dumps({"explanation": risk_assessment_results["explanation"]}), # Store explanation as JSON
+                "score_version": risk_assessment_results["ruleset_version"],
+            })
+        except WriteQueueFull:
+            response = jsonify({"error": "Too many assessments are being submitted right now. Please try again shortly."})
+            response.headers["Retry-After"] = "2"
+            return response, 503
+        except StorageError as e:
             print(f"Database error on assessment submission: {e}")
             return jsonify({"error": "Failed to save assessment to database"}), 500
-        # Removed finally: conn.close() - rely on teardown_appcontext
+        try:
+            peer_benchmarks.refresh(repo, assessment_data["industry"]) # Adds the new row to the industry's arrays
+        except StorageError as e:
+            print(f"Peer benchmark update failed: {e}") # The next lookup catches up instead
 
         return jsonify({"success": True, "message": "Assessment submitted successfully"})
     except Exception as e:
         print(f"Error processing assessment: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
+# NEW: Monte Carlo what-if simulation over uncertain budget/revenue/expense estimates
+@app.route('/api/simulate-assessment', methods=['POST'])
+@login_required
+def api_simulate_assessment():
+    data = request.json or {}
+    assessment_data = data.get("assessmentData")
+    if not assessment_data:
+        return jsonify({"error": "Assessment data not provided"}), 400
+
+    try:
+        simulation = simulate_risk_distribution(
+            assessment_data,
+            samples=data.get("samples", DEFAULT_SIMULATION_SAMPLES),
+            seed=data.get("seed"),
+        )
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": f"Invalid simulation input: {e}"}), 400
+    except Exception as e:
+        print(f"Error running assessment simulation: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+    return jsonify(simulation)
+
+@app.route('/api/assessment-stats', methods=['GET'])
+@login_required
+def api_assessment_stats():
+    # Counts by risk level and industry, and the current user's total, without scanning assessments
+    return jsonify(get_repository().assessment_stats(session['user_id'])), 200
+
+@app.route('/api/assessments/<int:assessment_id>/peer-benchmarks', methods=['GET'])
+@login_required
+def api_peer_benchmarks(assessment_id):
+    repo = get_repository()
+    assessment = repo.get_assessment(
+        assessment_id, session['user_id'], 'id, industry, overall_risk, budget, total_expense, total_revenue'
+    )
+    if assessment is None:
+        return jsonify({"error": "Assessment not found"}), 404
+    metrics = peer_benchmarks.percentiles(repo, assessment)
+    if metrics is None:
+        return jsonify({"error": "Peer benchmarks are unavailable"}), 503
+    return jsonify({"assessment_id": assessment_id, "industry": assessment['industry'], "metrics": metrics}), 200
+
+@app.route('/api/rescoring-status', methods=['GET'])
+@login_required
+def api_rescoring_status():
+    conn = get_db_connection()
+    job = get_rescoring_progress(conn)
+    if job is None:
+        return jsonify({"status": "idle"}), 200
+    job.pop('owner', None)
+    return jsonify(job), 200
+
 @app.route('/api/get-latest-assessment', methods=['GET'])
 @login_required
 def api_get_latest_assessment():
@@ -505,11 +616,7 @@ def api_get_latest_assessment():
     if not user_id:
         return jsonify({"error": "Unauthorized"}), 401
 
-    conn = get_db_connection()
-    latest_assessment = conn.execute(
-        'SELECT * FROM assessments WHERE user_id = ? ORDER BY created_at DESC LIMIT 1',
-        (user_id,)
-    ).fetchone()
+    latest_assessment = get_repository().latest_assessment(user_id)
     # Don't close connection here - let teardown_appcontext handle it
 
     if latest_assessment:
@@ -522,148 +629,10 @@ def api_get_latest_assessment():
         return jsonify(assessment_dict), 200
     return jsonify({"error": "No assessment found"}), 404
 
-def generate_risk_report_pdf(assessment_data, gemini_analysis):
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter,
-                            rightMargin=72, leftMargin=72,
-                            topMargin=72, bottomMargin=72)
-    
-    # Use the globally defined styles
-    styles = _styles 
-
-    elements = []
-
-    # Title Page
-    elements.append(Paragraph("SmartRisk AI Assessment Report", styles['h1'])) # Use h1
-    elements.append(Spacer(1, 0.5 * inch))
-    elements.append(Paragraph(f"Project: {assessment_data.get('project_name', 'N/A')}", styles['h2'])) # Use h2
-    elements.append(Paragraph(f"Date: {datetime.now().strftime('%B %d, %Y')}", styles['BodyTextCustom']))
-    elements.append(Spacer(1, 1 * inch))
-    elements.append(Paragraph("Confidential Report", styles['BodyTextCustom']))
-    elements.append(PageBreak())
-
-    # Project Overview
-    elements.append(Paragraph("1. Project Overview", styles['h2'])) # Use h2
-    elements.append(Paragraph(f"<b>Project Name:</b> {assessment_data.get('project_name', 'N/A')}", styles['BodyTextCustom']))
-    elements.append(Paragraph(f"<b>Industry:</b> {assessment_data.get('industry', 'N/A')}", styles['BodyTextCustom']))
-    elements.append(Paragraph(f"<b>Description:</b> {assessment_data.get('description', 'N/A')}", styles['BodyTextCustom']))
-    elements.append(Paragraph(f"<b>Budget:</b> {format_currency_inr(assessment_data.get('budget', 0))}", styles['BodyTextCustom']))
-    elements.append(Paragraph(f"<b>Timeline:</b> {assessment_data.get('timeline', 'N/A')}", styles['BodyTextCustom']))
-    elements.append(Paragraph(f"<b>Location:</b> {assessment_data.get('location', 'N/A')}", styles['BodyTextCustom']))
-    elements.append(Paragraph(f"<b>Co-founders:</b> {assessment_data.get('number_of_cofounders', 'N/A')}", styles['BodyTextCustom']))
-    elements.append(Paragraph(f"<b>Technical Complexity:</b> {assessment_data.get('technical_complexity', 'N/A')}/10", styles['BodyTextCustom']))
-    elements.append(Paragraph(f"<b>Expected Revenue:</b> {format_currency_inr(assessment_data.get('total_revenue', 0))}", styles['BodyTextCustom']))
-    elements.append(Paragraph(f"<b>Expected Expense:</b> {format_currency_inr(assessment_data.get('total_expense', 0))}", styles['BodyTextCustom']))
-    elements.append(Spacer(1, 0.2 * inch))
-
-    # Overall Risk
-    risk_level = assessment_data.get('risk_level', 'N/A')
-    overall_risk_score = assessment_data.get('overall_risk', 'N/A')
-    risk_color = black
-    if risk_level == 'Low': risk_color = green
-    elif risk_level == 'Medium': risk_color = orange
-    elif risk_level == 'High': risk_color = red
-    
-    styles['OverallRiskStyleCustom'].textColor = risk_color
-    elements.append(Paragraph(f"Overall Risk: {risk_level} ({overall_risk_score:.0f}%)", styles['OverallRiskStyleCustom']))
-    
-    # Add the explanation from the new risk calculation
-    explanation_data = assessment_data.get('z_score_analysis', {}) # z_score_analysis now holds the explanation
-    explanation_text = explanation_data.get('explanation', 'No detailed explanation available.')
-    elements.append(Paragraph(f"<b>Explanation:</b> {explanation_text}", styles['ExplanationStyleCustom']))
-    elements.append(Spacer(1, 0.2 * inch))
-
-    # AI-Powered Insights (SWOT)
-    elements.append(Paragraph("2. AI-Powered Insights: SWOT Analysis", styles['h2'])) # Re-numbered heading
-    swot = gemini_analysis.get('swot', get_mock_swot_analysis()) # Fallback to mock if not present
-
-    elements.append(Paragraph("Strengths:", styles['h3'])) # Use h3
-    elements.append(ListFlowable([ListItem(Paragraph(s, styles['ListItemStyleCustom'])) for s in swot.get('strengths', [])],
-                                 bulletType='bullet',
-                                 bulletColor=green,
-                                 start='bullet',
-                                 leftIndent=20,
-                                 bulletIndent=10))
-    elements.append(Spacer(1, 0.1 * inch))
-
-    elements.append(Paragraph("Weaknesses:", styles['h3'])) # Use h3
-    elements.append(ListFlowable([ListItem(Paragraph(s, styles['ListItemStyleCustom'])) for s in swot.get('weaknesses', [])],
-                                 bulletType='bullet',
-                                 bulletColor=red,
-                                 start='bullet',
-                                 leftIndent=20,
-                                 bulletIndent=10))
-    elements.append(Spacer(1, 0.1 * inch))
-
-    elements.append(Paragraph("Opportunities:", styles['h3'])) # Use h3
-    elements.append(ListFlowable([ListItem(Paragraph(s, styles['ListItemStyleCustom'])) for s in swot.get('opportunities', [])],
-                                 bulletType='bullet',
-                                 bulletColor=blue,
-                                 start='bullet',
-                                 leftIndent=20,
-                                 bulletIndent=10))
-    elements.append(Spacer(1, 0.1 * inch))
-
-    elements.append(Paragraph("Threats:", styles['h3'])) # Use h3
-    elements.append(ListFlowable([ListItem(Paragraph(s, styles['ListItemStyleCustom'])) for s in swot.get('threats', [])],
-                                 bulletType='bullet',
-                                 bulletColor=orange,
-                                 start='bullet',
-                                 leftIndent=20,
-                                 bulletIndent=10))
-    elements.append(Spacer(1, 0.1 * inch))
-
-    elements.append(Paragraph("Recommendations:", styles['h3'])) # Use h3
-    elements.append(ListFlowable([ListItem(Paragraph(s, styles['ListItemStyleCustom'])) for s in swot.get('recommendations', [])],
-                                 bulletType='bullet',
-                                 bulletColor=purple,
-                                 start='bullet',
-                                 leftIndent=20,
-                                 bulletIndent=10))
-    elements.append(Spacer(1, 0.2 * inch))
-
-    # AI-Powered Insights (Company Comparison)
-    elements.append(Paragraph("3. AI-Powered Insights: Company Comparison", styles['h2'])) # Re-numbered heading
-    comparison = gemini_analysis.get('comparison', get_mock_company_comparison()) # Fallback to mock if not present
-
-    elements.append(Paragraph(f"<b>Successful Company:</b> {comparison.get('successful_company', {}).get('name', 'N/A')}", styles['BodyTextCustom']))
-    elements.append(Paragraph(f"<i>Industry: {comparison.get('successful_company', {}).get('industry', 'N/A')}</i>", styles['BodyTextCustom']))
-    elements.append(Paragraph("Key Factors for Success:", styles['h3'])) # Use h3
-    elements.append(ListFlowable([ListItem(Paragraph(s, styles['ListItemStyleCustom'])) for s in comparison.get('successful_company', {}).get('insights', [])],
-                                 bulletType='bullet',
-                                 bulletColor=green,
-                                 start='bullet',
-                                 leftIndent=20,
-                                 bulletIndent=10))
-    elements.append(Spacer(1, 0.1 * inch))
-
-    elements.append(Paragraph(f"<b>Failed Company:</b> {comparison.get('failed_company', {}).get('name', 'N/A')}", styles['BodyTextCustom']))
-    elements.append(Paragraph(f"<i>Industry: {comparison.get('failed_company', {}).get('industry', 'N/A')}</i>", styles['BodyTextCustom']))
-    elements.append(Paragraph("Key Factors for Failure:", styles['h3'])) # Use h3
-    elements.append(ListFlowable([ListItem(Paragraph(s, styles['ListItemStyleCustom'])) for s in comparison.get('failed_company', {}).get('insights', [])],
-                                 bulletType='bullet',
-                                 bulletColor=red,
-                                 start='bullet',
-                                 leftIndent=20,
-                                 bulletIndent=10))
-    elements.append(Spacer(1, 0.1 * inch))
-
-    elements.append(Paragraph("Lessons Learned for Your Project:", styles['h3'])) # Use h3
-    elements.append(ListFlowable([ListItem(Paragraph(s, styles['ListItemStyleCustom'])) for s in comparison.get('lessons_learned', [])],
-                                 bulletType='bullet',
-                                 bulletColor=purple,
-                                 start='bullet',
-                                 leftIndent=20,
-                                 bulletIndent=10))
-    elements.append(Spacer(1, 0.2 * inch))
-
-    doc.build(elements)
-    buffer.seek(0)
-    return buffer.getvalue()
-
 @app.route('/api/gemini-analysis', methods=['POST'])
 @login_required
 def api_gemini_analysis():
+    # Insight generation runs as a background job; the client follows it via the status or events endpoint
     try:
         data = request.json
         assessment_data = data.get("assessmentData")
@@ -675,63 +644,150 @@ def api_gemini_analysis():
         # The z_score_analysis now contains the explanation, not individual z_scores
         # So, no need to parse it as individual z_scores here for Gemini prompt
         # We can pass the raw assessment_data to Gemini service, it will use relevant fields
-        
-        # Call the combined Gemini insights function from gemini_service
-        gemini_insights = get_gemini_insights(assessment_data)
-
-        # Update the assessment in the database with the combined Gemini analysis
-        user_id = session.get('user_id')
-        if user_id:
-            conn = get_db_connection()
-            try:
-                conn.execute(
-                    'UPDATE assessments SET gemini_analysis = ? WHERE id = ? AND user_id = ?',
-                    (json.dumps(gemini_insights), assessment_id, user_id)
-                )
-                conn.commit()
-            except sqlite3.Error as e:
-                print(f"Database error updating Gemini analysis: {e}")
-            finally:
-                conn.close()
-
-        return jsonify(gemini_insights)
 
-    except Exception as e:
-        print(f"Error with Gemini API call in app.py: {e}")
-        # Fallback to mock data if any error occurs during the process
+        # forceRefresh skips the insights cache, e.g. when the user asks to regenerate existing insights
+        # Repeated clicks or other tabs asking for the same insights join the job already in flight
+        job_id, coalesced = submit_insight_job(DATABASE, storage, session['user_id'], assessment_id, assessment_data,
+                                               bypass_cache=bool(data.get("forceRefresh")))
         return jsonify({
-            "swot": get_mock_swot_analysis(),
-            "comparison": get_mock_company_comparison()
-        }), 500
+            "jobId": job_id,
+            "status": "queued",
+            "coalesced": coalesced,
+            "statusUrl": url_for('api_gemini_analysis_status', job_id=job_id),
+            "eventsUrl": url_for('api_gemini_analysis_events', job_id=job_id)
+        }), 202
+
+    except InsightQueueFull:
+        response = jsonify({"error": "AI insights are busy right now. Please try again shortly."})
+        response.headers["Retry-After"] = "10"
+        return response, 503
+    except Exception as e:
+        print(f"Error queuing Gemini analysis in app.py: {e}")
+        return jsonify({"error": "Failed to start AI insights generation"}), 500
+
+@app.route('/api/gemini-analysis/<job_id>', methods=['GET'])
+@login_required
+def api_gemini_analysis_status(job_id):
+    conn = get_db_connection()
+    job = get_insight_job(conn, job_id, session['user_id'])
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job), 200
+
+@app.route('/api/gemini-analysis/<job_id>/events', methods=['GET'])
+@login_required
+def api_gemini_analysis_events(job_id):
+    response = Response(stream_insight_job(DATABASE, job_id, session['user_id']), mimetype='text/event-stream')
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no" # Don't let a reverse proxy buffer the stream
+    return response
+
+@app.route('/api/ai-cache-stats', methods=['GET'])
+@login_required
+def api_ai_cache_stats():
+    return jsonify(get_insights_cache_stats()), 200
+
+def pdf_busy_response():
+    response = jsonify({"error": "Report generation is busy right now. Please try again shortly."})
+    response.headers["Retry-After"] = "5"
+    return response, 503
 
 @app.route('/api/generate-pdf', methods=['POST'])
 @login_required
 def api_generate_pdf():
+    # Renders whatever the client posts. Stored assessments should use the cached GET endpoint below.
     try:
         data = request.json
         assessment_data = data.get("assessmentData")
         gemini_analysis = data.get("geminiAnalysis") # This will now contain both SWOT and comparison
 
-        # Ensure gemini_analysis is not None and has the expected structure
-        if not gemini_analysis or not gemini_analysis.get('swot') or not gemini_analysis.get('comparison'):
-            # Fallback to mock if analysis is incomplete
-            swot_data = get_mock_swot_analysis()
-            comparison_data = get_mock_company_comparison()
-        else:
-            swot_data = gemini_analysis['swot']
-            comparison_data = gemini_analysis['comparison']
-
-        pdf_bytes = generate_risk_report_pdf(assessment_data, {"swot": swot_data, "comparison": comparison_data})
+        pdf_bytes = render_report_pdf(assessment_data, report_analysis(gemini_analysis))
         
         response = app.make_response(pdf_bytes)
         response.headers["Content-Type"] = "application/pdf"
         response.headers["Content-Disposition"] = 'attachment; filename="ai-risk-assessment-report.pdf"'
         return response
 
+    except PdfQueueFull:
+        return pdf_busy_response()
     except Exception as e:
         print(f"Error generating PDF: {e}")
         return jsonify({"error": "Failed to generate PDF"}), 500
 
+@app.route('/api/assessments/<int:assessment_id>/report.pdf', methods=['GET'])
+@login_required
+def api_assessment_report_pdf(assessment_id):
+    """
+    Renders the report for a stored assessment. Rendered files are cached on disk, keyed by a hash of
+    the assessment row (including gemini_analysis), which doubles as the ETag.
+    """
+    assessment = get_repository().get_assessment(assessment_id, session['user_id'])
+    if assessment is None:
+        return jsonify({"error": "Assessment not found"}), 404
+
+    assessment_dict = dict(assessment)
+    cache_key = report_cache_key(assessment_dict)
+    if cache_key in request.if_none_match:
+        response = app.make_response(('', 304))
+        response.set_etag(cache_key)
+        return response
+
+    try:
+        path = get_cached_report(assessment_id, cache_key)
+        if path is None:
+            pdf_bytes = render_report_pdf(*report_inputs(assessment_dict))
+            path = store_report(assessment_id, cache_key, pdf_bytes)
+    except PdfQueueFull:
+        return pdf_busy_response()
+    except Exception as e:
+        print(f"Error generating PDF for assessment {assessment_id}: {e}")
+        return jsonify({"error": "Failed to generate PDF"}), 500
+
+    response = send_file(os.path.abspath(path), mimetype='application/pdf', as_attachment=True,
+                         download_name='ai-risk-assessment-report.pdf', etag=cache_key, conditional=True)
+    response.headers['Cache-Control'] = 'private, no-cache' # Browsers revalidate with If-None-Match
+    return response
+
+@app.route('/api/reports/export', methods=['POST'])
+@login_required
+def api_export_reports():
+    """
+    Bulk report download. Body: {"assessmentIds": [...], "format": "zip" (default) or "pdf"}.
+    Reports are rendered in parallel and the ZIP is streamed while they are generated; "pdf"
+    merges them into one document with a bookmark per assessment.
+    """
+    data = request.json or {}
+    export_format = data.get('format', 'zip')
+    try:
+        if not isinstance(data.get('assessmentIds', []), list):
+            raise TypeError()
+        assessment_ids = list(dict.fromkeys(int(i) for i in data.get('assessmentIds') or []))
+    except (TypeError, ValueError):
+        return jsonify({"error": "assessmentIds must be a list of ids"}), 400
+    if export_format not in ('zip', 'pdf'):
+        return jsonify({"error": "format must be 'zip' or 'pdf'"}), 400
+    if not assessment_ids:
+        return jsonify({"error": "No assessments selected"}), 400
+    if len(assessment_ids) > BULK_EXPORT_MAX_ASSESSMENTS:
+        return jsonify({"error": f"At most {BULK_EXPORT_MAX_ASSESSMENTS} assessments can be exported at once"}), 400
+
+    # Rows are loaded up front: the response body is generated after this request context ends
+    rows = get_repository().get_assessments(session['user_id'], assessment_ids)
+    rows_by_id = {row['id']: dict(row) for row in rows}
+    missing = [i for i in assessment_ids if i not in rows_by_id]
+    if missing:
+        return jsonify({"error": "Assessments not found", "missing": missing}), 404
+    assessment_rows = [rows_by_id[i] for i in assessment_ids]
+
+    if export_format == 'pdf':
+        body, mimetype, filename = stream_reports_merged_pdf(assessment_rows), 'application/pdf', 'risk-reports.pdf'
+    else:
+        body, mimetype, filename = stream_reports_zip(assessment_rows), 'application/zip', 'risk-reports.zip'
+    return Response(body, mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'X-Accel-Buffering': 'no',
+    })
+
 @app.route('/api/compare-companies', methods=['POST'])
 @login_required
 def api_compare_companies():
@@ -740,27 +796,112 @@ def api_compare_companies():
     return jsonify({"error": "This endpoint is deprecated. Use /api/gemini-analysis for combined insights."}), 400
 
 # NEW: AI Advisor Chat API Endpoint
+# With "session_id" (or neither "session_id" nor "history") the conversation is kept server-side and
+# only the new message is sent; a new session is started when session_id is missing. Requests that
+# still post the full "history" are answered statelessly as before.
 @app.route('/api/chat-advisor', methods=['POST'])
 @login_required
 def api_chat_advisor():
     try:
         data = request.json
         user_message = data.get('message')
-        chat_history = data.get('history', []) # Get chat history from frontend
+        chat_history = data.get('history') # Get chat history from frontend (stateless clients only)
         user_context = data.get('user_context', {}) # Get user context from frontend
 
         if not user_message:
             return jsonify({"error": "No message provided"}), 400
 
-        # Get response from the advisor service, passing user_context
-        advisor_response = get_advisor_response(user_message, chat_history, user_context)
+        if chat_history is not None and not data.get('session_id'):
+            # Get response from the advisor service, passing user_context
+            advisor_response = get_advisor_response(user_message, chat_history, user_context)
+            return jsonify({"response": advisor_response})
 
-        return jsonify({"response": advisor_response})
+        session_obj = open_advisor_session(data.get('session_id'))
+        metrics = {}
+        advisor_response = advisor_sessions.send(session_obj, user_message, metrics)
+        return jsonify({"response": advisor_response, "session_id": session_obj.id, "metrics": metrics})
 
+    except AdvisorSessionNotFound:
+        return jsonify({"error": "Chat session not found"}), 404
     except Exception as e:
         print(f"Error in /api/chat-advisor: {e}")
         return jsonify({"error": "Internal server error during chat processing"}), 500
 
+def open_advisor_session(session_id):
+    """Opens the current user's advisor session, or starts one (with their profile as context) if no id is given."""
+    if not session_id:
+        repo = get_repository()
+        user = repo.get_user(session['user_id'], USER_PROFILE_COLUMNS)
+        user_context = advisor_user_details(user)
+        # Industry and risk level of the latest assessment pick the bucket for cached first-turn answers
+        latest = repo.latest_assessment(session['user_id'], 'industry, risk_level')
+        if latest:
+            user_context.update(industry=latest['industry'], risk_level=latest['risk_level'])
+        session_id = advisor_sessions.create(session['user_id'], user_context)
+    return advisor_sessions.open(session_id, session['user_id'])
+
+# NEW: Streaming variant of the advisor chat. Same request body as /api/chat-advisor; the reply
+# is sent as Server-Sent Events ("chunk" events with text, then one "done" event with the full reply)
+@app.route('/api/chat-advisor/stream', methods=['POST'])
+@login_required
+def api_chat_advisor_stream():
+    data = request.json or {}
+    user_message = data.get('message')
+    chat_history = data.get('history')
+    user_context = data.get('user_context', {})
+
+    if not user_message:
+        return jsonify({"error": "No message provided"}), 400
+
+    session_id = None
+    metrics = {} # Filled in by the session store as the turn runs
+    if chat_history is not None and not data.get('session_id'):
+        chunks = stream_advisor_response(user_message, chat_history, user_context)
+    else:
+        try:
+            session_obj = open_advisor_session(data.get('session_id'))
+        except AdvisorSessionNotFound:
+            return jsonify({"error": "Chat session not found"}), 404
+        session_id = session_obj.id
+        chunks = advisor_sessions.stream(session_obj, user_message, metrics)
+
+    def generate():
+        parts = []
+        try:
+            for text in chunks:
+                parts.append(text)
+                yield f"event: chunk\ndata: {json.dumps({'text': text})}\n\n"
+            done = {'response': ''.join(parts), 'session_id': session_id, 'metrics': metrics}
+            yield f"event: done\ndata: {json.dumps(done)}\n\n"
+        except Exception as e:
+            print(f"Error in /api/chat-advisor/stream: {e}")
+            yield f"event: error\ndata: {json.dumps({'error': 'Internal server error during chat processing'})}\n\n"
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    if session_id:
+        headers['X-Advisor-Session-Id'] = session_id # Available before the first chunk
+    return Response(generate(), mimetype='text/event-stream', headers=headers)
+
+@app.route('/api/advisor-sessions/<session_id>', methods=['GET'])
+@login_required
+def api_advisor_session(session_id):
+    """Returns the transcript of one of the user's advisor sessions, e.g. to restore the chat after a reload."""
+    try:
+        messages = advisor_sessions.transcript(session_id, session['user_id'])
+    except AdvisorSessionNotFound:
+        return jsonify({"error": "Chat session not found"}), 404
+    return jsonify({"session_id": session_id, "messages": messages}), 200
+
+@app.route('/api/advisor-session-stats', methods=['GET'])
+@login_required
+def api_advisor_session_stats():
+    return jsonify(advisor_sessions.stats()), 200
+
+@app.route('/api/advisor-answer-cache-stats', methods=['GET'])
+@login_required
+def api_advisor_answer_cache_stats():
+    return jsonify(advisor_answer_cache.stats()), 200
+
 def get_risk_color_hex(score):
     if score <= 50: return '#22c55e' # green-500
     if score <= 70: return '#eab308' # yellow-500
@@ -0,0 +1,109 @@
+import sqlite3
+
+# Counts are kept per (scope, key): scope 'total' (key ''), 'risk_level', 'industry' and 'user' (key user_id)
+_STAT_COLUMNS = {'risk_level': 'risk_level', 'industry': 'industry', 'user': 'user_id'}
+
+def _adjust(delta, row):
+    """Trigger statements adding delta to every counter the OLD or NEW row belongs to."""
+    keys = [("'total'", "''")] + [(f"'{scope}'", f"{row}.{column}") for scope, column in _STAT_COLUMNS.items()]
+    return "\n".join(
+        f"INSERT INTO assessment_stats (scope, key, count) VALUES ({scope}, {key}, {delta}) "
+        f"ON CONFLICT (scope, key) DO UPDATE SET count = count + {delta};"
+        for scope, key in keys
+    )
+
+def create_assessment_stats_schema(conn):
+    """
+    Migration step: aggregate counts of assessments, maintained by triggers on every insert, delete
+    and update (including background re-scoring), so the dashboard reads them without scanning
+    assessments. The counters are filled from the table the first time they are created.
+    """
+    created = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'assessment_stats'"
+    ).fetchone() is None
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS assessment_stats (
+            scope TEXT NOT NULL, -- total, risk_level, industry or user
+            key TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (scope, key)
+        )
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_assessment_stats_insert AFTER INSERT ON assessments
+        BEGIN
+            {_adjust(1, 'NEW')}
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_assessment_stats_delete AFTER DELETE ON assessments
+        BEGIN
+            {_adjust(-1, 'OLD')}
+        END
+    ''')
+    for scope, column in _STAT_COLUMNS.items():
+        # Only the counters of the changed column move; 'total' is unaffected by updates
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_assessment_stats_update_{scope} AFTER UPDATE OF {column} ON assessments
+            WHEN OLD.{column} IS NOT NEW.{column}
+            BEGIN
+                INSERT INTO assessment_stats (scope, key, count) VALUES ('{scope}', OLD.{column}, -1)
+                ON CONFLICT (scope, key) DO UPDATE SET count = count - 1;
+                INSERT INTO assessment_stats (scope, key, count) VALUES ('{scope}', NEW.{column}, 1)
+                ON CONFLICT (scope, key) DO UPDATE SET count = count + 1;
+            END
+        ''')
+    if created:
+        _store_counts(conn, _count_assessments(conn))
+
+def _count_assessments(conn):
+    """Every counter, recounted from the assessments table: {(scope, key): count}."""
+    actual = {('total', ''): conn.execute('SELECT COUNT(*) FROM assessments').fetchone()[0]}
+    for scope, column in _STAT_COLUMNS.items():
+        for key, count in conn.execute(f'SELECT {column}, COUNT(*) FROM assessments GROUP BY {column}'):
+            actual[(scope, str(key))] = count
+    return actual
+
+def _store_counts(conn, counts):
+    conn.execute('DELETE FROM assessment_stats')
+    conn.executemany(
+        'INSERT INTO assessment_stats (scope, key, count) VALUES (?, ?, ?)',
+        [(scope, key, count) for (scope, key), count in counts.items()]
+    )
+
+def rebuild_assessment_stats(conn):
+    """
+    Recounts every counter from the assessments table and replaces the stored ones, in one write
+    transaction so no insert lands in between. Returns the counters that had drifted, as
+    {"scope:key": (stored, actual)}.
+    """
+    conn.commit()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        actual = _count_assessments(conn)
+        stored = {(row[0], row[1]): row[2] for row in conn.execute('SELECT scope, key, count FROM assessment_stats')}
+        drift = stats_drift(stored, actual)
+        _store_counts(conn, actual)
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return drift
+
+def stats_drift(stored, actual):
+    """The counters that differ between two {(scope, key): count} maps, as {"scope:key": (stored, actual)}."""
+    return {
+        f"{scope}:{key}": (stored.get((scope, key), 0), actual.get((scope, key), 0))
+        for scope, key in set(stored) | set(actual)
+        if stored.get((scope, key), 0) != actual.get((scope, key), 0)
+    }
+
+def summarize_stats(rows):
+    """The dashboard's shape of (scope, key, count) counter rows: total, by risk level and by industry."""
+    stats = {"total": 0, "by_risk_level": {}, "by_industry": {}}
+    for scope, key, count in rows:
+        if scope == 'total':
+            stats["total"] = count
+        elif count > 0:
+            stats["by_risk_level" if scope == 'risk_level' else "by_industry"][key] = count
+    return stats
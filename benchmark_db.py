@@ -0,0 +1,107 @@
+"""
+Concurrent read/write throughput on a copy of the app database: a fresh default connection per
+request (rollback journal) against the tuned connection pool (WAL).
+
+    python benchmark_db.py [threads] [seconds] [write_percent]
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+
+from db_pool import ConnectionPool
+
+DATABASE = 'database.db'
+
+def fresh_connection(path):
+    """How get_db_connection used to connect: a new connection per request, default settings."""
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    return conn, sqlite3.Connection.close
+
+def read_request(conn, user_id):
+    conn.execute('SELECT * FROM assessments WHERE user_id = ? ORDER BY created_at DESC LIMIT 1', (user_id,)).fetchone()
+    conn.execute('SELECT * FROM users WHERE id = ?', (user_id,)).fetchone()
+
+def write_request(conn, user_id):
+    conn.execute(
+        '''INSERT INTO assessments (
+            user_id, project_name, industry, description, budget, timeline, location,
+            number_of_cofounders, technical_complexity, total_expense, total_revenue,
+            resumes_uploaded, overall_risk, risk_level, z_score_analysis
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+        (user_id, "Benchmark", "Technology", "Benchmark row", 100000, "12 months", "Pune", 2, 5,
+         50000, 80000, 0, 42.0, "Medium", json.dumps({"explanation": ""}))
+    )
+    conn.commit()
+
+def run(label, path, open_connection, threads, seconds, write_percent):
+    user_ids = [row[0] for row in sqlite3.connect(path).execute('SELECT id FROM users')] or [1]
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def worker(seed):
+        rng = random.Random(seed)
+        local = {"reads": 0, "writes": 0, "errors": 0}
+        local_latencies = []
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            conn, done = open_connection()
+            try:
+                if rng.randrange(100) < write_percent:
+                    write_request(conn, rng.choice(user_ids))
+                    local["writes"] += 1
+                else:
+                    read_request(conn, rng.choice(user_ids))
+                    local["reads"] += 1
+            except sqlite3.OperationalError as e:
+                if 'locked' not in str(e):
+                    raise
+                local["errors"] += 1
+            finally:
+                done(conn)
+            local_latencies.append(time.perf_counter() - start)
+        with lock:
+            for key in counts:
+                counts[key] += local[key]
+            latencies.extend(local_latencies)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    latencies.sort()
+    total = counts["reads"] + counts["writes"]
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0.0
+    print(f"  {label:<10} {total / seconds:9.0f} req/s  reads {counts['reads']:7d}  writes {counts['writes']:6d}  "
+          f"locked {counts['errors']:4d}  p99 {p99:6.2f} ms")
+    return total / seconds
+
+def database_copy(directory, name, journal_mode):
+    path = os.path.join(directory, name)
+    shutil.copyfile(DATABASE, path)
+    conn = sqlite3.connect(path)
+    conn.execute(f'PRAGMA journal_mode={journal_mode}')
+    conn.close()
+    return path
+
+if __name__ == '__main__':
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    write_percent = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    with tempfile.TemporaryDirectory() as directory:
+        before_path = database_copy(directory, 'before.db', 'DELETE')
+        after_path = database_copy(directory, 'after.db', 'WAL')
+        pool = ConnectionPool(after_path)
+        print(f"{threads} threads, {seconds:g}s, {write_percent}% writes:")
+        before = run("before", before_path, lambda: fresh_connection(before_path), threads, seconds, write_percent)
+        after = run("pooled", after_path, lambda: (pool.acquire(), pool.release), threads, seconds, write_percent)
+        print(f"  speedup    {after / before:9.1f}x")
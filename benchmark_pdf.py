@@ -0,0 +1,47 @@
+"""
+Compares per-report CPU time of the two PDF renderers on the same assessments.
+
+    python benchmark_pdf.py [reports]
+"""
+import sys
+import time
+
+from gemini_service import get_mock_swot_analysis, get_mock_company_comparison
+from pdf_report import generate_risk_report_pdf, generate_risk_report_pdf_pymupdf
+
+def sample_assessments(count):
+    for i in range(count):
+        risk = (i * 37) % 100
+        yield {
+            "project_name": f"Benchmark Project {i}",
+            "industry": ("Technology", "Healthcare", "Retail", "Energy")[i % 4],
+            "description": "A platform connecting small suppliers with regional buyers. " * (1 + i % 5),
+            "budget": 500000 + i * 12500,
+            "timeline": f"{6 + i % 18} months",
+            "location": "Bengaluru",
+            "number_of_cofounders": 1 + i % 4,
+            "technical_complexity": 1 + i % 10,
+            "total_revenue": 2000000 + i * 40000,
+            "total_expense": 1500000 + i * 30000,
+            "risk_level": "Low" if risk < 40 else "Medium" if risk < 70 else "High",
+            "overall_risk": float(risk),
+            "z_score_analysis": {"explanation": "Budget and timeline are within the typical range for the industry. " * (1 + i % 3)},
+        }, {"swot": get_mock_swot_analysis(), "comparison": get_mock_company_comparison()}
+
+def measure(render, reports):
+    render(*reports[0]) # Warm-up: stylesheet, template and font metrics
+    total_bytes = 0
+    start = time.process_time()
+    for assessment_data, gemini_analysis in reports:
+        total_bytes += len(render(assessment_data, gemini_analysis))
+    return (time.process_time() - start) / len(reports) * 1000, total_bytes // len(reports)
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    reports = list(sample_assessments(count))
+    reportlab_ms, reportlab_size = measure(generate_risk_report_pdf, reports)
+    pymupdf_ms, pymupdf_size = measure(generate_risk_report_pdf_pymupdf, reports)
+    print(f"{count} reports, CPU time per report:")
+    print(f"  reportlab  {reportlab_ms:7.2f} ms  {reportlab_size:7d} bytes")
+    print(f"  pymupdf    {pymupdf_ms:7.2f} ms  {pymupdf_size:7d} bytes")
+    print(f"  speedup    {reportlab_ms / pymupdf_ms:7.1f}x")
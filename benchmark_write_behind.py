@@ -0,0 +1,94 @@
+"""
+Assessment submissions from many concurrent requests on a copy of the app database: one INSERT
+and commit per request, against write-behind batches (write_behind.py).
+
+    python benchmark_write_behind.py [threads] [seconds] [max_rows] [max_wait_ms]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import threading
+
+from db_pool import ConnectionPool
+from repository import SqliteStorage, StorageError
+from write_behind import AssessmentWriter
+
+DATABASE = 'database.db'
+
+def assessment(i):
+    return {
+        "project_name": f"Benchmark {i}", "industry": "technology-software", "description": "Benchmark row",
+        "budget": 100000, "timeline": "12 months", "location": "country", "number_of_cofounders": 2,
+        "technical_complexity": 5, "total_expense": 50000, "total_revenue": 80000, "resumes_uploaded": 0,
+        "overall_risk": 42.0, "risk_level": "Medium", "z_score_analysis": json.dumps({"explanation": ""}),
+        "score_version": "benchmark",
+    }
+
+def run(label, create, threads, seconds, commits):
+    """Runs `threads` submitters for `seconds`; commits() gives the number of commits so far."""
+    counts = {"rows": 0, "errors": 0}
+    latencies = []
+    lock = threading.Lock()
+    start_commits = commits()
+    deadline = time.monotonic() + seconds
+
+    def submitter(n):
+        local = {"rows": 0, "errors": 0}
+        local_latencies = []
+        i = 0
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                create(1, assessment(f"{n}-{i}"))
+                local["rows"] += 1
+            except StorageError:
+                local["errors"] += 1
+            local_latencies.append(time.perf_counter() - start)
+            i += 1
+        with lock:
+            for key in counts:
+                counts[key] += local[key]
+            latencies.extend(local_latencies)
+
+    workers = [threading.Thread(target=submitter, args=(n,)) for n in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    latencies.sort()
+    committed = commits() - start_commits
+    p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0.0
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0.0
+    print(f"  {label:<9} {counts['rows'] / seconds:8.0f} rows/s  {committed / seconds:7.0f} commits/s  "
+          f"{counts['rows'] / max(committed, 1):6.1f} rows/commit  errors {counts['errors']:4d}  "
+          f"p50 {p50:6.2f} ms  p99 {p99:7.2f} ms")
+    return counts['rows'] / seconds
+
+if __name__ == '__main__':
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    max_rows = int(sys.argv[3]) if len(sys.argv) > 3 else 64
+    max_wait_ms = float(sys.argv[4]) if len(sys.argv) > 4 else 0
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'benchmark.db')
+        shutil.copyfile(DATABASE, path)
+        storage = SqliteStorage(ConnectionPool(path, max_idle=threads))
+        storage.migrate()
+
+        direct = {"commits": 0}
+        direct_lock = threading.Lock()
+        def create_direct(user_id, values):
+            # What /api/submit-assessment does without write-behind: its own INSERT and commit
+            with storage.session() as repo:
+                repo.create_assessment(user_id, values)
+            with direct_lock:
+                direct["commits"] += 1
+
+        writer = AssessmentWriter(storage, max_rows=max_rows, max_wait_ms=max_wait_ms)
+        print(f"{threads} threads, {seconds:g}s, batches of up to {max_rows} rows or {max_wait_ms:g} ms:")
+        before = run("direct", create_direct, threads, seconds, lambda: direct["commits"])
+        after = run("batched", writer.create_assessment, threads, seconds, lambda: writer.stats()["batches"])
+        print(f"  speedup   {after / before:8.1f}x")
@@ -0,0 +1,120 @@
+import os
+import sqlite3
+import threading
+
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 8)) # Idle connections kept per worker process
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', 32)) # Connections open at once per worker; a request can hold two, so keep it above twice the threads
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10)) # Seconds acquire() waits for a connection when DB_POOL_MAX are in use
+DB_BUSY_TIMEOUT_MS = int(os.getenv('DB_BUSY_TIMEOUT_MS', 5000)) # How long a writer waits for the lock before "database is locked"
+DB_MMAP_SIZE = int(os.getenv('DB_MMAP_SIZE', 256 * 1024 * 1024)) # Bytes of the database file read through mmap
+DB_STATEMENT_CACHE = int(os.getenv('DB_STATEMENT_CACHE', 256)) # Prepared statements kept per connection
+
+def tune_connection(conn):
+    """
+    Applies the settings every connection to the app database should use; the busy timeout is
+    left to the caller. WAL lets readers run alongside the single writer, and with WAL,
+    synchronous=NORMAL stays consistent after a crash while skipping an fsync per commit. The
+    journal mode is stored in the database file, so it also applies to connections opened elsewhere.
+    """
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA mmap_size={DB_MMAP_SIZE}')
+    return conn
+
+def connect(database):
+    """A new tuned connection with sqlite3.Row rows and a DB_STATEMENT_CACHE statement cache."""
+    conn = sqlite3.connect(database, timeout=DB_BUSY_TIMEOUT_MS / 1000, cached_statements=DB_STATEMENT_CACHE,
+                           check_same_thread=False) # The pool hands a connection to one thread at a time
+    conn.row_factory = sqlite3.Row
+    return tune_connection(conn) # sqlite3's timeout is SQLite's busy_timeout
+
+class PoolTimeout(sqlite3.OperationalError):
+    """Raised by ConnectionPool.acquire() when no connection was freed within its timeout."""
+
+class ConnectionPool:
+    """
+    Reuses tuned connections across requests, so each request skips opening the file, running the
+    PRAGMAs and re-preparing statements; a connection's statement cache lives as long as the
+    connection does. At most max_size connections are handed out at once: acquire() opens a new
+    one while under the limit, and otherwise waits up to timeout seconds for a release before
+    raising PoolTimeout. release() keeps up to max_idle connections for reuse and closes the rest.
+    Connections don't survive a fork, so a pool used in a forked worker starts empty.
+    """
+
+    def __init__(self, database, max_idle=DB_POOL_SIZE, max_size=DB_POOL_MAX, timeout=DB_POOL_TIMEOUT):
+        self.database = database
+        self.max_idle = min(max_idle, max_size)
+        self.max_size = max_size
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+        self._idle = []
+        self._in_use = set()
+        self._inherited = []
+        self._pid = os.getpid()
+        self._opened = 0
+        self._reused = 0
+        self._waits = 0
+        self._timeouts = 0
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            # Inherited from the parent process; leave them unclosed so the parent's files aren't touched
+            self._inherited, self._idle, self._in_use, self._pid = self._idle + list(self._in_use), [], set(), os.getpid()
+
+    def acquire(self, timeout=None):
+        """A connection for one thread, waiting up to timeout (default self.timeout) seconds when max_size are in use."""
+        with self._lock:
+            self._check_fork()
+            if not self._idle and len(self._in_use) >= self.max_size:
+                self._waits += 1
+                if not self._released.wait_for(lambda: self._idle or len(self._in_use) < self.max_size,
+                                               self.timeout if timeout is None else timeout):
+                    self._timeouts += 1
+                    raise PoolTimeout(f"Timed out waiting for one of {self.max_size} pooled database connections")
+            if self._idle:
+                self._reused += 1
+                conn = self._idle.pop()
+                self._in_use.add(conn)
+                return conn
+            self._opened += 1
+            placeholder = object() # Holds the slot while the file is opened outside the lock
+            self._in_use.add(placeholder)
+        try:
+            conn = connect(self.database)
+        except BaseException:
+            with self._lock:
+                self._in_use.discard(placeholder)
+                self._released.notify()
+            raise
+        with self._lock:
+            if placeholder in self._in_use: # Not reset by a fork in the meantime
+                self._in_use.discard(placeholder)
+                self._in_use.add(conn)
+        return conn
+
+    def release(self, conn):
+        """Returns a connection to the pool. An open transaction is rolled back, as closing it would."""
+        reusable = True
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = sqlite3.Row
+        except sqlite3.Error as e:
+            print(f"Discarding pooled database connection: {e}")
+            reusable = False
+        with self._lock:
+            self._check_fork()
+            if conn in self._in_use:
+                self._in_use.discard(conn)
+                self._released.notify()
+                if reusable and len(self._idle) < self.max_idle:
+                    self._idle.append(conn)
+                    return
+        conn.close()
+
+    def stats(self):
+        with self._lock:
+            return {"idle": len(self._idle), "in_use": len(self._in_use), "max_idle": self.max_idle,
+                    "max_size": self.max_size, "opened": self._opened, "reused": self._reused,
+                    "waits": self._waits, "timeouts": self._timeouts}
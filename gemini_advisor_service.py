@@ -1,7 +1,10 @@
 import os
+import time
 import google.generativeai as genai
 from dotenv import load_dotenv
 
+from ai_cache import PersistentCache, make_cache_key
+
 load_dotenv()
 
 GEMINI_ADVISOR_API_KEY = os.getenv('GEMINI_ADVISOR_API_KEY')
@@ -17,6 +20,138 @@ if GEMINI_ADVISOR_API_KEY:
 else:
     print("GEMINI_ADVISOR_API_KEY not found in .env. Advisor chat will use mock responses.")
 
+ADVISOR_MOCK_RESPONSE = "I am currently under development. Please check back later for real-time assistance!"
+ADVISOR_ERROR_RESPONSE = "I am experiencing technical difficulties. Please try again later, or contact support if the issue persists."
+ADVISOR_INTERRUPTED_NOTICE = "\n\n[The response was interrupted. Please try again.]"
+
+# History budget: once the prior conversation is estimated above ADVISOR_HISTORY_TOKEN_BUDGET tokens,
+# everything but the last ADVISOR_RECENT_TURNS turns is folded into a running summary
+ADVISOR_HISTORY_TOKEN_BUDGET = int(os.getenv('ADVISOR_HISTORY_TOKEN_BUDGET', 3000))
+ADVISOR_RECENT_TURNS = int(os.getenv('ADVISOR_RECENT_TURNS', 4)) # Turns (user message + reply) always sent verbatim
+ADVISOR_SUMMARY_MAX_TOKENS = int(os.getenv('ADVISOR_SUMMARY_MAX_TOKENS', 400))
+CHARS_PER_TOKEN = 4 # Rough average for English text; only used to enforce the budget
+
+# Summaries are content-addressed, so retries and other workers reuse them
+_summary_cache = PersistentCache("advisor_summaries", ttl_seconds=7 * 24 * 3600, max_entries=5000)
+
+def estimate_tokens(*texts):
+    """Approximate token count of some texts (None is ignored)."""
+    return sum(len(text) for text in texts if text) // CHARS_PER_TOKEN
+
+def _build_history(chat_history=None, user_context=None, summary=None):
+    """
+    Turns the frontend chat history (and optional user context) into Gemini chat history.
+    A running summary of earlier, compacted turns goes right after the user context.
+    """
+    formatted_history = []
+    chat_history = chat_history or []
+
+    # Add user context as an initial system message or user message if available
+    if user_context and not any(msg.get('role') == 'user' and 'context_message' in msg.get('parts', ['']) for msg in chat_history):
+        context_message = (
+            f"The user's name is {user_context.get('first_name', '')} {user_context.get('last_name', '')}. "
+            f"They work at {user_context.get('company', 'an unknown company')} as a {user_context.get('job_title', 'professional')}. "
+            f"Their email is {user_context.get('email', 'unknown')}. "
+            "Keep this context in mind when providing advice."
+        )
+        # Add as a user message with a special flag to avoid re-adding
+        formatted_history.append({'role': 'user', 'parts': [context_message], 'context_message': True})
+        # Add a dummy model response to balance the turn
+        formatted_history.append({'role': 'model', 'parts': ["Understood. How can I assist you today?"]})
+
+    if summary:
+        formatted_history.append({'role': 'user', 'parts': [f"Summary of our conversation so far: {summary}"]})
+        formatted_history.append({'role': 'model', 'parts': ["Thanks, I have that context."]})
+
+    for msg in chat_history:
+        # Only add actual chat messages, not the internal context message
+        if not msg.get('context_message'):
+            formatted_history.append({'role': msg['role'], 'parts': [msg['text']]})
+    return formatted_history
+
+def estimate_prompt_tokens(chat_history, user_context, summary, user_message):
+    """Estimated tokens sent for one turn: user context, summary, verbatim history and the new message."""
+    history = _build_history(chat_history, user_context, summary)
+    return estimate_tokens(user_message, *(part for msg in history for part in msg['parts']))
+
+def compact_history(messages, summary=None, covered=0):
+    """
+    Applies the history budget. messages[:covered] are already folded into summary. If the summary
+    plus messages[covered:] exceed ADVISOR_HISTORY_TOKEN_BUDGET, all but the last
+    ADVISOR_RECENT_TURNS turns are folded in as well. Returns the (possibly new) (summary, covered).
+    """
+    recent_start = max(covered, len(messages) - 2 * ADVISOR_RECENT_TURNS)
+    if recent_start <= covered:
+        return summary, covered
+    if estimate_tokens(summary, *(msg['text'] for msg in messages[covered:])) <= ADVISOR_HISTORY_TOKEN_BUDGET:
+        return summary, covered
+    return _summarize(summary, messages[covered:recent_start]), recent_start
+
+def _summarize(summary, messages):
+    """Folds messages into a running summary, using the advisor model when available."""
+    cache_key = make_cache_key("advisor-summary", ADVISOR_SUMMARY_MAX_TOKENS, summary, messages)
+    cached = _summary_cache.get(cache_key)
+    if cached:
+        return cached["summary"]
+
+    transcript = "\n".join(f"{'User' if msg['role'] == 'user' else 'Advisor'}: {msg['text']}" for msg in messages)
+    if advisor_genai_model:
+        prompt = (
+            "You maintain a running summary of a conversation between a startup founder and a risk advisor. "
+            f"Update the summary with the new exchanges below in at most {ADVISOR_SUMMARY_MAX_TOKENS * 3 // 4} words. "
+            "Keep facts about the user's project, numbers, decisions and open questions; drop pleasantries. "
+            "Reply with the summary only.\n\n"
+            f"Current summary:\n{summary or '(none)'}\n\nNew exchanges:\n{transcript}"
+        )
+        try:
+            new_summary = advisor_genai_model.generate_content(prompt).text.strip()
+            if new_summary:
+                new_summary = new_summary[-ADVISOR_SUMMARY_MAX_TOKENS * CHARS_PER_TOKEN:]
+                _summary_cache.set(cache_key, {"summary": new_summary})
+                return new_summary
+        except Exception as e:
+            print(f"Error summarizing advisor history: {e}. Falling back to an excerpt.")
+
+    # Without the model: keep the start of every message, newest last, within the summary budget
+    excerpt = "\n".join(
+        f"{'User' if msg['role'] == 'user' else 'Advisor'}: {msg['text'][:160]}" for msg in messages
+    )
+    combined = f"{summary}\n{excerpt}" if summary else excerpt
+    return combined[-ADVISOR_SUMMARY_MAX_TOKENS * CHARS_PER_TOKEN:]
+
+def start_advisor_chat(chat_history=None, user_context=None, summary=None):
+    """Starts a Gemini chat session seeded with the given history, or returns None when no model is configured."""
+    if not advisor_genai_model:
+        return None
+    return advisor_genai_model.start_chat(history=_build_history(chat_history, user_context, summary))
+
+def _compact_stateless(chat_history):
+    """
+    History budget for requests that post their whole history: returns (summary, recent messages).
+    Nothing is stored between these requests, so the summary is rebuilt each time by folding the
+    history in fixed windows of ADVISOR_RECENT_TURNS turns from the start. The windows don't move
+    as the conversation grows, so earlier folds are summary cache hits and a request only
+    summarizes the windows completed since the last one, never the whole prefix.
+    """
+    messages = [msg for msg in chat_history or [] if not msg.get('context_message')]
+    window = 2 * max(1, ADVISOR_RECENT_TURNS)
+    summary, covered = None, 0
+    while (covered + window <= len(messages) - 2 * ADVISOR_RECENT_TURNS
+           and estimate_tokens(summary, *(msg['text'] for msg in messages[covered:])) > ADVISOR_HISTORY_TOKEN_BUDGET):
+        summary = _summarize(summary, messages[covered:covered + window])
+        covered += window
+    return summary, messages[covered:]
+
+def stream_advisor_chunks(chat, user_message):
+    """Sends one message on a chat session and yields the reply's text chunks. API errors propagate."""
+    for chunk in chat.send_message(user_message, stream=True):
+        try:
+            text = chunk.text
+        except ValueError: # Chunks without text parts (e.g. a trailing safety/finish chunk)
+            continue
+        if text:
+            yield text
+
 def get_advisor_response(user_message, chat_history=None, user_context=None):
     """
     Gets a response from the Gemini Advisor model.
@@ -24,34 +159,41 @@ def get_advisor_response(user_message, chat_history=None, user_context=None):
     Includes user context in the initial prompt if provided.
     """
     if not advisor_genai_model:
-        return "I am currently under development. Please check back later for real-time assistance!"
+        return ADVISOR_MOCK_RESPONSE
 
     try:
-        formatted_history = []
-        
-        # Add user context as an initial system message or user message if available
-        if user_context and not any(msg.get('role') == 'user' and 'context_message' in msg.get('parts', ['']) for msg in chat_history):
-            context_message = (
-                f"The user's name is {user_context.get('first_name', '')} {user_context.get('last_name', '')}. "
-                f"They work at {user_context.get('company', 'an unknown company')} as a {user_context.get('job_title', 'professional')}. "
-                f"Their email is {user_context.get('email', 'unknown')}. "
-                "Keep this context in mind when providing advice."
-            )
-            # Add as a user message with a special flag to avoid re-adding
-            formatted_history.append({'role': 'user', 'parts': [context_message], 'context_message': True})
-            # Add a dummy model response to balance the turn
-            formatted_history.append({'role': 'model', 'parts': ["Understood. How can I assist you today?"]})
-
-        if chat_history:
-            for msg in chat_history:
-                # Only add actual chat messages, not the internal context message
-                if not msg.get('context_message'):
-                    formatted_history.append({'role': msg['role'], 'parts': [msg['text']]})
-        
-        chat = advisor_genai_model.start_chat(history=formatted_history)
+        started = time.perf_counter()
+        summary, recent = _compact_stateless(chat_history)
+        chat = start_advisor_chat(recent, user_context, summary)
         response = chat.send_message(user_message)
+        print(f"Advisor turn: prompt_tokens_est={estimate_prompt_tokens(recent, user_context, summary, user_message)} "
+              f"latency_ms={round((time.perf_counter() - started) * 1000, 1)}")
         
         return response.text
     except Exception as e:
         print(f"Error during Gemini Advisor API call: {e}. Returning mock response.")
-        return "I am experiencing technical difficulties. Please try again later, or contact support if the issue persists."
+        return ADVISOR_ERROR_RESPONSE
+
+def stream_advisor_response(user_message, chat_history=None, user_context=None):
+    """
+    Streaming variant of get_advisor_response: yields the reply in text chunks as the model
+    generates them. If the call fails before anything was produced, the error message is yielded
+    instead; a failure mid-reply ends the stream with a short notice appended.
+    """
+    if not advisor_genai_model:
+        yield ADVISOR_MOCK_RESPONSE
+        return
+
+    produced = False
+    try:
+        started = time.perf_counter()
+        summary, recent = _compact_stateless(chat_history)
+        chat = start_advisor_chat(recent, user_context, summary)
+        for text in stream_advisor_chunks(chat, user_message):
+            produced = True
+            yield text
+        print(f"Advisor turn: prompt_tokens_est={estimate_prompt_tokens(recent, user_context, summary, user_message)} "
+              f"latency_ms={round((time.perf_counter() - started) * 1000, 1)}")
+    except Exception as e:
+        print(f"Error during streaming Gemini Advisor API call: {e}.")
+        yield ADVISOR_INTERRUPTED_NOTICE if produced else ADVISOR_ERROR_RESPONSE
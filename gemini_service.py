@@ -1,22 +1,52 @@
 import os
 import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
 import google.generativeai as genai
 from dotenv import load_dotenv
 
+from ai_cache import PersistentCache, make_cache_key, AI_CACHE_PATH
+from singleflight import SingleFlight, SQLiteLease
+
 load_dotenv()
 
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+GEMINI_MAX_CONCURRENT_CALLS = int(os.getenv('GEMINI_MAX_CONCURRENT_CALLS', 8)) # Per worker, shared by all requests
+GEMINI_CALL_TIMEOUT = float(os.getenv('GEMINI_CALL_TIMEOUT', 60)) # Seconds to wait for one generate_content call
+GEMINI_MODEL_NAME = 'gemini-2.5-flash'
+# Bump whenever the SWOT or comparison prompt changes, so cached insights from the old prompts are not reused
+PROMPT_TEMPLATE_VERSION = '1'
+AI_INSIGHTS_CACHE_TTL = int(os.getenv('AI_INSIGHTS_CACHE_TTL', 7 * 24 * 3600)) # Seconds
+AI_INSIGHTS_CACHE_MAX_ENTRIES = int(os.getenv('AI_INSIGHTS_CACHE_MAX_ENTRIES', 5000))
+
+# Bounded pool shared by all requests, so the SWOT and comparison prompts run side by side
+# without every request spawning its own threads.
+_gemini_executor = ThreadPoolExecutor(max_workers=GEMINI_MAX_CONCURRENT_CALLS, thread_name_prefix="gemini")
 
 genai_model = None
 if GEMINI_API_KEY:
     try:
         genai.configure(api_key=GEMINI_API_KEY)
-        genai_model = genai.GenerativeModel('gemini-2.5-flash') # Using gemini-2.5-flash as per your screenshot
+        genai_model = genai.GenerativeModel(GEMINI_MODEL_NAME) # Using gemini-2.5-flash as per your screenshot
     except Exception as e:
         print(f"Error configuring Gemini API with provided key: {e}. AI insights will use mock data.")
 else:
     print("GEMINI_API_KEY not found in .env. AI insights will use mock data.")
 
+# Shared by all workers; keyed by the normalized prompt inputs, so identical assessments share one entry
+_insights_cache = PersistentCache("gemini_insights", AI_INSIGHTS_CACHE_TTL, AI_INSIGHTS_CACHE_MAX_ENTRIES)
+# Identical concurrent requests share one upstream call: SingleFlight across threads in this worker,
+# a lease in the shared cache database across workers
+_insights_flight = SingleFlight()
+_insights_lease = SQLiteLease(AI_CACHE_PATH, table="insight_leases")
+INSIGHTS_LEASE_TTL = 2 * GEMINI_CALL_TIMEOUT + 10 # Long enough for both calls, even if one times out
+
+# Assessment fields that end up in the SWOT/comparison prompts
+_PROMPT_FIELDS = ("project_name", "industry", "description", "budget", "timeline", "location",
+                  "number_of_cofounders", "technical_complexity", "total_revenue", "total_expense")
+_PROMPT_SCORE_FIELDS = ("budget", "timeline", "location", "cofounders", "technical_complexity", "combined_z_score")
+
 def get_mock_swot_analysis():
     return {
         "strengths": [
@@ -82,10 +112,32 @@ def get_mock_company_comparison():
         ]
     }
 
-def get_gemini_insights(assessment_data):
+def _normalize_prompt_value(value):
+    if isinstance(value, str):
+        return " ".join(value.split()) # Whitespace differences don't change the prompt's meaning
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value) # 500000 and 500000.0 render the same prompt
+    return value
+
+def insights_cache_key(assessment_data):
+    """Cache key for an assessment: hash of the normalized prompt inputs, prompt version and model."""
+    scores = assessment_data.get("z_score_analysis") or {}
+    return make_cache_key(
+        PROMPT_TEMPLATE_VERSION,
+        GEMINI_MODEL_NAME,
+        {field: _normalize_prompt_value(assessment_data.get(field)) for field in _PROMPT_FIELDS},
+        {field: _normalize_prompt_value(scores.get(field, 0)) for field in _PROMPT_SCORE_FIELDS},
+    )
+
+def get_insights_cache_stats():
+    return _insights_cache.stats()
+
+def get_gemini_insights(assessment_data, bypass_cache=False):
     """
     Generates combined SWOT analysis and company comparison insights using Gemini API.
     Returns mock data if API is not configured or an error occurs during the API call.
+    Complete (non-mock) results are cached by insights_cache_key; bypass_cache=True forces
+    fresh calls and replaces the cached entry.
     """
     if not genai_model:
         return {
@@ -94,6 +146,43 @@ def get_gemini_insights(assessment_data):
             "mock_message": "AI assistance is not available at the moment, but here are a few general tips:"
         }
 
+    cache_key = insights_cache_key(assessment_data)
+    if not bypass_cache:
+        cached = _insights_cache.get(cache_key)
+        if cached is not None:
+            cached["cached"] = True
+            return cached
+
+    # A refresh only joins other refreshes: a call already in flight may return the cached entry it's replacing
+    flight_key = f"{cache_key}:refresh" if bypass_cache else cache_key
+    return dict(_insights_flight.do(flight_key, lambda: _generate_insights_once(assessment_data, cache_key, flight_key)))
+
+def _generate_insights_once(assessment_data, cache_key, flight_key):
+    """
+    Generates and caches insights while holding the cross-worker lease for flight_key. If another
+    worker holds it, waits for that worker's result to land in the cache instead of calling Gemini again.
+    """
+    owner = uuid.uuid4().hex
+    waiting_since = time.time()
+    while not _insights_lease.acquire(flight_key, owner, INSIGHTS_LEASE_TTL):
+        time.sleep(0.25)
+        cached = _insights_cache.get(cache_key, newer_than=waiting_since, record_stats=False)
+        if cached is not None:
+            cached["cached"] = True
+            return cached
+        # Otherwise the other worker failed or its lease expired; acquire() succeeds once it's free
+
+    try:
+        insights, complete = _generate_insights(assessment_data)
+        if complete:
+            _insights_cache.set(cache_key, insights) # Don't cache mock fallbacks from failed calls
+        insights["cached"] = False
+        return insights
+    finally:
+        _insights_lease.release(flight_key, owner)
+
+def _generate_insights(assessment_data):
+    """Runs both Gemini prompts. Returns (insights, complete) where complete means neither call failed."""
     # Prepare prompt for SWOT analysis
     swot_prompt = f"""
     Analyze the following business project assessment data and provide a comprehensive SWOT analysis and recommendations.
@@ -152,48 +241,72 @@ def get_gemini_insights(assessment_data):
     }}
     """
 
-    try:
-        swot_response = genai_model.generate_content(swot_prompt)
-        swot_text = swot_response.text
-        swot_analysis = {}
-        try:
-            start_idx = swot_text.find("{")
-            end_idx = swot_text.rfind("}") + 1
-            if start_idx != -1 and end_idx != -1:
-                json_str = swot_text[start_idx:end_idx]
-                swot_analysis = json.loads(json_str)
-            else:
-                print("Could not parse SWOT JSON from Gemini response, using mock.")
-                swot_analysis = get_mock_swot_analysis()
-        except json.JSONDecodeError as parse_error:
-            print(f"Error parsing SWOT response: {parse_error}, using mock.")
-            swot_analysis = get_mock_swot_analysis()
-
-        comparison_response = genai_model.generate_content(comparison_prompt)
-        comparison_text = comparison_response.text
-        company_comparison = {}
-        try:
-            start_idx = comparison_text.find("{")
-            end_idx = comparison_text.rfind("}") + 1
-            if start_idx != -1 and end_idx != -1:
-                json_str = comparison_text[start_idx:end_idx]
-                company_comparison = json.loads(json_str)
-            else:
-                print("Could not parse Comparison JSON from Gemini response, using mock.")
-                company_comparison = get_mock_company_comparison()
-        except json.JSONDecodeError as parse_error:
-            print(f"Error parsing Comparison response: {parse_error}, using mock.")
-            company_comparison = get_mock_company_comparison()
+    started = time.perf_counter()
+    swot_future = _gemini_executor.submit(_generate_section, swot_prompt, "SWOT", get_mock_swot_analysis)
+    comparison_future = _gemini_executor.submit(_generate_section, comparison_prompt, "Comparison", get_mock_company_comparison)
+    # One deadline for both calls, so a slow pair can't take twice GEMINI_CALL_TIMEOUT
+    done, _ = wait([swot_future, comparison_future], timeout=GEMINI_CALL_TIMEOUT)
+    swot_analysis, swot_ok, swot_ms = _section_result(swot_future, done, "SWOT", get_mock_swot_analysis)
+    company_comparison, comparison_ok, comparison_ms = _section_result(comparison_future, done, "Comparison", get_mock_company_comparison)
+    timings = {
+        "swot_ms": swot_ms,
+        "comparison_ms": comparison_ms,
+        "total_ms": round((time.perf_counter() - started) * 1000, 1), # Wall clock; serial calls would take the sum
+    }
+    print(f"Gemini insights timings: {timings}")
 
+    if not swot_ok and not comparison_ok:
+        print("Both Gemini calls failed in get_gemini_insights. Returning mock insights.")
         return {
             "swot": swot_analysis,
-            "comparison": company_comparison
-        }
+            "comparison": company_comparison,
+            "mock_message": "AI assistance is not available at the moment, but here are a few general tips:",
+            "timings": timings
+        }, False
 
+    return {
+        "swot": swot_analysis,
+        "comparison": company_comparison,
+        "timings": timings
+    }, swot_ok and comparison_ok
+
+def _parse_json_section(text, label, mock_fn):
+    """
+    Extracts the JSON object from a Gemini response. Returns (section, parsed); a response without
+    one falls back to mock data with parsed=False.
+    """
+    try:
+        start_idx = text.find("{")
+        end_idx = text.rfind("}") + 1
+        if start_idx != -1 and end_idx > start_idx:
+            return json.loads(text[start_idx:end_idx]), True
+        print(f"Could not parse {label} JSON from Gemini response, using mock.")
+    except json.JSONDecodeError as parse_error:
+        print(f"Error parsing {label} response: {parse_error}, using mock.")
+    return mock_fn(), False
+
+def _generate_section(prompt, label, mock_fn):
+    """
+    Runs one generate_content call on the shared pool. Returns (section, succeeded, elapsed_ms);
+    API errors and unparseable replies fall back to mock data for this section only.
+    """
+    started = time.perf_counter()
+    try:
+        response = genai_model.generate_content(prompt)
+        section, ok = _parse_json_section(response.text, label, mock_fn) # A mock fallback counts as a failed call
     except Exception as e:
-        print(f"Error during Gemini API call in get_gemini_insights: {e}. Returning mock insights.")
-        return {
-            "swot": get_mock_swot_analysis(),
-            "comparison": get_mock_company_comparison(),
-            "mock_message": "AI assistance is not available at the moment, but here are a few general tips:"
-        }
+        print(f"Error during Gemini API call for {label}: {e}. Using mock {label} data.")
+        section, ok = mock_fn(), False
+    return section, ok, round((time.perf_counter() - started) * 1000, 1)
+
+def _section_result(future, done, label, mock_fn):
+    """A finished section's (section, succeeded, elapsed_ms), or mock data for one that missed the deadline."""
+    if future not in done:
+        future.cancel() # Frees its pool slot if the call hasn't started yet
+        print(f"Gemini {label} call did not complete within {GEMINI_CALL_TIMEOUT}s. Using mock {label} data.")
+        return mock_fn(), False, round(GEMINI_CALL_TIMEOUT * 1000, 1)
+    try:
+        return future.result()
+    except Exception as e:
+        print(f"Gemini {label} call failed: {e!r}. Using mock {label} data.")
+        return mock_fn(), False, round(GEMINI_CALL_TIMEOUT * 1000, 1)
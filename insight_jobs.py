@@ -0,0 +1,195 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from gemini_service import get_gemini_insights, insights_cache_key, INSIGHTS_LEASE_TTL
+from pdf_cache import invalidate_reports
+from db_pool import tune_connection
+
+INSIGHT_JOB_WORKERS = int(os.getenv('INSIGHT_JOB_WORKERS', 4)) # Insight jobs running at once per worker process
+INSIGHT_JOB_QUEUE_LIMIT = int(os.getenv('INSIGHT_JOB_QUEUE_LIMIT', 32)) # Queued + running jobs before new ones are refused
+INSIGHT_JOB_RETENTION_SECONDS = 24 * 3600
+INSIGHT_JOB_STALE_SECONDS = INSIGHTS_LEASE_TTL + 60 # An active job older than this belongs to a dead worker
+
+# Jobs run on this pool, so request threads only enqueue work and return
+_job_executor = ThreadPoolExecutor(max_workers=INSIGHT_JOB_WORKERS, thread_name_prefix="insight-job")
+_pending_lock = threading.Lock()
+_pending_jobs = 0
+
+class InsightQueueFull(Exception):
+    """Raised when INSIGHT_JOB_QUEUE_LIMIT jobs are already queued or running in this worker."""
+
+def init_insight_jobs_schema(conn):
+    """
+    Job state lives in the database, so any worker can answer status requests for any job. The
+    table is in the local SQLite file whatever the storage backend, so with PostgreSQL a job's
+    status is only visible on the host that ran it.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS insight_jobs (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            assessment_id INTEGER NOT NULL,
+            status TEXT NOT NULL, -- queued, running, completed, failed
+            coalesce_key TEXT, -- user, assessment and prompt-input hash; identical requests share a job
+            result TEXT, -- JSON insights once completed
+            error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (assessment_id) REFERENCES assessments (id)
+        )
+    ''')
+    job_columns = {row[1] for row in conn.execute('PRAGMA table_info(insight_jobs)')}
+    if 'coalesce_key' not in job_columns:
+        conn.execute('ALTER TABLE insight_jobs ADD COLUMN coalesce_key TEXT')
+    # At most one active job per key, enforced by the database so it holds across workers
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_insight_jobs_active ON insight_jobs (coalesce_key) "
+        "WHERE status IN ('queued', 'running')"
+    )
+    conn.commit()
+
+def _connect(database):
+    conn = sqlite3.connect(database, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return tune_connection(conn)
+
+def _set_status(conn, job_id, status, result=None, error=None):
+    conn.execute(
+        'UPDATE insight_jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?',
+        (status, result, error, time.time(), job_id)
+    )
+    conn.commit()
+
+def _run_job(database, storage, job_id, user_id, assessment_id, assessment_data, bypass_cache):
+    global _pending_jobs
+    conn = _connect(database)
+    try:
+        _set_status(conn, job_id, 'running')
+        gemini_insights = get_gemini_insights(assessment_data, bypass_cache=bypass_cache)
+        result = json.dumps(gemini_insights)
+        with storage.session() as repo:
+            repo.set_gemini_analysis(assessment_id, user_id, result)
+        _set_status(conn, job_id, 'completed', result=result)
+        invalidate_reports(assessment_id) # Cached PDFs show the previous analysis
+    except Exception as e:
+        print(f"Error in insight job {job_id}: {e}")
+        try:
+            conn.rollback()
+            _set_status(conn, job_id, 'failed', error="Failed to generate AI insights")
+        except sqlite3.Error as db_error:
+            print(f"Database error marking insight job {job_id} as failed: {db_error}")
+    finally:
+        conn.close()
+        with _pending_lock:
+            _pending_jobs -= 1
+
+def submit_insight_job(database, storage, user_id, assessment_id, assessment_data, bypass_cache=False):
+    """
+    Records a queued job and hands it to the background pool. Returns (job_id, coalesced)
+    immediately. If an identical job (same user, assessment, prompt inputs and refresh flag) is already queued
+    or running in any worker, its id is returned with coalesced=True and no new work is started.
+    Raises InsightQueueFull when this worker already has INSIGHT_JOB_QUEUE_LIMIT jobs in flight.
+    """
+    global _pending_jobs
+    coalesce_key = f"{user_id}:{assessment_id}:{insights_cache_key(assessment_data)}"
+    if bypass_cache:
+        coalesce_key += ":refresh" # A forced refresh mustn't be answered by a job that may read the cache
+    now = time.time()
+    conn = _connect(database)
+    try:
+        conn.execute('DELETE FROM insight_jobs WHERE created_at < ?', (now - INSIGHT_JOB_RETENTION_SECONDS,))
+        conn.execute(
+            "UPDATE insight_jobs SET status = 'failed', error = 'Abandoned by its worker', updated_at = ? "
+            "WHERE coalesce_key = ? AND status IN ('queued', 'running') AND updated_at < ?",
+            (now, coalesce_key, now - INSIGHT_JOB_STALE_SECONDS)
+        )
+        conn.commit()
+        existing = _active_job_id(conn, coalesce_key)
+        if existing:
+            return existing, True
+
+        with _pending_lock:
+            if _pending_jobs >= INSIGHT_JOB_QUEUE_LIMIT:
+                raise InsightQueueFull()
+            _pending_jobs += 1
+        job_id = uuid.uuid4().hex
+        try:
+            conn.execute(
+                'INSERT INTO insight_jobs (id, user_id, assessment_id, status, coalesce_key, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (job_id, user_id, assessment_id, 'queued', coalesce_key, now, now)
+            )
+            conn.commit()
+        except sqlite3.IntegrityError:
+            # Another request (possibly in another worker) created the same job in the meantime
+            conn.rollback()
+            with _pending_lock:
+                _pending_jobs -= 1
+            existing = _active_job_id(conn, coalesce_key)
+            if existing:
+                return existing, True
+            raise
+        except Exception:
+            with _pending_lock:
+                _pending_jobs -= 1
+            raise
+        _job_executor.submit(_run_job, database, storage, job_id, user_id, assessment_id, assessment_data, bypass_cache)
+        return job_id, False
+    finally:
+        conn.close()
+
+def _active_job_id(conn, coalesce_key):
+    row = conn.execute(
+        "SELECT id FROM insight_jobs WHERE coalesce_key = ? AND status IN ('queued', 'running')", (coalesce_key,)
+    ).fetchone()
+    return row['id'] if row else None
+
+def get_insight_job(conn, job_id, user_id):
+    """Returns a user's job as a dict (with the parsed result once completed), or None."""
+    job = conn.execute(
+        'SELECT id, assessment_id, status, result, error, created_at, updated_at FROM insight_jobs '
+        'WHERE id = ? AND user_id = ?',
+        (job_id, user_id)
+    ).fetchone()
+    if job is None:
+        return None
+    job = dict(job)
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    return job
+
+def stream_insight_job(database, job_id, user_id, poll_interval=0.5, timeout=300):
+    """
+    Yields Server-Sent Events for a job: a "status" event whenever its status changes and a final
+    "done" (or "failed") event carrying the job, after which the stream ends.
+    """
+    conn = _connect(database)
+    try:
+        last_status = None
+        last_sent = time.monotonic()
+        deadline = last_sent + timeout
+        while time.monotonic() < deadline:
+            job = get_insight_job(conn, job_id, user_id)
+            if job is None:
+                yield f"event: failed\ndata: {json.dumps({'error': 'Job not found'})}\n\n"
+                return
+            if job['status'] in ('completed', 'failed'):
+                event = 'done' if job['status'] == 'completed' else 'failed'
+                yield f"event: {event}\ndata: {json.dumps(job)}\n\n"
+                return
+            if job['status'] != last_status:
+                last_status = job['status']
+                last_sent = time.monotonic()
+                yield f"event: status\ndata: {json.dumps({'status': last_status})}\n\n"
+            elif time.monotonic() - last_sent > 15:
+                last_sent = time.monotonic()
+                yield ": keep-alive\n\n" # Lets the server notice a closed connection
+            time.sleep(poll_interval)
+        yield f"event: failed\ndata: {json.dumps({'error': 'Timed out waiting for AI insights'})}\n\n"
+    finally:
+        conn.close()
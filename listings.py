@@ -0,0 +1,105 @@
+import os
+import re
+import json
+import base64
+
+LIST_PAGE_SIZE = int(os.getenv('LIST_PAGE_SIZE', 24)) # Rows per page of the organization directory and assessment history
+LIST_MAX_PAGE_SIZE = 100
+SEARCH_MAX_TERMS = 8
+
+# Full-text indexes over the searchable columns. They are external-content tables, so the text
+# isn't stored twice; triggers keep them in step with every insert, update and delete. Words are
+# stemmed (porter), so "payment" finds "payments".
+_FTS_TABLES = {
+    'organizations_fts': ('organizations', ('name', 'contact_person')),
+    'assessments_fts': ('assessments', ('project_name', 'description', 'user_id')), # user_id scopes a search to its owner
+}
+
+class InvalidCursor(ValueError):
+    pass
+
+def create_search_schema(conn):
+    """Migration step: the FTS5 indexes and their triggers, filled from their tables when first created."""
+    for fts_table, (table, columns) in _FTS_TABLES.items():
+        created = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts_table,)
+        ).fetchone() is None
+        column_list = ', '.join(columns)
+        new_values = ', '.join(f'NEW.{column}' for column in columns)
+        old_values = ', '.join(f'OLD.{column}' for column in columns)
+        conn.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5({column_list}, content='{table}', content_rowid='id', "
+            "tokenize='porter unicode61')"
+        )
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_insert AFTER INSERT ON {table}
+            BEGIN
+                INSERT INTO {fts_table} (rowid, {column_list}) VALUES (NEW.id, {new_values});
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_delete AFTER DELETE ON {table}
+            BEGIN
+                INSERT INTO {fts_table} ({fts_table}, rowid, {column_list}) VALUES ('delete', OLD.id, {old_values});
+            END
+        ''')
+        # Only edits to the indexed columns touch the index; re-scoring updates leave it alone
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_update AFTER UPDATE OF {column_list} ON {table}
+            BEGIN
+                INSERT INTO {fts_table} ({fts_table}, rowid, {column_list}) VALUES ('delete', OLD.id, {old_values});
+                INSERT INTO {fts_table} (rowid, {column_list}) VALUES (NEW.id, {new_values});
+            END
+        ''')
+        if created:
+            conn.execute(f"INSERT INTO {fts_table} ({fts_table}) VALUES ('rebuild')")
+
+def rebuild_search_index(conn):
+    """Rebuilds every full-text index from its table."""
+    for fts_table in _FTS_TABLES:
+        conn.execute(f"INSERT INTO {fts_table} ({fts_table}) VALUES ('rebuild')")
+    conn.commit()
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(',', ':')).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, types):
+    """The values of an opaque cursor from encode_cursor, checked against types, or InvalidCursor."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {e}")
+    if not isinstance(values, list) or len(values) != len(types) or not all(
+        isinstance(value, kind) and not isinstance(value, bool) for value, kind in zip(values, types)
+    ):
+        raise InvalidCursor("Invalid cursor")
+    return values
+
+def search_words(text):
+    """The words of a free-text search (at most SEARCH_MAX_TERMS), lowercased, without punctuation."""
+    return re.findall(r'\w+', (text or '').lower())[:SEARCH_MAX_TERMS]
+
+def search_terms(text):
+    """
+    The FTS5 query for free text: every word must match. Words are quoted, so FTS5 operators in the
+    input are matched as text. Whole words only: a prefix query merges the entries of every word
+    it expands to, which grows with the table. Returns None when there is nothing to search for.
+    """
+    words = search_words(text)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"' for word in words)
+
+def page_size(requested):
+    return min(max(requested or LIST_PAGE_SIZE, 1), LIST_MAX_PAGE_SIZE)
+
+def page_rows(rows, limit, cursor_of):
+    """
+    A page read as limit + 1 rows, as (rows, next_cursor): the look-ahead row is dropped and only
+    tells whether there is a next page. next_cursor is None on the last page.
+    """
+    rows = [dict(row) for row in rows]
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(cursor_of(rows[-1]))
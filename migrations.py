@@ -0,0 +1,234 @@
+from assessment_stats import create_assessment_stats_schema
+from listings import create_search_schema
+
+# Schema of the users, assessments and organizations tables, one numbered migration per change.
+# Each migration has the statements (or functions taking the connection) for both backends, and
+# the two must describe the same schema. Never edit an applied migration; append a new one.
+#
+# Databases created before schema_migrations existed already have some of these objects, so the
+# SQLite steps are written to be re-runnable (IF NOT EXISTS, column checks).
+
+SCHEMA_MIGRATIONS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+def _add_column(table, column, definition):
+    """SQLite step adding a column unless the table already has it."""
+    def step(conn):
+        if column not in {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+    return step
+
+# Postgres: assessment counters kept by one trigger function; see assessment_stats.py for the SQLite triggers
+_POSTGRES_STATS_TRIGGER = '''
+    CREATE FUNCTION assessment_stats_trigger() RETURNS trigger AS $$
+    DECLARE
+        delta INTEGER := CASE TG_OP WHEN 'DELETE' THEN -1 ELSE 1 END;
+        r assessments%ROWTYPE;
+    BEGIN
+        IF TG_OP = 'UPDATE' THEN
+            -- Only the counters of the changed columns move; 'total' is unaffected by updates
+            INSERT INTO assessment_stats (scope, key, count)
+            SELECT v.scope, v.key, v.delta FROM (VALUES
+                ('risk_level', OLD.risk_level, -1, OLD.risk_level IS DISTINCT FROM NEW.risk_level),
+                ('risk_level', NEW.risk_level, 1, OLD.risk_level IS DISTINCT FROM NEW.risk_level),
+                ('industry', OLD.industry, -1, OLD.industry IS DISTINCT FROM NEW.industry),
+                ('industry', NEW.industry, 1, OLD.industry IS DISTINCT FROM NEW.industry),
+                ('user', OLD.user_id::text, -1, OLD.user_id IS DISTINCT FROM NEW.user_id),
+                ('user', NEW.user_id::text, 1, OLD.user_id IS DISTINCT FROM NEW.user_id)
+            ) AS v (scope, key, delta, changed)
+            WHERE v.changed
+            ON CONFLICT (scope, key) DO UPDATE SET count = assessment_stats.count + EXCLUDED.count;
+            RETURN NULL;
+        END IF;
+        IF TG_OP = 'INSERT' THEN r := NEW; ELSE r := OLD; END IF;
+        INSERT INTO assessment_stats (scope, key, count) VALUES
+            ('total', '', delta), ('risk_level', r.risk_level, delta), ('industry', r.industry, delta),
+            ('user', r.user_id::text, delta)
+        ON CONFLICT (scope, key) DO UPDATE SET count = assessment_stats.count + EXCLUDED.count;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+'''
+
+MIGRATIONS = [
+    (1, 'create users, assessments and organizations', {
+        'sqlite': [
+            '''CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                first_name TEXT NOT NULL,
+                last_name TEXT NOT NULL,
+                email TEXT UNIQUE NOT NULL,
+                password_hash TEXT NOT NULL,
+                company TEXT,
+                job_title TEXT,
+                registered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )''',
+            '''CREATE TABLE IF NOT EXISTS assessments (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                project_name TEXT NOT NULL,
+                industry TEXT NOT NULL,
+                description TEXT NOT NULL,
+                budget REAL NOT NULL,
+                timeline TEXT NOT NULL,
+                location TEXT NOT NULL,
+                number_of_cofounders INTEGER NOT NULL,
+                technical_complexity INTEGER NOT NULL,
+                total_expense REAL NOT NULL,
+                total_revenue REAL NOT NULL,
+                resumes_uploaded INTEGER DEFAULT 0,
+                overall_risk REAL NOT NULL,
+                risk_level TEXT NOT NULL,
+                z_score_analysis TEXT NOT NULL, -- Store as JSON string (now stores explanation)
+                gemini_analysis TEXT, -- Store as JSON string (now stores combined SWOT and comparison)
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )''',
+            '''CREATE TABLE IF NOT EXISTS organizations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL UNIQUE, -- User who registered/owns this organization
+                name TEXT NOT NULL UNIQUE,
+                email TEXT NOT NULL,
+                contact_person TEXT,
+                logo_url TEXT, -- Optional URL for logo
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )''',
+        ],
+        # Timestamps are stored in UTC, like SQLite's CURRENT_TIMESTAMP
+        'postgres': [
+            '''CREATE TABLE users (
+                id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+                first_name TEXT NOT NULL,
+                last_name TEXT NOT NULL,
+                email TEXT UNIQUE NOT NULL,
+                password_hash TEXT NOT NULL,
+                company TEXT,
+                job_title TEXT,
+                registered_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc')
+            )''',
+            '''CREATE TABLE assessments (
+                id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+                user_id BIGINT NOT NULL REFERENCES users (id),
+                project_name TEXT NOT NULL,
+                industry TEXT NOT NULL,
+                description TEXT NOT NULL,
+                budget DOUBLE PRECISION NOT NULL,
+                timeline TEXT NOT NULL,
+                location TEXT NOT NULL,
+                number_of_cofounders INTEGER NOT NULL,
+                technical_complexity INTEGER NOT NULL,
+                total_expense DOUBLE PRECISION NOT NULL,
+                total_revenue DOUBLE PRECISION NOT NULL,
+                resumes_uploaded INTEGER DEFAULT 0,
+                overall_risk DOUBLE PRECISION NOT NULL,
+                risk_level TEXT NOT NULL,
+                z_score_analysis TEXT NOT NULL,
+                gemini_analysis TEXT,
+                created_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc')
+            )''',
+            '''CREATE TABLE organizations (
+                id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+                user_id BIGINT NOT NULL UNIQUE REFERENCES users (id),
+                name TEXT NOT NULL UNIQUE,
+                email TEXT NOT NULL,
+                contact_person TEXT,
+                logo_url TEXT,
+                created_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc')
+            )''',
+        ],
+    }),
+    (2, 'add assessments.score_version', {
+        'sqlite': [_add_column('assessments', 'score_version', 'TEXT')], # Ruleset version that produced overall_risk
+        'postgres': ['ALTER TABLE assessments ADD COLUMN score_version TEXT'],
+    }),
+    (3, 'index the latest-assessment lookup', {
+        'sqlite': ['CREATE INDEX IF NOT EXISTS idx_assessments_user_created ON assessments (user_id, created_at)'],
+        'postgres': ['CREATE INDEX idx_assessments_user_created ON assessments (user_id, created_at)'],
+    }),
+    (4, 'trigger-maintained assessment counters', {
+        'sqlite': [create_assessment_stats_schema],
+        'postgres': [
+            '''CREATE TABLE assessment_stats (
+                scope TEXT NOT NULL, -- total, risk_level, industry or user
+                key TEXT NOT NULL,
+                count BIGINT NOT NULL DEFAULT 0,
+                PRIMARY KEY (scope, key)
+            )''',
+            _POSTGRES_STATS_TRIGGER,
+            '''CREATE TRIGGER trg_assessment_stats AFTER INSERT OR DELETE OR UPDATE OF risk_level, industry, user_id
+               ON assessments FOR EACH ROW EXECUTE FUNCTION assessment_stats_trigger()''',
+            "INSERT INTO assessment_stats (scope, key, count) SELECT 'total', '', COUNT(*) FROM assessments",
+            "INSERT INTO assessment_stats (scope, key, count) SELECT 'risk_level', risk_level, COUNT(*) FROM assessments GROUP BY risk_level",
+            "INSERT INTO assessment_stats (scope, key, count) SELECT 'industry', industry, COUNT(*) FROM assessments GROUP BY industry",
+            "INSERT INTO assessment_stats (scope, key, count) SELECT 'user', user_id::text, COUNT(*) FROM assessments GROUP BY user_id",
+        ],
+    }),
+    (5, 'index assessments by industry', {
+        'sqlite': ['CREATE INDEX IF NOT EXISTS idx_assessments_industry ON assessments (industry)'],
+        'postgres': ['CREATE INDEX idx_assessments_industry ON assessments (industry)'],
+    }),
+    (6, 'add organization focus metadata', {
+        # NULL means no preference
+        'sqlite': [
+            _add_column('organizations', 'focus_industries', 'TEXT'), # JSON list of industry values
+            _add_column('organizations', 'min_ticket', 'REAL'), # Smallest project budget funded
+            _add_column('organizations', 'max_ticket', 'REAL'), # Largest project budget funded
+            _add_column('organizations', 'location_scopes', 'TEXT'), # JSON list of geographic scopes
+        ],
+        'postgres': [
+            'ALTER TABLE organizations ADD COLUMN focus_industries TEXT',
+            'ALTER TABLE organizations ADD COLUMN min_ticket DOUBLE PRECISION',
+            'ALTER TABLE organizations ADD COLUMN max_ticket DOUBLE PRECISION',
+            'ALTER TABLE organizations ADD COLUMN location_scopes TEXT',
+        ],
+    }),
+    (7, 'full-text search over organizations and assessments', {
+        'sqlite': [create_search_schema],
+        # Generated tsvector columns with GIN indexes; stemmed like the SQLite porter tokenizer
+        'postgres': [
+            '''ALTER TABLE organizations ADD COLUMN search tsvector GENERATED ALWAYS AS
+               (to_tsvector('english', name || ' ' || coalesce(contact_person, ''))) STORED''',
+            'CREATE INDEX idx_organizations_search ON organizations USING GIN (search)',
+            '''ALTER TABLE assessments ADD COLUMN search tsvector GENERATED ALWAYS AS
+               (to_tsvector('english', project_name || ' ' || description)) STORED''',
+            'CREATE INDEX idx_assessments_search ON assessments USING GIN (search)',
+        ],
+    }),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def apply_migrations(conn, dialect, transaction, placeholder):
+    """
+    Applies the pending migrations in order, each in its own transaction together with its row in
+    schema_migrations. `transaction()` must begin a transaction that holds the backend's schema
+    lock, so workers starting at once apply each migration exactly once; the applied versions are
+    re-read under that lock. Returns the versions applied.
+    """
+    with transaction():
+        conn.execute(SCHEMA_MIGRATIONS_TABLE)
+    applied = []
+    for version, name, steps in MIGRATIONS:
+        with transaction():
+            done = conn.execute(
+                f'SELECT 1 FROM schema_migrations WHERE version = {placeholder}', (version,)
+            ).fetchone()
+            if done:
+                continue
+            for step in steps[dialect]:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(
+                f'INSERT INTO schema_migrations (version, name) VALUES ({placeholder}, {placeholder})', (version, name)
+            )
+        applied.append(version)
+        print(f"Applied migration {version}: {name}")
+    return applied
@@ -0,0 +1,179 @@
+import os
+import json
+import math
+import heapq
+import time
+import threading
+
+from repository import StorageError
+
+ORG_MATCH_TOP_K = int(os.getenv('ORG_MATCH_TOP_K', 5)) # Organizations returned when the caller doesn't ask for a number
+ORG_MATCH_MAX_K = 50
+ORG_MATCH_INDEX_TTL = int(os.getenv('ORG_MATCH_INDEX_TTL', 600)) # Seconds before the index is rebuilt in full
+
+# The industries and geographic scopes an assessment can have (see assessment.html)
+INDUSTRY_CHOICES = [
+    ('technology-software', 'Technology - Software Development'),
+    ('technology-hardware', 'Technology - Hardware/IoT'),
+    ('e-commerce-retail', 'E-commerce - Retail'),
+    ('e-commerce-marketplace', 'E-commerce - Marketplace'),
+    ('fintech-payments', 'Fintech - Payments/Banking'),
+    ('fintech-investments', 'Fintech - Investments/Wealth Management'),
+    ('healthcare-biotech', 'Healthcare - Biotech/Pharma'),
+    ('healthcare-digital', 'Healthcare - Digital Health/Telemedicine'),
+    ('education-edtech', 'Education - EdTech'),
+    ('education-traditional', 'Education - Traditional Institutions'),
+    ('manufacturing-automotive', 'Manufacturing - Automotive'),
+    ('manufacturing-consumer', 'Manufacturing - Consumer Goods'),
+    ('food-beverage', 'Food & Beverage'),
+    ('real-estate', 'Real Estate'),
+    ('media-entertainment', 'Media & Entertainment'),
+    ('travel-hospitality', 'Travel & Hospitality'),
+    ('energy-renewables', 'Energy - Renewables'),
+    ('agriculture', 'Agriculture'),
+    ('consulting', 'Consulting'),
+    ('non-profit', 'Non-Profit'),
+    ('other', 'Other'),
+]
+LOCATION_SCOPE_CHOICES = [('local', 'Local (City/Region)'), ('country', 'Country-wide'), ('global', 'Global')]
+
+ANY = '*' # Posting list of organizations with no preference for a field
+
+def parse_focus(form):
+    """
+    Reads the focus fields of the registration form. Returns (focus, errors), with focus holding
+    the column values to store.
+    """
+    errors = {}
+    industries = [value for value in form.getlist('focus_industries') if value]
+    scopes = [value for value in form.getlist('location_scopes') if value]
+    if set(industries) - {value for value, _ in INDUSTRY_CHOICES}:
+        errors['focus_industries'] = "Unknown industry selected."
+    if set(scopes) - {value for value, _ in LOCATION_SCOPE_CHOICES}:
+        errors['location_scopes'] = "Unknown geographic scope selected."
+    tickets = {}
+    for field, label in (('min_ticket', 'Minimum'), ('max_ticket', 'Maximum')):
+        raw = (form.get(field) or '').strip()
+        try:
+            tickets[field] = float(raw) if raw else None
+        except ValueError:
+            tickets[field] = None
+            errors[field] = f"{label} ticket size must be a number."
+            continue
+        if tickets[field] is not None and tickets[field] < 0:
+            errors[field] = f"{label} ticket size can't be negative."
+    if tickets['min_ticket'] is not None and tickets['max_ticket'] is not None and tickets['min_ticket'] > tickets['max_ticket']:
+        errors['max_ticket'] = "Maximum ticket size must be at least the minimum."
+    focus = {
+        "focus_industries": json.dumps(industries) if industries else None,
+        "min_ticket": tickets['min_ticket'],
+        "max_ticket": tickets['max_ticket'],
+        "location_scopes": json.dumps(scopes) if scopes else None,
+    }
+    return focus, errors
+
+def decode_focus(org):
+    """A dict of an organization row with its JSON focus lists decoded (empty when unset)."""
+    org = dict(org)
+    for column in ('focus_industries', 'location_scopes'):
+        org[column] = json.loads(org[column]) if org[column] else []
+    return org
+
+def _ticket_fit(budget, low, high):
+    """1.0 inside the range, falling to 0 at ten times beyond it (on a log scale)."""
+    if (low is None or budget >= low) and (high is None or budget <= high):
+        return 1.0
+    bound = low if low is not None and budget < low else high
+    if budget <= 0 or bound <= 0:
+        return 0.0
+    return max(0.0, 1.0 - abs(math.log10(budget / bound)))
+
+class OrganizationIndex:
+    """
+    An inverted index of organizations by focus industry and geographic scope, kept in memory per
+    worker. Ranking an assessment only visits the organizations posted under its industry or with
+    no industry preference, and keeps the top k in a heap. Registrations in this worker are added
+    as they happen; before ranking, rows with a higher id are read, which picks up other workers'
+    registrations. The index is rebuilt when the organization count no longer matches (rows were
+    deleted) or after ORG_MATCH_INDEX_TTL.
+    """
+
+    def __init__(self, ttl_seconds=ORG_MATCH_INDEX_TTL):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._organizations = {}
+        self._industries = {} # industry (or ANY) -> set of organization ids
+        self._scopes = {} # geographic scope (or ANY) -> set of organization ids
+        self._max_id = 0
+        self._loaded_at = time.time()
+
+    def _add(self, org):
+        org = decode_focus(org)
+        org_id = org['id']
+        self._organizations[org_id] = org
+        for industry in org['focus_industries'] or [ANY]:
+            self._industries.setdefault(industry, set()).add(org_id)
+        for scope in org['location_scopes'] or [ANY]:
+            self._scopes.setdefault(scope, set()).add(org_id)
+        self._max_id = max(self._max_id, org_id)
+
+    def add(self, org):
+        """Indexes a newly registered organization (a row or dict with repository.ORGANIZATION_COLUMNS)."""
+        with self._lock:
+            if org['id'] not in self._organizations:
+                self._add(org)
+
+    def refresh(self, repo):
+        """Reads organizations registered since the last refresh, or rebuilds the index when needed."""
+        count = repo.count_organizations()
+        with self._lock:
+            if time.time() - self._loaded_at <= self.ttl_seconds:
+                for org in repo.organizations_since(self._max_id):
+                    self._add(org)
+                if len(self._organizations) == count:
+                    return
+            self._reset()
+            for org in repo.organizations_since():
+                self._add(org)
+
+    def top_matches(self, repo, assessment, k=ORG_MATCH_TOP_K):
+        """
+        The k organizations that best fit an assessment (industry, location, budget), best first.
+        Each comes with its score and how each field matched. Returns None when the index can't
+        be refreshed.
+        """
+        try:
+            self.refresh(repo)
+        except StorageError as e:
+            print(f"Organization index refresh error: {e}")
+            return None
+        industry, location, budget = assessment['industry'], assessment['location'], assessment['budget']
+        with self._lock:
+            focused = self._industries.get(industry, set())
+            scoped = self._scopes.get(location, set())
+            open_scope = self._scopes.get(ANY, set())
+            scored = []
+            for org_id in focused | self._industries.get(ANY, set()):
+                org = self._organizations[org_id]
+                industry_fit = 3.0 if org_id in focused else 1.0
+                location_fit = 2.0 if org_id in scoped else 1.0 if org_id in open_scope else 0.0
+                if org['min_ticket'] is None and org['max_ticket'] is None:
+                    ticket_fit = 1.0
+                else:
+                    ticket_fit = 2.0 * _ticket_fit(budget, org['min_ticket'], org['max_ticket'])
+                scored.append((industry_fit + location_fit + ticket_fit, org_id))
+            best = heapq.nsmallest(k, scored, key=lambda item: (-item[0], self._organizations[item[1]]['name']))
+            matches = []
+            for score, org_id in best:
+                org = dict(self._organizations[org_id])
+                org['score'] = round(score, 2)
+                org['match'] = {
+                    "industry": org_id in focused,
+                    "location": org_id in scoped,
+                    "ticket_size": _ticket_fit(budget, org['min_ticket'], org['max_ticket']) == 1.0,
+                }
+                matches.append(org)
+        return matches
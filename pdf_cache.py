@@ -0,0 +1,59 @@
+import os
+import glob
+import uuid
+
+from ai_cache import make_cache_key
+from pdf_report import PDF_RENDERER
+
+PDF_CACHE_DIR = os.getenv('PDF_CACHE_DIR', 'pdf_cache')
+PDF_CACHE_MAX_FILES = int(os.getenv('PDF_CACHE_MAX_FILES', 2000))
+PDF_REPORT_VERSION = '1' # Bump when the report layout changes so cached files are re-rendered
+
+os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+
+def report_cache_key(assessment_row):
+    """
+    Hash of everything a report is rendered from: the assessment row (which includes
+    gemini_analysis), the report layout version and the renderer. Also used as the report's ETag.
+    """
+    return make_cache_key("risk-report", PDF_REPORT_VERSION, PDF_RENDERER, assessment_row)
+
+def _report_path(assessment_id, cache_key):
+    return os.path.join(PDF_CACHE_DIR, f"{int(assessment_id)}-{cache_key}.pdf")
+
+def get_cached_report(assessment_id, cache_key):
+    """Returns the path of the cached PDF for this assessment version, or None."""
+    path = _report_path(assessment_id, cache_key)
+    return path if os.path.exists(path) else None
+
+def store_report(assessment_id, cache_key, pdf_bytes):
+    """
+    Writes a rendered report (atomically, so concurrent readers never see a partial file),
+    removes older versions for the same assessment and prunes the oldest files beyond
+    PDF_CACHE_MAX_FILES. Returns the file's path.
+    """
+    path = _report_path(assessment_id, cache_key)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(pdf_bytes)
+    os.replace(tmp_path, path)
+    invalidate_reports(assessment_id, keep=path)
+
+    files = glob.glob(os.path.join(PDF_CACHE_DIR, '*.pdf'))
+    if len(files) > PDF_CACHE_MAX_FILES:
+        files.sort(key=lambda name: os.path.getmtime(name) if os.path.exists(name) else 0)
+        for name in files[:len(files) - PDF_CACHE_MAX_FILES]:
+            _remove(name)
+    return path
+
+def invalidate_reports(assessment_id, keep=None):
+    """Deletes cached reports for an assessment, e.g. after its AI analysis was regenerated."""
+    for name in glob.glob(os.path.join(PDF_CACHE_DIR, f"{int(assessment_id)}-*.pdf")):
+        if name != keep:
+            _remove(name)
+
+def _remove(name):
+    try:
+        os.remove(name)
+    except FileNotFoundError: # Another worker got there first
+        pass
@@ -0,0 +1,591 @@
+import os
+import json
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from io import BytesIO # For PDF generation
+from reportlab.lib.pagesizes import letter
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak, ListFlowable, ListItem
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.enums import TA_CENTER, TA_LEFT
+from reportlab.lib.colors import HexColor, black, green, yellow, red, blue, purple, orange
+from reportlab.lib.units import inch # Import inch for spacing
+import fitz # PyMuPDF
+
+from gemini_service import get_mock_swot_analysis, get_mock_company_comparison
+
+PDF_RENDER_PROCESSES = int(os.getenv('PDF_RENDER_PROCESSES', min(4, os.cpu_count() or 1))) # 0 renders in the request thread
+PDF_RENDER_QUEUE_LIMIT = int(os.getenv('PDF_RENDER_QUEUE_LIMIT', 16)) # Queued + running renders per worker before new ones are refused
+PDF_RENDER_TIMEOUT = int(os.getenv('PDF_RENDER_TIMEOUT', 60))
+PDF_RENDERER = os.getenv('PDF_RENDERER', 'reportlab') # 'reportlab' (flowable layout) or 'pymupdf' (prebuilt template)
+
+# Helper function to format currency
+def format_currency_inr(amount):
+    if amount is None:
+        return "N/A"
+    return "₹{:,}".format(int(amount))
+
+# --- Global ReportLab Styles (Defined once) ---
+# This prevents "Style 'BodyText' already defined in stylesheet" error
+_styles = getSampleStyleSheet()
+
+_styles['h1'].fontSize = 24
+_styles['h1'].spaceAfter = 20
+_styles['h1'].alignment = TA_CENTER
+_styles['h1'].textColor = HexColor('#1a202c') # gray-900
+
+_styles['h2'].fontSize = 18
+_styles['h2'].spaceBefore = 20
+_styles['h2'].spaceAfter = 10
+_styles['h2'].textColor = HexColor('#2d3748') # gray-800
+
+_styles['h3'].fontSize = 14
+_styles['h3'].spaceBefore = 15
+_styles['h3'].spaceAfter = 5
+_styles['h3'].textColor = HexColor('#4a5568') # gray-700
+
+_styles.add(ParagraphStyle(name='BodyTextCustom',
+                          parent=_styles['Normal'],
+                          fontSize=10,
+                          leading=14,
+                          spaceAfter=6,
+                          textColor=HexColor('#4a5568'))) # gray-700
+
+_styles.add(ParagraphStyle(name='ListItemStyleCustom',
+                          parent=_styles['Normal'],
+                          fontSize=10,
+                          leading=14,
+                          spaceAfter=3,
+                          leftIndent=20, # Increased indent for list items
+                          firstLineIndent=-10, # Adjust for bullet
+                          textColor=HexColor('#4a5568')))
+
+_styles.add(ParagraphStyle(name='OverallRiskStyleCustom',
+                          parent=_styles['h2'], # Inherit from h2 for font size/weight
+                          fontSize=20, # Override font size
+                          spaceBefore=15,
+                          spaceAfter=15,
+                          alignment=TA_CENTER)) # Color set dynamically
+
+_styles.add(ParagraphStyle(name='ExplanationStyleCustom',
+                          parent=_styles['BodyTextCustom'], # Parent from my custom BodyText
+                          fontSize=11,
+                          leading=16,
+                          spaceBefore=10,
+                          spaceAfter=15,
+                          textColor=HexColor('#334155'))) # slate-700
+
+def report_analysis(gemini_analysis):
+    """The SWOT and comparison sections for a report, falling back to mock data if the analysis is incomplete."""
+    # Ensure gemini_analysis is not None and has the expected structure
+    if not gemini_analysis or not gemini_analysis.get('swot') or not gemini_analysis.get('comparison'):
+        return {"swot": get_mock_swot_analysis(), "comparison": get_mock_company_comparison()}
+    return {"swot": gemini_analysis['swot'], "comparison": gemini_analysis['comparison']}
+
+def report_inputs(assessment_row):
+    """Turns a stored assessment row (dict) into the (assessment_data, gemini_analysis) a report is rendered from."""
+    assessment_data = dict(assessment_row)
+    assessment_data['z_score_analysis'] = json.loads(assessment_data['z_score_analysis'])
+    gemini_analysis = json.loads(assessment_data['gemini_analysis']) if assessment_data['gemini_analysis'] else None
+    return assessment_data, report_analysis(gemini_analysis)
+
+def generate_risk_report_pdf(assessment_data, gemini_analysis):
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter,
+                            rightMargin=72, leftMargin=72,
+                            topMargin=72, bottomMargin=72)
+    
+    # Use the globally defined styles
+    styles = _styles 
+
+    elements = []
+
+    # Title Page
+    elements.append(Paragraph("SmartRisk AI Assessment Report", styles['h1'])) # Use h1
+    elements.append(Spacer(1, 0.5 * inch))
+    elements.append(Paragraph(f"Project: {assessment_data.get('project_name', 'N/A')}", styles['h2'])) # Use h2
+    elements.append(Paragraph(f"Date: {datetime.now().strftime('%B %d, %Y')}", styles['BodyTextCustom']))
+    elements.append(Spacer(1, 1 * inch))
+    elements.append(Paragraph("Confidential Report", styles['BodyTextCustom']))
+    elements.append(PageBreak())
+
+    # Project Overview
+    elements.append(Paragraph("1. Project Overview", styles['h2'])) # Use h2
+    elements.append(Paragraph(f"<b>Project Name:</b> {assessment_data.get('project_name', 'N/A')}", styles['BodyTextCustom']))
+    elements.append(Paragraph(f"<b>Industry:</b> {assessment_data.get('industry', 'N/A')}", styles['BodyTextCustom']))
+    elements.append(Paragraph(f"<b>Description:</b> {assessment_data.get('description', 'N/A')}", styles['BodyTextCustom']))
+    elements.append(Paragraph(f"<b>Budget:</b> {format_currency_inr(assessment_data.get('budget', 0))}", styles['BodyTextCustom']))
+    elements.append(Paragraph(f"<b>Timeline:</b> {assessment_data.get('timeline', 'N/A')}", styles['BodyTextCustom']))
+    elements.append(Paragraph(f"<b>Location:</b> {assessment_data.get('location', 'N/A')}", styles['BodyTextCustom']))
+    elements.append(Paragraph(f"<b>Co-founders:</b> {assessment_data.get('number_of_cofounders', 'N/A')}", styles['BodyTextCustom']))
+    elements.append(Paragraph(f"<b>Technical Complexity:</b> {assessment_data.get('technical_complexity', 'N/A')}/10", styles['BodyTextCustom']))
+    elements.append(Paragraph(f"<b>Expected Revenue:</b> {format_currency_inr(assessment_data.get('total_revenue', 0))}", styles['BodyTextCustom']))
+    elements.append(Paragraph(f"<b>Expected Expense:</b> {format_currency_inr(assessment_data.get('total_expense', 0))}", styles['BodyTextCustom']))
+    elements.append(Spacer(1, 0.2 * inch))
+
+    # Overall Risk
+    risk_level = assessment_data.get('risk_level', 'N/A')
+    overall_risk_score = assessment_data.get('overall_risk', 'N/A')
+    risk_color = black
+    if risk_level == 'Low': risk_color = green
+    elif risk_level == 'Medium': risk_color = orange
+    elif risk_level == 'High': risk_color = red
+    
+    styles['OverallRiskStyleCustom'].textColor = risk_color
+    elements.append(Paragraph(f"Overall Risk: {risk_level} ({overall_risk_score:.0f}%)", styles['OverallRiskStyleCustom']))
+    
+    # Add the explanation from the new risk calculation
+    explanation_data = assessment_data.get('z_score_analysis', {}) # z_score_analysis now holds the explanation
+    explanation_text = explanation_data.get('explanation', 'No detailed explanation available.')
+    elements.append(Paragraph(f"<b>Explanation:</b> {explanation_text}", styles['ExplanationStyleCustom']))
+    elements.append(Spacer(1, 0.2 * inch))
+
+    # AI-Powered Insights (SWOT)
+    elements.append(Paragraph("2. AI-Powered Insights: SWOT Analysis", styles['h2'])) # Re-numbered heading
+    swot = gemini_analysis.get('swot', get_mock_swot_analysis()) # Fallback to mock if not present
+
+    elements.append(Paragraph("Strengths:", styles['h3'])) # Use h3
+    elements.append(ListFlowable([ListItem(Paragraph(s, styles['ListItemStyleCustom'])) for s in swot.get('strengths', [])],
+                                 bulletType='bullet',
+                                 bulletColor=green,
+                                 start='bullet',
+                                 leftIndent=20,
+                                 bulletIndent=10))
+    elements.append(Spacer(1, 0.1 * inch))
+
+    elements.append(Paragraph("Weaknesses:", styles['h3'])) # Use h3
+    elements.append(ListFlowable([ListItem(Paragraph(s, styles['ListItemStyleCustom'])) for s in swot.get('weaknesses', [])],
+                                 bulletType='bullet',
+                                 bulletColor=red,
+                                 start='bullet',
+                                 leftIndent=20,
+                                 bulletIndent=10))
+    elements.append(Spacer(1, 0.1 * inch))
+
+    elements.append(Paragraph("Opportunities:", styles['h3'])) # Use h3
+    elements.append(ListFlowable([ListItem(Paragraph(s, styles['ListItemStyleCustom'])) for s in swot.get('opportunities', [])],
+                                 bulletType='bullet',
+                                 bulletColor=blue,
+                                 start='bullet',
+                                 leftIndent=20,
+                                 bulletIndent=10))
+    elements.append(Spacer(1, 0.1 * inch))
+
+    elements.append(Paragraph("Threats:", styles['h3'])) # Use h3
+    elements.append(ListFlowable([ListItem(Paragraph(s, styles['ListItemStyleCustom'])) for s in swot.get('threats', [])],
+                                 bulletType='bullet',
+                                 bulletColor=orange,
+                                 start='bullet',
+                                 leftIndent=20,
+                                 bulletIndent=10))
+    elements.append(Spacer(1, 0.1 * inch))
+
+    elements.append(Paragraph("Recommendations:", styles['h3'])) # Use h3
+    elements.append(ListFlowable([ListItem(Paragraph(s, styles['ListItemStyleCustom'])) for s in swot.get('recommendations', [])],
+                                 bulletType='bullet',
+                                 bulletColor=purple,
+                                 start='bullet',
+                                 leftIndent=20,
+                                 bulletIndent=10))
+    elements.append(Spacer(1, 0.2 * inch))
+
+    # AI-Powered Insights (Company Comparison)
+    elements.append(Paragraph("3. AI-Powered Insights: Company Comparison", styles['h2'])) # Re-numbered heading
+    comparison = gemini_analysis.get('comparison', get_mock_company_comparison()) # Fallback to mock if not present
+
+    elements.append(Paragraph(f"<b>Successful Company:</b> {comparison.get('successful_company', {}).get('name', 'N/A')}", styles['BodyTextCustom']))
+    elements.append(Paragraph(f"<i>Industry: {comparison.get('successful_company', {}).get('industry', 'N/A')}</i>", styles['BodyTextCustom']))
+    elements.append(Paragraph("Key Factors for Success:", styles['h3'])) # Use h3
+    elements.append(ListFlowable([ListItem(Paragraph(s, styles['ListItemStyleCustom'])) for s in comparison.get('successful_company', {}).get('insights', [])],
+                                 bulletType='bullet',
+                                 bulletColor=green,
+                                 start='bullet',
+                                 leftIndent=20,
+                                 bulletIndent=10))
+    elements.append(Spacer(1, 0.1 * inch))
+
+    elements.append(Paragraph(f"<b>Failed Company:</b> {comparison.get('failed_company', {}).get('name', 'N/A')}", styles['BodyTextCustom']))
+    elements.append(Paragraph(f"<i>Industry: {comparison.get('failed_company', {}).get('industry', 'N/A')}</i>", styles['BodyTextCustom']))
+    elements.append(Paragraph("Key Factors for Failure:", styles['h3'])) # Use h3
+    elements.append(ListFlowable([ListItem(Paragraph(s, styles['ListItemStyleCustom'])) for s in comparison.get('failed_company', {}).get('insights', [])],
+                                 bulletType='bullet',
+                                 bulletColor=red,
+                                 start='bullet',
+                                 leftIndent=20,
+                                 bulletIndent=10))
+    elements.append(Spacer(1, 0.1 * inch))
+
+    elements.append(Paragraph("Lessons Learned for Your Project:", styles['h3'])) # Use h3
+    elements.append(ListFlowable([ListItem(Paragraph(s, styles['ListItemStyleCustom'])) for s in comparison.get('lessons_learned', [])],
+                                 bulletType='bullet',
+                                 bulletColor=purple,
+                                 start='bullet',
+                                 leftIndent=20,
+                                 bulletIndent=10))
+    elements.append(Spacer(1, 0.2 * inch))
+
+    doc.build(elements)
+    buffer.seek(0)
+    return buffer.getvalue()
+
+# --- PyMuPDF template renderer ---
+# The same report, drawn directly with PyMuPDF: the static title page and first heading come from
+# a template built once per process, and only the values and bullet lists are laid out per report.
+_PAGE_WIDTH, _PAGE_HEIGHT = letter
+_MARGIN = 72
+_FONTS = {"regular": "helv", "bold": "hebo", "italic": "heit", "bolditalic": "hebi"} # Base-14 Helvetica, as ReportLab uses
+_TEXT_COLOR = (0x4a / 255, 0x55 / 255, 0x68 / 255) # gray-700
+_H1_COLOR = (0x1a / 255, 0x20 / 255, 0x2c / 255) # gray-900
+_H2_COLOR = (0x2d / 255, 0x37 / 255, 0x48 / 255) # gray-800
+_EXPLANATION_COLOR = (0x33 / 255, 0x41 / 255, 0x55 / 255) # slate-700
+_BULLET_COLORS = {
+    "green": (0, 0.5, 0), "red": (1, 0, 0), "blue": (0, 0, 1), "orange": (1, 0.65, 0), "purple": (0.5, 0, 0.5),
+}
+# Level -> (size, font, color, space before, space after), as in the ReportLab h1-h3 styles
+_HEADINGS = {1: (24, "bold", _H1_COLOR, 0, 20), 2: (18, "bold", _H2_COLOR, 20, 10), 3: (14, "bolditalic", _TEXT_COLOR, 15, 5)}
+_RISK_COLORS = {"Low": _BULLET_COLORS["green"], "Medium": _BULLET_COLORS["orange"], "High": _BULLET_COLORS["red"]}
+_TEMPLATE_TITLE_Y = 177 # Top of the project line on the title page
+_TEMPLATE_CONFIDENTIAL_Y = 300 # Top of the "Confidential Report" line on the title page
+_TEMPLATE_BODY_Y = 104 # Where content starts below the "1. Project Overview" heading
+_template_bytes = None
+_fonts = {}
+_width_cache = {}
+
+def _font(name):
+    font = _fonts.get(name)
+    if font is None:
+        font = _fonts[name] = fitz.Font(_FONTS[name])
+    return font
+
+def _text_width(text, font, size):
+    key = (text, font, size)
+    width = _width_cache.get(key)
+    if width is None:
+        width = _font(font).text_length(text, fontsize=size)
+        if len(_width_cache) < 50000:
+            _width_cache[key] = width
+    return width
+
+def _pdf_string(text):
+    """A PDF literal string in WinAnsi encoding, the encoding of the Base-14 fonts PyMuPDF references."""
+    encoded = text.encode('cp1252', errors='replace').decode('latin-1')
+    return "(" + encoded.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ")"
+
+def _pdf_color(color):
+    return f"{color[0]:.3f} {color[1]:.3f} {color[2]:.3f}"
+
+class _FitzFlow:
+    """
+    Lays out wrapped text top to bottom across pages of a PyMuPDF document. Drawing operators are
+    collected per page and appended as one content stream in finish(); PyMuPDF's insert_text and
+    draw_* calls rebuild the page's content and font resources on every call, which costs more
+    than the whole ReportLab render.
+    """
+
+    def __init__(self, doc, page, y):
+        self.doc = doc
+        self.y = y
+        self._start_page(page)
+
+    def _start_page(self, page):
+        self.page = page
+        self.ops = []
+
+    def _finish_page(self):
+        if not self.ops:
+            return
+        stream_xref = self.doc.get_new_xref()
+        self.doc.update_object(stream_xref, "<<>>")
+        self.doc.update_stream(stream_xref, "\n".join(self.ops).encode('latin-1'))
+        contents = self.page.get_contents() + [stream_xref]
+        self.doc.xref_set_key(self.page.xref, "Contents", "[" + " ".join(f"{xref} 0 R" for xref in contents) + "]")
+        self.ops = []
+
+    def finish(self):
+        self._finish_page()
+
+    def _new_page(self):
+        self._finish_page()
+        # The new page shares the current page's resources, so the fonts registered in the template carry over
+        resources = self.doc.xref_get_key(self.page.xref, "Resources")[1]
+        page = self.doc.new_page(width=_PAGE_WIDTH, height=_PAGE_HEIGHT)
+        self.doc.xref_set_key(page.xref, "Resources", resources)
+        self._start_page(page)
+        self.y = _MARGIN
+
+    def space(self, points):
+        self.y += points
+
+    def paragraph(self, runs, size=10, leading=14, color=_TEXT_COLOR, indent=0, center=False,
+                  space_before=0, space_after=6, bullet=None):
+        """
+        Writes runs of (text, font) as one wrapped paragraph. bullet is a color name for a bullet
+        glyph drawn before the first line.
+        """
+        self.y += space_before
+        left = _MARGIN + indent
+        max_width = _PAGE_WIDTH - _MARGIN - left
+        # Each line is a list of [font, x offset, words] segments, one per run on that line
+        lines, segments, line_width = [], [], 0.0
+        for text, font in runs:
+            space = _text_width(" ", font, size)
+            segment = None
+            for word in text.split():
+                word_width = _text_width(word, font, size)
+                gap = space if segments else 0.0
+                if segments and line_width + gap + word_width > max_width:
+                    lines.append((segments, line_width))
+                    segments, line_width, gap, segment = [], 0.0, 0.0, None
+                if segment is None:
+                    segment = [font, line_width + gap, []]
+                    segments.append(segment)
+                segment[2].append(word)
+                line_width += gap + word_width
+        if segments:
+            lines.append((segments, line_width))
+
+        fill = f"{_pdf_color(color)} rg"
+        for index, (segments, width) in enumerate(lines):
+            if self.y + leading > _PAGE_HEIGHT - _MARGIN:
+                self._new_page()
+            baseline = f"{_PAGE_HEIGHT - self.y - size:.2f}"
+            x = left + (max_width - width) / 2 if center else left
+            ops = ["BT"]
+            if index == 0 and bullet:
+                ops.append(f"{_pdf_color(_BULLET_COLORS[bullet])} rg /{_FONTS['regular']} {size:g} Tf 1 0 0 1 {left - 10:.2f} {baseline} Tm (\x95) Tj")
+            ops.append(fill)
+            for font, offset, words in segments:
+                ops.append(f"/{_FONTS[font]} {size:g} Tf 1 0 0 1 {x + offset:.2f} {baseline} Tm {_pdf_string(' '.join(words))} Tj")
+            ops.append("ET")
+            self.ops.append(" ".join(ops))
+            self.y += leading
+        self.y += space_after
+
+    def heading(self, text, level):
+        size, font, color, before, after = _HEADINGS[level]
+        if self.y + before + size * 1.2 + 30 > _PAGE_HEIGHT - _MARGIN:
+            self._new_page() # Keep a heading with the text that follows it
+        if self.y == _MARGIN:
+            before = 0 # No space above a heading at the top of a page
+        self.paragraph([(text, font)], size=size, leading=size * 1.2, color=color, center=level == 1,
+                       space_before=before, space_after=after)
+
+    def bullets(self, items, bullet):
+        for item in items:
+            self.paragraph([(str(item), "regular")], indent=20, space_after=3, bullet=bullet)
+        self.space(0.1 * inch)
+
+def _template_page(doc):
+    page = doc.new_page(width=_PAGE_WIDTH, height=_PAGE_HEIGHT)
+    for font in _FONTS.values():
+        page.insert_font(fontname=font) # References the Base-14 font; nothing is embedded
+    return page
+
+def _report_template():
+    """The static pages of the report, built once per process and reused as a template."""
+    global _template_bytes
+    if _template_bytes is None:
+        doc = fitz.open()
+        title_page = _template_page(doc)
+        flow = _FitzFlow(doc, title_page, _MARGIN)
+        flow.heading("SmartRisk AI Assessment Report", 1)
+        flow.y = _TEMPLATE_CONFIDENTIAL_Y
+        flow.paragraph([("Confidential Report", "regular")])
+        flow.finish()
+        flow = _FitzFlow(doc, _template_page(doc), _MARGIN)
+        flow.heading("1. Project Overview", 2)
+        flow.finish()
+        _template_bytes = doc.tobytes()
+    return _template_bytes
+
+def generate_risk_report_pdf_pymupdf(assessment_data, gemini_analysis):
+    """Same content as generate_risk_report_pdf, stamped into the prebuilt PyMuPDF template."""
+    doc = fitz.open("pdf", _report_template())
+
+    # Title page
+    flow = _FitzFlow(doc, doc[0], _TEMPLATE_TITLE_Y)
+    flow.paragraph([(f"Project: {assessment_data.get('project_name', 'N/A')}", "bold")], size=18, leading=21.6,
+                   color=_H2_COLOR, space_after=4)
+    flow.paragraph([(f"Date: {datetime.now().strftime('%B %d, %Y')}", "regular")])
+    flow.finish()
+
+    # Project Overview
+    flow = _FitzFlow(doc, doc[1], _TEMPLATE_BODY_Y)
+    for label, value in (
+        ("Project Name:", assessment_data.get('project_name', 'N/A')),
+        ("Industry:", assessment_data.get('industry', 'N/A')),
+        ("Description:", assessment_data.get('description', 'N/A')),
+        ("Budget:", format_currency_inr(assessment_data.get('budget', 0))),
+        ("Timeline:", assessment_data.get('timeline', 'N/A')),
+        ("Location:", assessment_data.get('location', 'N/A')),
+        ("Co-founders:", assessment_data.get('number_of_cofounders', 'N/A')),
+        ("Technical Complexity:", f"{assessment_data.get('technical_complexity', 'N/A')}/10"),
+        ("Expected Revenue:", format_currency_inr(assessment_data.get('total_revenue', 0))),
+        ("Expected Expense:", format_currency_inr(assessment_data.get('total_expense', 0))),
+    ):
+        flow.paragraph([(label, "bold"), (str(value), "regular")])
+    flow.space(0.2 * inch)
+
+    # Overall Risk
+    risk_level = assessment_data.get('risk_level', 'N/A')
+    overall_risk_score = assessment_data.get('overall_risk', 'N/A')
+    flow.paragraph([(f"Overall Risk: {risk_level} ({overall_risk_score:.0f}%)", "bold")], size=20, leading=24,
+                   color=_RISK_COLORS.get(risk_level, (0, 0, 0)), center=True, space_before=15, space_after=15)
+    explanation_data = assessment_data.get('z_score_analysis', {}) # z_score_analysis now holds the explanation
+    explanation_text = explanation_data.get('explanation', 'No detailed explanation available.')
+    flow.paragraph([("Explanation:", "bold"), (explanation_text, "regular")], size=11, leading=16,
+                   color=_EXPLANATION_COLOR, space_before=10, space_after=15)
+    flow.space(0.2 * inch)
+
+    # AI-Powered Insights (SWOT)
+    flow.heading("2. AI-Powered Insights: SWOT Analysis", 2)
+    swot = gemini_analysis.get('swot', get_mock_swot_analysis()) # Fallback to mock if not present
+    for title, key, bullet in (
+        ("Strengths:", 'strengths', "green"), ("Weaknesses:", 'weaknesses', "red"),
+        ("Opportunities:", 'opportunities', "blue"), ("Threats:", 'threats', "orange"),
+        ("Recommendations:", 'recommendations', "purple"),
+    ):
+        flow.heading(title, 3)
+        flow.bullets(swot.get(key, []), bullet)
+    flow.space(0.1 * inch)
+
+    # AI-Powered Insights (Company Comparison)
+    flow.heading("3. AI-Powered Insights: Company Comparison", 2)
+    comparison = gemini_analysis.get('comparison', get_mock_company_comparison()) # Fallback to mock if not present
+    for label, key, factors_title, bullet in (
+        ("Successful Company:", 'successful_company', "Key Factors for Success:", "green"),
+        ("Failed Company:", 'failed_company', "Key Factors for Failure:", "red"),
+    ):
+        company = comparison.get(key, {})
+        flow.paragraph([(label, "bold"), (str(company.get('name', 'N/A')), "regular")])
+        flow.paragraph([(f"Industry: {company.get('industry', 'N/A')}", "italic")])
+        flow.heading(factors_title, 3)
+        flow.bullets(company.get('insights', []), bullet)
+    flow.heading("Lessons Learned for Your Project:", 3)
+    flow.bullets(comparison.get('lessons_learned', []), "purple")
+    flow.finish()
+
+    return _document_bytes(doc)
+
+def _document_bytes(doc):
+    """
+    Serializes and closes a PyMuPDF document. Saving to a file stays in C, while tobytes() hands
+    every small write back to Python and costs several times as much for a report this size.
+    """
+    fd, tmp_path = tempfile.mkstemp(suffix='.pdf')
+    os.close(fd)
+    try:
+        doc.save(tmp_path, deflate=True)
+        doc.close()
+        with open(tmp_path, 'rb') as f:
+            return f.read()
+    finally:
+        os.remove(tmp_path)
+
+_RENDERERS = {"reportlab": generate_risk_report_pdf, "pymupdf": generate_risk_report_pdf_pymupdf}
+if PDF_RENDERER not in _RENDERERS:
+    raise ValueError(f"PDF_RENDERER must be one of {', '.join(_RENDERERS)}, not {PDF_RENDERER!r}")
+
+def _render_report(assessment_data, gemini_analysis):
+    """Renders with the configured PDF_RENDERER."""
+    return _RENDERERS[PDF_RENDERER](assessment_data, gemini_analysis)
+
+# --- Render process pool ---
+# ReportLab layout is pure Python and holds the GIL, so renders run in separate processes and
+# request threads only wait on the result.
+_pool = None
+_pool_pid = None # Process that started _pool; a forked worker starts its own
+_pool_lock = threading.Lock()
+_pending_renders = 0
+
+class PdfQueueFull(Exception):
+    """Raised when PDF_RENDER_QUEUE_LIMIT renders are already queued or running in this worker."""
+
+def _warm_render_process():
+    """Runs once in each pool process: builds the stylesheet or template and loads fonts with a throwaway render."""
+    _render_report({"overall_risk": 0}, {"swot": {}, "comparison": {}})
+
+def _noop():
+    return None
+
+def _render_pool():
+    """
+    This process's render pool, started on its first render (None when PDF_RENDER_PROCESSES is 0).
+    A pool inherited through a fork belongs to the parent, so each worker process starts its own.
+    Render processes come from a fork server (or are spawned) rather than forked from the worker,
+    so the threads the worker is running by then don't matter.
+    """
+    global _pool, _pool_pid, _pending_renders
+    if PDF_RENDER_PROCESSES <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _pool = ProcessPoolExecutor(max_workers=PDF_RENDER_PROCESSES, initializer=_warm_render_process,
+                                        mp_context=multiprocessing.get_context(start_method))
+            if _pool_pid != os.getpid():
+                _pending_renders = 0 # The parent's renders don't run here
+            _pool_pid = os.getpid()
+            for _ in range(PDF_RENDER_PROCESSES):
+                _pool.submit(_noop) # Brings every process up (and warm) now rather than one per render
+    return _pool
+
+def _render_done(future):
+    global _pending_renders
+    with _pool_lock:
+        _pending_renders -= 1
+
+def _discard_pool(pool):
+    """Drops a broken pool (e.g. a render process was killed for memory) so the next render starts a new one."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+def submit_report_pdf(assessment_data, gemini_analysis):
+    """
+    Queues a render and returns a Future for the PDF bytes. Without a pool the render runs inline.
+    Raises PdfQueueFull when this worker already has PDF_RENDER_QUEUE_LIMIT renders in flight.
+    """
+    global _pending_renders
+    pool = _render_pool()
+    if pool is None:
+        future = Future()
+        try:
+            future.set_result(_render_report(assessment_data, gemini_analysis))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    with _pool_lock:
+        if _pending_renders >= PDF_RENDER_QUEUE_LIMIT:
+            raise PdfQueueFull()
+        _pending_renders += 1
+    try:
+        future = pool.submit(_render_report, assessment_data, gemini_analysis)
+    except BrokenProcessPool:
+        _render_done(None)
+        _discard_pool(pool)
+        raise
+    except Exception:
+        _render_done(None)
+        raise
+    future.add_done_callback(_render_done) # The slot is freed when the render really ends, even after a timeout
+    future.pool = pool
+    return future
+
+def render_report_pdf(assessment_data, gemini_analysis):
+    """
+    Renders a report in the process pool (or inline when PDF_RENDER_PROCESSES is 0) and returns the
+    PDF bytes. Raises PdfQueueFull when this worker already has PDF_RENDER_QUEUE_LIMIT renders in flight.
+    """
+    future = submit_report_pdf(assessment_data, gemini_analysis)
+    try:
+        return future.result(timeout=PDF_RENDER_TIMEOUT)
+    except BrokenProcessPool:
+        _discard_pool(future.pool)
+        raise
@@ -0,0 +1,96 @@
+import os
+import time
+import bisect
+import threading
+
+from repository import StorageError
+
+PEER_BENCHMARK_TTL = int(os.getenv('PEER_BENCHMARK_TTL', 600)) # Seconds before an industry is reloaded in full, picking up re-scored rows
+PEER_METRICS = ('overall_risk', 'budget', 'expense_ratio')
+
+def peer_metrics(assessment):
+    """The compared metrics of an assessment row or dict; expense_ratio is None without revenue."""
+    revenue = assessment['total_revenue']
+    return {
+        "overall_risk": assessment['overall_risk'],
+        "budget": assessment['budget'],
+        "expense_ratio": assessment['total_expense'] / revenue if revenue else None,
+    }
+
+class _Industry:
+    def __init__(self):
+        self.values = {metric: [] for metric in PEER_METRICS} # Each kept sorted
+        self.rows = 0
+        self.max_id = 0
+        self.loaded_at = 0.0
+
+    def add(self, assessment):
+        for metric, value in peer_metrics(assessment).items():
+            if value is not None:
+                bisect.insort(self.values[metric], value)
+        self.rows += 1
+        self.max_id = max(self.max_id, assessment['id'])
+
+class PeerBenchmarks:
+    """
+    Per-industry sorted arrays of overall_risk, budget and expense-to-revenue ratio, kept in
+    memory per worker, so a percentile is two binary searches. An industry is loaded on first
+    use. After that only rows with a higher id are read, which picks up this worker's and other
+    workers' submissions. A full reload happens when the trigger-maintained industry count
+    (assessment_stats) no longer matches, meaning rows were deleted or moved, or after
+    PEER_BENCHMARK_TTL, which picks up re-scored values.
+    """
+
+    def __init__(self, ttl_seconds=PEER_BENCHMARK_TTL):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._industries = {}
+
+    def refresh(self, repo, industry):
+        """Brings an industry's arrays up to date: new rows only, or a full reload when needed."""
+        counted = repo.industry_count(industry)
+        with self._lock:
+            entry = self._industries.get(industry)
+            if entry is not None and time.time() - entry.loaded_at <= self.ttl_seconds:
+                for row in repo.industry_assessments(industry, entry.max_id):
+                    entry.add(row)
+                if entry.rows == counted:
+                    return entry
+            entry = _Industry()
+            rows = repo.industry_assessments(industry)
+            for metric in PEER_METRICS:
+                entry.values[metric] = sorted(v for v in (peer_metrics(row)[metric] for row in rows) if v is not None)
+            entry.rows = len(rows)
+            entry.max_id = rows[-1]['id'] if rows else 0
+            entry.loaded_at = time.time()
+            self._industries[industry] = entry
+            return entry
+
+    def percentiles(self, repo, assessment):
+        """
+        Where a stored assessment ranks among the other assessments in its industry, per metric:
+        {"value", "percentile" (share of peers below it, ties counted half), "peers"}. Percentile is
+        None when there are no peers or the metric doesn't apply.
+        """
+        try:
+            entry = self.refresh(repo, assessment['industry'])
+        except StorageError as e:
+            print(f"Peer benchmark error for industry {assessment['industry']}: {e}")
+            return None
+        result = {}
+        with self._lock:
+            for metric, value in peer_metrics(assessment).items():
+                values = entry.values[metric]
+                if value is None:
+                    result[metric] = {"value": None, "percentile": None, "peers": len(values)}
+                    continue
+                below = bisect.bisect_left(values, value)
+                equal = bisect.bisect_right(values, value) - below
+                peers = len(values) - 1 if equal else len(values) # The assessment itself isn't its own peer
+                ties = max(equal - 1, 0)
+                result[metric] = {
+                    "value": value,
+                    "percentile": round(100 * (below + ties / 2) / peers, 1) if peers else None,
+                    "peers": peers,
+                }
+        return result
@@ -0,0 +1,132 @@
+import os
+import re
+import time
+import zipfile
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import fitz # PyMuPDF
+
+from pdf_cache import PDF_CACHE_DIR, report_cache_key, get_cached_report, store_report
+from pdf_report import submit_report_pdf, report_inputs, PdfQueueFull, PDF_RENDER_PROCESSES, PDF_RENDER_TIMEOUT
+
+BULK_EXPORT_MAX_ASSESSMENTS = int(os.getenv('BULK_EXPORT_MAX_ASSESSMENTS', 100))
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+def report_filename(assessment_row):
+    slug = re.sub(r'[^A-Za-z0-9]+', '-', assessment_row.get('project_name') or '').strip('-').lower()[:50]
+    return f"{assessment_row['id']}-{slug or 'assessment'}.pdf"
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def _reports(assessment_rows):
+    """
+    Yields (index, pdf_bytes) for each assessment's report in completion order. Cached reports come
+    straight from the PDF cache; the rest are rendered in the process pool, at most
+    PDF_RENDER_PROCESSES at a time, and stored in the cache as they finish. Reports are read as
+    soon as they are ready, so a concurrent cache invalidation can't pull a file away mid-export.
+    """
+    window = max(1, PDF_RENDER_PROCESSES)
+    pending = {} # Future -> (index, row, cache key)
+    queue = list(enumerate(assessment_rows))
+    queue.reverse()
+    while queue or pending:
+        while queue and len(pending) < window:
+            index, row = queue[-1]
+            cache_key = report_cache_key(row)
+            path = get_cached_report(row['id'], cache_key)
+            if path:
+                try:
+                    pdf_bytes = _read(path)
+                except FileNotFoundError: # Invalidated since the lookup; render it below
+                    pdf_bytes = None
+                if pdf_bytes is not None:
+                    queue.pop()
+                    yield index, pdf_bytes
+                    continue
+            try:
+                future = submit_report_pdf(*report_inputs(row))
+            except PdfQueueFull:
+                if not pending:
+                    time.sleep(0.25) # Other requests hold every render slot; wait for one to free up
+                break
+            queue.pop()
+            pending[future] = (index, row, cache_key)
+        if not pending:
+            continue
+        done, _ = wait(pending, timeout=PDF_RENDER_TIMEOUT, return_when=FIRST_COMPLETED)
+        if not done:
+            raise TimeoutError("PDF render timed out during export")
+        for future in done:
+            index, row, cache_key = pending.pop(future)
+            pdf_bytes = future.result()
+            store_report(row['id'], cache_key, pdf_bytes)
+            yield index, pdf_bytes
+
+class _ZipOutput:
+    """A write-only file object for ZipFile that hands written bytes back to a generator."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def stream_reports_zip(assessment_rows):
+    """
+    Yields a ZIP archive of the assessments' reports while they are rendered. Only the report
+    being added is held in memory; the archive is written without seeking, using data descriptors.
+    """
+    output = _ZipOutput()
+    with zipfile.ZipFile(output, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for index, pdf_bytes in _reports(assessment_rows):
+            archive.writestr(report_filename(assessment_rows[index]), pdf_bytes)
+            data = output.drain()
+            if data:
+                yield data
+    yield output.drain() # Central directory
+
+def stream_reports_merged_pdf(assessment_rows):
+    """
+    Yields one PDF holding every report in request order, with a bookmark per assessment. A PDF's
+    cross-reference table comes last, so the document is assembled with PyMuPDF in a temporary
+    file as the reports are rendered and streamed from there once complete.
+    """
+    merged = fitz.open()
+    toc = []
+    ready = {}
+    next_index = 0
+    for index, pdf_bytes in _reports(assessment_rows):
+        ready[index] = pdf_bytes # Reports that finish early wait here until the ones before them are added
+        while next_index in ready:
+            with fitz.open("pdf", ready.pop(next_index)) as report:
+                toc.append([1, assessment_rows[next_index].get('project_name') or report_filename(assessment_rows[next_index]),
+                            merged.page_count + 1])
+                merged.insert_pdf(report)
+            next_index += 1
+    merged.set_toc(toc)
+
+    fd, tmp_path = tempfile.mkstemp(suffix='.merged.tmp', dir=PDF_CACHE_DIR)
+    os.close(fd)
+    try:
+        merged.save(tmp_path, garbage=3, deflate=True)
+        merged.close()
+        with open(tmp_path, 'rb') as f:
+            while True:
+                chunk = f.read(EXPORT_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(tmp_path)
@@ -0,0 +1,164 @@
+import os
+import datetime
+from contextlib import contextmanager
+
+import psycopg
+from psycopg.rows import dict_row
+from psycopg_pool import ConnectionPool
+
+from assessment_stats import stats_drift
+from repository import Repository, StorageError, ORGANIZATION_COLUMNS, ASSESSMENT_HISTORY_COLUMNS
+from migrations import apply_migrations
+
+POSTGRES_POOL_MIN = int(os.getenv('POSTGRES_POOL_MIN', 2)) # Connections each worker process keeps open
+POSTGRES_POOL_MAX = int(os.getenv('POSTGRES_POOL_MAX', 10)) # Upper bound per worker; size it against max_connections
+POSTGRES_PREPARE_THRESHOLD = int(os.getenv('POSTGRES_PREPARE_THRESHOLD', 0)) # Executions of a query before it is prepared server-side; 0 prepares on first use
+MIGRATION_LOCK_ID = 4201 # pg_advisory_xact_lock key held while a migration runs
+
+def _row(cursor):
+    """
+    Dict rows, like sqlite3.Row by name. Timestamps come back as text in SQLite's layout
+    ('YYYY-MM-DD HH:MM:SS', plus '.ffffff' when there are microseconds). The fraction is kept:
+    history cursors are built from created_at, and a truncated one would skip rows created in
+    the same second as the page boundary.
+    """
+    make_dict = dict_row(cursor)
+    def make_row(values):
+        row = make_dict(values)
+        for key, value in row.items():
+            if isinstance(value, datetime.datetime):
+                row[key] = value.isoformat(sep=' ')
+        return row
+    return make_row
+
+class PostgresRepository(Repository):
+    # Compared as timestamps, so the cursor's text is cast; 'infinity' sorts after every row
+    ASSESSMENTS_PAGE_QUERY = (
+        f'SELECT {ASSESSMENT_HISTORY_COLUMNS} FROM assessments WHERE user_id = ? AND (created_at, id) < (?::timestamp, ?) '
+        'ORDER BY created_at DESC, id DESC LIMIT ?'
+    )
+    FIRST_CREATED_AT = 'infinity'
+
+    @contextmanager
+    def _errors(self):
+        try:
+            yield
+        except psycopg.Error as e:
+            raise StorageError(str(e)) from e
+
+    def _transaction(self):
+        # Connections are in autocommit mode, so single statements commit on their own
+        return self.conn.transaction()
+
+    def _sql(self, sql):
+        return sql.replace('?', '%s')
+
+    def _insert(self, sql, params):
+        return self.conn.execute(self._sql(sql) + ' RETURNING id', params).fetchone()['id']
+
+    def _executemany(self, sql, params_seq):
+        # psycopg connections have no executemany; the cursor's pipelines the statements
+        with self.conn.cursor() as cursor:
+            cursor.executemany(self._sql(sql), params_seq)
+
+    def _search_organizations(self, words, after_id, limit):
+        return self._all(
+            f"SELECT {ORGANIZATION_COLUMNS} FROM organizations WHERE search @@ plainto_tsquery('english', ?) AND id < ? "
+            'ORDER BY id DESC LIMIT ?',
+            (' '.join(words), after_id, limit)
+        )
+
+    def _search_assessments(self, user_id, words, after_id, limit):
+        return self._all(
+            f'SELECT {ASSESSMENT_HISTORY_COLUMNS} FROM assessments '
+            "WHERE user_id = ? AND search @@ plainto_tsquery('english', ?) AND id < ? ORDER BY id DESC LIMIT ?",
+            (user_id, ' '.join(words), after_id, limit)
+        )
+
+    def rebuild_assessment_stats(self):
+        with self._errors(), self._transaction():
+            # Blocks writers to assessments until the recount commits, so no insert lands in between
+            self.conn.execute('LOCK TABLE assessments IN SHARE MODE')
+            stored = {(row['scope'], row['key']): row['count'] for row in self.conn.execute(
+                'SELECT scope, key, count FROM assessment_stats'
+            )}
+            self.conn.execute('DELETE FROM assessment_stats')
+            for sql in (
+                "INSERT INTO assessment_stats (scope, key, count) SELECT 'total', '', COUNT(*) FROM assessments",
+                "INSERT INTO assessment_stats (scope, key, count) SELECT 'risk_level', risk_level, COUNT(*) FROM assessments GROUP BY risk_level",
+                "INSERT INTO assessment_stats (scope, key, count) SELECT 'industry', industry, COUNT(*) FROM assessments GROUP BY industry",
+                "INSERT INTO assessment_stats (scope, key, count) SELECT 'user', user_id::text, COUNT(*) FROM assessments GROUP BY user_id",
+            ):
+                self.conn.execute(sql)
+            actual = {(row['scope'], row['key']): row['count'] for row in self.conn.execute(
+                'SELECT scope, key, count FROM assessment_stats'
+            )}
+        return stats_drift(stored, actual)
+
+    def rebuild_search_index(self):
+        # The tsvector columns are generated, so they can't drift; rebuilding the GIN indexes is all there is
+        with self._errors():
+            self.conn.execute('REINDEX INDEX idx_organizations_search')
+            self.conn.execute('REINDEX INDEX idx_assessments_search')
+
+class PostgresStorage:
+    """
+    The PostgreSQL backend, for running several hosts against one database. Each worker process
+    keeps a psycopg_pool of autocommit connections (opened on first use, and again after a fork);
+    queries are prepared server-side per connection, so hot queries are planned once.
+    """
+
+    dialect = 'postgres'
+
+    def __init__(self, url, min_size=POSTGRES_POOL_MIN, max_size=POSTGRES_POOL_MAX):
+        if not url:
+            raise ValueError("DATABASE_URL must be set when DATABASE_BACKEND is postgres")
+        self.url = url
+        self.min_size = min_size
+        self.max_size = max_size
+        self._pool = None
+        self._pid = None
+
+    def _connections(self):
+        if self._pool is None or self._pid != os.getpid():
+            # A pool inherited from the parent process shares its sockets; leave it and open a new one
+            self._pool = ConnectionPool(
+                self.url, min_size=self.min_size, max_size=self.max_size, open=True,
+                check=ConnectionPool.check_connection, # Replaces connections the server has closed
+                kwargs={'autocommit': True, 'row_factory': _row, 'prepare_threshold': POSTGRES_PREPARE_THRESHOLD},
+            )
+            self._pid = os.getpid()
+        return self._pool
+
+    def acquire(self):
+        try:
+            return PostgresRepository(self._connections().getconn())
+        except psycopg.Error as e:
+            raise StorageError(str(e)) from e
+
+    def release(self, repository):
+        self._connections().putconn(repository.conn)
+
+    @contextmanager
+    def session(self):
+        """A repository for code outside a request, e.g. background jobs."""
+        repository = self.acquire()
+        try:
+            yield repository
+        finally:
+            self.release(repository)
+
+    def migrate(self):
+        """Applies pending schema migrations on a dedicated connection; returns the versions applied."""
+        try:
+            # DDL isn't prepared: prepared plans would go stale as the schema changes
+            with psycopg.connect(self.url, autocommit=True, prepare_threshold=None) as conn:
+                @contextmanager
+                def transaction():
+                    with conn.transaction():
+                        # Held until commit, so workers starting at once apply each migration once
+                        conn.execute('SELECT pg_advisory_xact_lock(%s)', (MIGRATION_LOCK_ID,))
+                        yield
+                return apply_migrations(conn, self.dialect, transaction, '%s')
+        except psycopg.Error as e:
+            raise StorageError(str(e)) from e
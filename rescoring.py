@@ -0,0 +1,185 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+
+from risk_calculator import calculate_risk_assessment_batch
+from risk_rules import get_ruleset
+from db_pool import tune_connection
+from repository import StorageError
+
+RESCORE_CHUNK_SIZE = int(os.getenv('RESCORE_CHUNK_SIZE', 500))
+RESCORE_PAUSE_SECONDS = float(os.getenv('RESCORE_PAUSE_SECONDS', 0.05)) # Yield the write lock between chunks
+RESCORE_LEASE_SECONDS = 60 # A job owner that stops renewing its lease for this long can be taken over
+
+_SCORE_INPUTS = ('budget', 'timeline', 'location', 'number_of_cofounders', 'technical_complexity',
+                 'total_revenue', 'total_expense') # repository.SCORE_COLUMNS, in calculate_risk_assessment_batch order
+
+def init_rescoring_schema(conn):
+    """
+    Creates the table that records re-scoring progress per ruleset version. It lives in the local
+    SQLite file whatever the storage backend, so with PostgreSQL run re-scoring on one host.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS rescoring_jobs (
+            score_version TEXT PRIMARY KEY,
+            status TEXT NOT NULL, -- running, completed
+            last_id INTEGER NOT NULL DEFAULT 0, -- Highest assessment id already processed
+            rows_total INTEGER NOT NULL DEFAULT 0, -- Stale rows counted when the job started
+            rows_done INTEGER NOT NULL DEFAULT 0,
+            owner TEXT,
+            lease_until REAL NOT NULL DEFAULT 0,
+            started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+
+def _connect(database):
+    conn = sqlite3.connect(database, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.isolation_level = None # Explicit, short BEGIN IMMEDIATE ... COMMIT per chunk
+    return tune_connection(conn)
+
+def _claim_job(conn, repo, version, owner):
+    """
+    Creates or resumes the job for a ruleset version and takes its lease. Returns the job row,
+    or None if there are no stale rows or another worker holds a live lease.
+    """
+    now = time.time()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        job = conn.execute('SELECT * FROM rescoring_jobs WHERE score_version = ?', (version,)).fetchone()
+        if job is None:
+            rows_total = repo.count_stale_assessments(version)
+            conn.execute(
+                'INSERT INTO rescoring_jobs (score_version, status, rows_total, owner, lease_until) VALUES (?, ?, ?, ?, ?)',
+                (version, 'running', rows_total, owner, now + RESCORE_LEASE_SECONDS)
+            )
+        elif job['owner'] not in (None, owner) and job['lease_until'] > now:
+            conn.execute('COMMIT')
+            return None
+        elif job['status'] == 'completed':
+            # Rows can go stale again, e.g. after a rollback to this version, so restart if needed
+            rows_total = repo.count_stale_assessments(version)
+            if not rows_total:
+                conn.execute('COMMIT')
+                return None
+            conn.execute(
+                "UPDATE rescoring_jobs SET status = 'running', last_id = 0, rows_total = ?, rows_done = 0, "
+                "owner = ?, lease_until = ?, started_at = CURRENT_TIMESTAMP WHERE score_version = ?",
+                (rows_total, owner, now + RESCORE_LEASE_SECONDS, version)
+            )
+        else:
+            conn.execute(
+                'UPDATE rescoring_jobs SET owner = ?, lease_until = ? WHERE score_version = ?',
+                (owner, now + RESCORE_LEASE_SECONDS, version)
+            )
+        conn.execute('COMMIT')
+    except (sqlite3.Error, StorageError):
+        conn.execute('ROLLBACK')
+        raise
+    return conn.execute('SELECT * FROM rescoring_jobs WHERE score_version = ?', (version,)).fetchone()
+
+def _score_rows(rows):
+    """Scores fetched assessment rows in one batch and returns executemany parameters."""
+    columns = list(zip(*[[row[name] for name in _SCORE_INPUTS] for row in rows]))
+    results = calculate_risk_assessment_batch(
+        columns[0], list(columns[1]), list(columns[2]), columns[3], columns[4], columns[5], columns[6]
+    )
+    explanations = results["explanations"]
+    return [
+        (int(score), str(level), json.dumps({"explanation": explanations[code]}), results["ruleset_version"], row['id'])
+        for row, score, level, code in zip(rows, results["risk_score"].tolist(), results["risk_level"].tolist(),
+                                            results["explanation_code"].tolist())
+    ]
+
+def rescore_assessments(database, storage, chunk_size=RESCORE_CHUNK_SIZE, pause=RESCORE_PAUSE_SECONDS, progress=None):
+    """
+    Re-scores every assessment whose score_version differs from the active ruleset version.
+    Rows are read from and written to `storage`, walked by primary key in chunks; each chunk is
+    written with one executemany in its own short transaction, so live requests only ever wait for
+    a single chunk. Progress is stored in rescoring_jobs (in `database`) after every chunk, so an
+    interrupted job resumes where it stopped.
+    `progress` is called with the job row after each chunk. Returns the final job row, or None
+    if there was nothing to do for this worker or another worker took the job over.
+    """
+    ruleset = get_ruleset()
+    version = ruleset.version
+    owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    conn = _connect(database)
+    try:
+        with storage.session() as repo:
+            return _rescore(conn, repo, version, owner, chunk_size, pause, progress)
+    finally:
+        conn.close()
+
+def _rescore(conn, repo, version, owner, chunk_size, pause, progress):
+    job = _claim_job(conn, repo, version, owner)
+    if job is None:
+        return None
+    last_id = job['last_id']
+
+    while True:
+        rows = repo.stale_assessments(version, last_id, chunk_size)
+        if not rows:
+            break
+        if get_ruleset().version != version:
+            print(f"Risk ruleset changed from {version} during re-scoring; stopping this job.")
+            break
+        updates = _score_rows(rows)
+        last_id = rows[-1]['id']
+
+        repo.update_scores(updates)
+        # The job row is recorded after the chunk commits. Re-scoring a row is idempotent, so if this
+        # worker dies in between, whoever resumes only finds the chunk's rows already up to date
+        renewed = conn.execute(
+            'UPDATE rescoring_jobs SET last_id = ?, rows_done = rows_done + ?, lease_until = ?, '
+            'updated_at = CURRENT_TIMESTAMP WHERE score_version = ? AND owner = ?',
+            (last_id, len(updates), time.time() + RESCORE_LEASE_SECONDS, version, owner)
+        ).rowcount
+        if not renewed:
+            # The lease expired (e.g. a long stall) and another worker took the job over; it carries on from its own position
+            print(f"Lost the re-scoring lease for ruleset {version}; leaving the job to its new owner.")
+            return None
+
+        if progress:
+            progress(get_rescoring_progress(conn, version))
+        if pause:
+            time.sleep(pause)
+
+    if get_ruleset().version == version:
+        conn.execute(
+            "UPDATE rescoring_jobs SET status = 'completed', owner = NULL, lease_until = 0, "
+            "updated_at = CURRENT_TIMESTAMP WHERE score_version = ? AND owner = ?",
+            (version, owner)
+        )
+    return get_rescoring_progress(conn, version)
+
+def get_rescoring_progress(conn, version=None):
+    """Returns the job row for a ruleset version (the active one by default) as a dict, or None."""
+    version = version or get_ruleset().version
+    job = conn.execute('SELECT * FROM rescoring_jobs WHERE score_version = ?', (version,)).fetchone()
+    if job is None:
+        return None
+    job = dict(job)
+    job['percent_done'] = round(100 * job['rows_done'] / job['rows_total'], 1) if job['rows_total'] else 100.0
+    return job
+
+def start_background_rescoring(database, storage):
+    """Runs rescore_assessments in a daemon thread so a worker can serve requests meanwhile."""
+    def report(job):
+        print(f"Re-scoring to ruleset {job['score_version']}: {job['rows_done']}/{job['rows_total']} rows "
+              f"({job['percent_done']}%)")
+
+    def run():
+        try:
+            rescore_assessments(database, storage, progress=report)
+        except Exception as e:
+            print(f"Error during background re-scoring: {e}")
+
+    thread = threading.Thread(target=run, name="assessment-rescoring", daemon=True)
+    thread.start()
+    return thread
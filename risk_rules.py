@@ -0,0 +1,378 @@
+import os
+import json
+import math
+import time
+import threading
+from bisect import bisect_right
+
+import numpy as np
+
+# Path to an optional JSON ruleset that overrides DEFAULT_RULESET. The file is re-read when it
+# changes, so thresholds can be tuned on running workers without a deploy.
+RISK_RULESET_PATH = os.getenv('RISK_RULESET_PATH')
+RISK_RULESET_RELOAD_INTERVAL = float(os.getenv('RISK_RULESET_RELOAD_INTERVAL', 5)) # Seconds between mtime checks
+
+# Bands are listed in ascending order. A band with "below" covers values < threshold, a band
+# with "upto" covers values <= threshold, and the last band (no threshold) covers the rest.
+# Conditions are [lhs, op, rhs] where an operand is an input name, a number, or [input, factor].
+DEFAULT_RULESET = {
+    "version": "2025.1",
+    "timeline_months": {
+        "values": {"1-3months": 2, "3-6months": 4.5, "6-12months": 9, "1-2years": 18, "2+years": 30},
+        "default": 8,
+    },
+    "location_scores": {
+        "values": {"local": 1, "country": 2, "global": 3},
+        "default": 2,
+    },
+    "hard_rules": [
+        {
+            "id": "no_revenue_high_burn",
+            "score": 95,
+            "when": [["revenue", "==", 0], ["expense", ">", ["budget", 0.8]]],
+            "explanation": "No revenue but expenses exceed 80% of budget. Critical financial risk.",
+        },
+        {
+            "id": "expenses_triple_revenue",
+            "score": 90,
+            "when": [["revenue", ">", 0], ["expense", ">", ["revenue", 3]]],
+            "explanation": "Expenses are more than triple the revenue, indicating severe financial strain.",
+        },
+        {
+            "id": "solo_founder_high_complexity",
+            "score": 85,
+            "when": [["cofounders", "==", 1], ["complexity", ">=", 8]],
+            "explanation": "Single founder with very high technical complexity poses significant execution risk.",
+        },
+        {
+            "id": "budget_below_half_expenses",
+            "score": 80,
+            "when": [["budget", "<", ["expense", 0.5]]],
+            "explanation": "Budget is less than half of expected expenses. Insufficient funding risk.",
+        },
+    ],
+    "factors": {
+        # Profit margin bands apply when there is revenue, the no_revenue conditions otherwise
+        "financial": {
+            "margin_bands": [
+                {"below": -0.5, "points": 30},
+                {"below": 0, "points": 20},
+                {"below": 0.1, "points": 10},
+                {"below": 0.2, "points": 5},
+                {"points": 0},
+            ],
+            "no_revenue": [
+                {"when": [["expense", ">", 0]], "points": 25},
+                {"when": [["expense", ">", ["budget", 0.6]]], "points": 15},
+            ],
+        },
+        # Applied to budget / (expense + 1) when there is a budget
+        "budget_coverage": [
+            {"below": 0.5, "points": 20},
+            {"below": 0.8, "points": 10},
+            {"below": 1.0, "points": 5},
+            {"points": 0},
+        ],
+        "timeline": [
+            {"below": 3, "points": 5},
+            {"upto": 12, "points": 0},
+            {"upto": 18, "points": 3},
+            {"upto": 24, "points": 5},
+            {"points": 8},
+        ],
+        "location": [
+            {"below": 2, "points": 2},
+            {"upto": 2, "points": 3},
+            {"below": 3, "points": 2},
+            {"upto": 3, "points": 4},
+            {"points": 2},
+        ],
+        "team": [
+            {"below": 1, "points": 0},
+            {"upto": 1, "points": 8},
+            {"below": 2, "points": 0},
+            {"upto": 2, "points": 3},
+            {"below": 4, "points": 0},
+            {"points": 2},
+        ],
+        "complexity": [
+            {"upto": 2, "points": 3},
+            {"below": 4, "points": 0},
+            {"below": 6, "points": 6},
+            {"below": 8, "points": 10},
+            {"points": 15},
+        ],
+    },
+    "levels": [
+        {"below": 45, "level": "Low",
+         "explanation": "Overall low risk, indicating a well-planned project with manageable challenges."},
+        {"below": 75, "level": "Medium",
+         "explanation": "Moderate risk, with some areas requiring attention in funding or project execution."},
+        {"level": "High",
+         "explanation": "High overall risk due to a combination of financial, scope, and execution challenges."},
+    ],
+}
+
+FACTOR_NAMES = ("financial", "budget_coverage", "timeline", "location", "team", "complexity")
+INPUT_NAMES = ("budget", "revenue", "expense", "cofounders", "complexity", "timeline_months", "location_score")
+
+_OPERATORS = ("<", "<=", ">", ">=", "==", "!=")
+
+def _compile_bands(bands, value_key="points"):
+    """
+    Compiles an ascending band list into (edges, values) for bisect_right lookups.
+    An "upto" threshold is nudged to the next float up, so every edge is lower-inclusive.
+    """
+    edges, values = [], []
+    for i, band in enumerate(bands):
+        values.append(band[value_key])
+        if "below" in band:
+            edges.append(float(band["below"]))
+        elif "upto" in band:
+            edges.append(float(np.nextafter(float(band["upto"]), np.inf)))
+        elif i != len(bands) - 1:
+            raise ValueError("Only the last band may omit its 'below'/'upto' threshold.")
+        if not all(math.isfinite(float(band[key])) for key in ("below", "upto") if key in band):
+            raise ValueError(f"Band thresholds must be finite numbers: {band}")
+    if len(edges) != len(values) - 1:
+        raise ValueError("The last band must not have a threshold.")
+    if any(b < a for a, b in zip(edges, edges[1:])):
+        raise ValueError(f"Band thresholds must be ascending: {bands}")
+    return edges, values
+
+def _compile_operand(spec):
+    """Renders one condition operand as a Python expression over the inputs dict `v`."""
+    if isinstance(spec, (list, tuple)):
+        name, factor = spec
+        return f"{_compile_operand(name)} * {_compile_operand(factor)}"
+    if isinstance(spec, str):
+        if spec not in INPUT_NAMES:
+            raise ValueError(f"Unknown input '{spec}' in ruleset condition.")
+        return f"v[{spec!r}]"
+    if isinstance(spec, bool) or not isinstance(spec, (int, float)) or not math.isfinite(spec):
+        raise ValueError(f"Invalid operand {spec!r} in ruleset condition.") # repr(inf) would compile to an unknown name
+    return repr(spec)
+
+def _compile_conditions(conditions):
+    """
+    Compiles a list of [lhs, op, rhs] conditions (ANDed together) into a pair of functions:
+    one for a single inputs dict and one for a dict of NumPy arrays. Operands and operators are
+    validated against whitelists before the expression is built.
+    """
+    terms = []
+    for lhs, op, rhs in conditions:
+        if op not in _OPERATORS:
+            raise ValueError(f"Unknown operator '{op}' in ruleset condition.")
+        terms.append(f"({_compile_operand(lhs)} {op} {_compile_operand(rhs)})")
+    if not terms:
+        raise ValueError("A ruleset condition list must not be empty.")
+    scalar = eval(f"lambda v: {' and '.join(terms)}", {})
+    batch = eval(f"lambda v: {' & '.join(terms)}", {})
+    return scalar, batch
+
+def _map_strings(values, mapping, default):
+    """Maps an array of strings through a dict, looking up each distinct value only once."""
+    values = np.asarray(values)
+    uniques, inverse = np.unique(values, return_inverse=True)
+    mapped = np.array([mapping.get(u, default) for u in uniques.tolist()], dtype=float)
+    return mapped[inverse.reshape(values.shape)]
+
+class CompiledRuleset:
+    """A risk ruleset compiled into condition functions and bisect threshold tables."""
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.version = str(spec["version"])
+        self.timeline_months = dict(spec["timeline_months"]["values"])
+        self.timeline_default = spec["timeline_months"]["default"]
+        self.location_scores = dict(spec["location_scores"]["values"])
+        self.location_default = spec["location_scores"]["default"]
+
+        self.hard_rules = [
+            (rule["id"], rule["score"], *_compile_conditions(rule["when"]), rule["explanation"])
+            for rule in spec["hard_rules"]
+        ]
+
+        factors = spec["factors"]
+        self.margin_table = _compile_bands(factors["financial"]["margin_bands"])
+        self.no_revenue_rules = [
+            (*_compile_conditions(rule["when"]), rule["points"]) for rule in factors["financial"]["no_revenue"]
+        ]
+        self.coverage_table = _compile_bands(factors["budget_coverage"])
+        self.timeline_table = _compile_bands(factors["timeline"])
+        self.location_table = _compile_bands(factors["location"])
+        self.team_table = _compile_bands(factors["team"])
+        self.complexity_table = _compile_bands(factors["complexity"])
+        self.level_table = _compile_bands(spec["levels"], value_key="level")
+        level_explanations = [level["explanation"] for level in spec["levels"]]
+
+        # Explanation codes: hard rules first (in precedence order), then the score levels
+        self.explanations = tuple(rule[4] for rule in self.hard_rules) + tuple(level_explanations)
+        self.levels = tuple("High" for _ in self.hard_rules) + tuple(self.level_table[1])
+        self._level_explanations = dict(zip(self.level_table[1], level_explanations))
+
+        # Timeline and location are categorical, so their points are resolved once per category
+        self.timeline_points = {k: self._band(self.timeline_table, v) for k, v in self.timeline_months.items()}
+        self.timeline_default_points = self._band(self.timeline_table, self.timeline_default)
+        self.location_points = {k: self._band(self.location_table, v) for k, v in self.location_scores.items()}
+        self.location_default_points = self._band(self.location_table, self.location_default)
+
+    @staticmethod
+    def _band(table, value):
+        edges, values = table
+        return values[bisect_right(edges, value)]
+
+    @staticmethod
+    def _band_batch(table, values):
+        edges, points = table
+        return np.asarray(points)[np.searchsorted(np.asarray(edges), values, side="right")]
+
+    def evaluate(self, data):
+        """
+        Scores one assessment dict. Returns the risk level, capped score and explanation, the
+        hard rule that fired (if any), per-factor points and their uncapped total.
+        """
+        timeline = data.get("timeline", "")
+        location = data.get("location", "")
+        inputs = {
+            "budget": data.get("budget", 0),
+            "revenue": data.get("total_revenue", 0),
+            "expense": data.get("total_expense", 0),
+            "cofounders": data.get("number_of_cofounders", 0),
+            "complexity": data.get("technical_complexity", 5),
+            "timeline_months": self.timeline_months.get(timeline, self.timeline_default),
+            "location_score": self.location_scores.get(location, self.location_default),
+        }
+        budget, revenue, expense = inputs["budget"], inputs["revenue"], inputs["expense"]
+
+        if revenue > 0:
+            financial = self._band(self.margin_table, (revenue - expense) / revenue)
+        else:
+            financial = sum(points for matches, _, points in self.no_revenue_rules if matches(inputs))
+        factors = {
+            "financial": financial,
+            "budget_coverage": self._band(self.coverage_table, budget / (expense + 1)) if budget > 0 else 0,
+            "timeline": self.timeline_points.get(timeline, self.timeline_default_points),
+            "location": self.location_points.get(location, self.location_default_points),
+            "team": self._band(self.team_table, inputs["cofounders"]),
+            "complexity": self._band(self.complexity_table, inputs["complexity"]),
+        }
+        total = sum(factors.values())
+
+        hard_rule = None
+        for rule_id, score, matches, _, explanation in self.hard_rules:
+            if matches(inputs):
+                hard_rule = rule_id
+                level, risk_score = "High", score
+                break
+        else:
+            level = self._band(self.level_table, total)
+            risk_score = total
+            explanation = self._level_explanations[level]
+
+        return {
+            "risk_level": level,
+            "risk_score": min(100, risk_score), # Cap score at 100
+            "explanation": explanation,
+            "hard_rule": hard_rule,
+            "factors": factors,
+            "total": total,
+            "ruleset_version": self.version,
+        }
+
+    def evaluate_batch(self, budget, timeline, location, cofounders, complexity, revenue, expense):
+        """
+        Vectorized evaluate over column arrays (scalars are broadcast). Returns arrays for
+        "risk_score", "risk_level", "explanation_code" (an index into self.explanations),
+        "total" and each factor.
+        """
+        # Scalars broadcast against arrays, e.g. a fixed timeline with sampled budgets
+        budget, revenue, expense, cofounders, complexity = np.broadcast_arrays(
+            *(np.asarray(column, dtype=float) for column in (budget, revenue, expense, cofounders, complexity)))
+        shape = budget.shape
+        inputs = {
+            "budget": budget,
+            "revenue": revenue,
+            "expense": expense,
+            "cofounders": cofounders,
+            "complexity": complexity,
+            "timeline_months": np.broadcast_to(_map_strings(timeline, self.timeline_months, self.timeline_default), shape),
+            "location_score": np.broadcast_to(_map_strings(location, self.location_scores, self.location_default), shape),
+        }
+        has_revenue = revenue > 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            profit_margin = np.where(has_revenue, (revenue - expense) / np.where(has_revenue, revenue, 1), 0)
+            budget_coverage = budget / (expense + 1)
+        no_revenue_points = np.zeros(shape, dtype=np.int64)
+        for _, matches_batch, points in self.no_revenue_rules:
+            no_revenue_points += np.where(matches_batch(inputs), points, 0)
+        factors = {
+            "financial": np.where(has_revenue, self._band_batch(self.margin_table, profit_margin), no_revenue_points),
+            "budget_coverage": np.where(budget > 0, self._band_batch(self.coverage_table, budget_coverage), 0),
+            "timeline": np.broadcast_to(_map_strings(timeline, self.timeline_points, self.timeline_default_points), shape).astype(np.int64),
+            "location": np.broadcast_to(_map_strings(location, self.location_points, self.location_default_points), shape).astype(np.int64),
+            "team": self._band_batch(self.team_table, inputs["cofounders"]),
+            "complexity": self._band_batch(self.complexity_table, inputs["complexity"]),
+        }
+        total = sum(factors.values())
+
+        level_offset = len(self.hard_rules)
+        explanation_code = level_offset + np.searchsorted(np.asarray(self.level_table[0]), total, side="right")
+        risk_score = total
+        # Apply hard rules in reverse so the first matching rule wins
+        for code in reversed(range(len(self.hard_rules))):
+            _, score, _, matches_batch, _ = self.hard_rules[code]
+            fired = matches_batch(inputs)
+            explanation_code = np.where(fired, code, explanation_code)
+            risk_score = np.where(fired, score, risk_score)
+
+        explanation_code = explanation_code.astype(np.int16)
+        return {
+            "risk_score": np.minimum(100, risk_score), # Cap score at 100
+            "risk_level": np.asarray(self.levels)[explanation_code],
+            "explanation_code": explanation_code,
+            "total": total,
+            "factors": factors,
+            "ruleset_version": self.version,
+        }
+
+# --- Active ruleset (hot-reloadable) ---
+_reload_lock = threading.Lock()
+_active_ruleset = CompiledRuleset(DEFAULT_RULESET)
+_loaded_mtime = None
+_last_checked = 0.0
+
+def load_ruleset(spec):
+    """Compiles a ruleset spec and makes it the active one. Raises ValueError/KeyError if invalid."""
+    global _active_ruleset
+    compiled = CompiledRuleset(spec)
+    _active_ruleset = compiled # A single reference swap, so readers never see a half-built ruleset
+    return compiled
+
+def reload_ruleset(force=False):
+    """
+    Re-reads RISK_RULESET_PATH if it changed since the last load (or always, with force=True).
+    An unreadable or invalid file is reported and the current ruleset stays active.
+    """
+    global _loaded_mtime, _last_checked
+    with _reload_lock:
+        _last_checked = time.monotonic()
+        if not RISK_RULESET_PATH:
+            return _active_ruleset
+        try:
+            mtime = os.stat(RISK_RULESET_PATH).st_mtime
+            if force or mtime != _loaded_mtime:
+                _loaded_mtime = mtime # Don't retry (and re-report) a broken file until it changes again
+                with open(RISK_RULESET_PATH) as f:
+                    spec = json.load(f)
+                load_ruleset(spec)
+                print(f"Loaded risk ruleset version {_active_ruleset.version} from {RISK_RULESET_PATH}")
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Error loading risk ruleset from {RISK_RULESET_PATH}: {e}. Keeping version {_active_ruleset.version}.")
+        return _active_ruleset
+
+def get_ruleset():
+    """Returns the active compiled ruleset, checking the ruleset file for changes at most every few seconds."""
+    if RISK_RULESET_PATH and time.monotonic() - _last_checked >= RISK_RULESET_RELOAD_INTERVAL:
+        reload_ruleset()
+    return _active_ruleset
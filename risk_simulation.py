@@ -0,0 +1,95 @@
+import time
+import numpy as np
+
+from risk_calculator import calculate_risk_assessment_batch
+
+DEFAULT_SIMULATION_SAMPLES = 20000
+MAX_SIMULATION_SAMPLES = 100000
+SIMULATED_FIELDS = ("budget", "total_revenue", "total_expense")
+SCORE_PERCENTILES = (5, 25, 50, 75, 95)
+
+def _draw(spec, samples, rng, field):
+    """
+    Draws samples for one money field. A plain number is used as-is. A dict describes a range:
+      {"min": a, "max": b}                      -> uniform
+      {"min": a, "mode": m, "max": b}           -> triangular
+      {"distribution": "normal", "mean": m, "std": s}
+    An explicit "distribution" key ("uniform", "triangular", "normal") may be given for any of them.
+    Negative draws are clipped to 0.
+    """
+    if not isinstance(spec, dict):
+        return float(spec)
+
+    distribution = spec.get("distribution") or ("triangular" if "mode" in spec else "uniform")
+    try:
+        if distribution == "uniform":
+            low, high = float(spec["min"]), float(spec["max"])
+            if low > high:
+                raise ValueError(f"{field}: min must not exceed max")
+            values = rng.uniform(low, high, samples)
+        elif distribution == "triangular":
+            low, mode, high = float(spec["min"]), float(spec["mode"]), float(spec["max"])
+            if not low <= mode <= high or low == high:
+                raise ValueError(f"{field}: expected min <= mode <= max with min < max")
+            values = rng.triangular(low, mode, high, samples)
+        elif distribution == "normal":
+            mean, std = float(spec["mean"]), float(spec["std"])
+            if std < 0:
+                raise ValueError(f"{field}: std must not be negative")
+            values = rng.normal(mean, std, samples)
+        else:
+            raise ValueError(f"{field}: unknown distribution '{distribution}'")
+    except KeyError as e:
+        raise ValueError(f"{field}: missing parameter {e}")
+    return np.maximum(values, 0)
+
+def simulate_risk_distribution(assessment_data, samples=DEFAULT_SIMULATION_SAMPLES, seed=None):
+    """
+    Monte Carlo what-if analysis for one assessment. budget, total_revenue and total_expense may
+    be numbers or range/distribution dicts (see _draw); all other fields are fixed. Every draw is
+    scored in one vectorized call and the score distribution is summarized.
+    Raises ValueError for invalid input.
+    """
+    samples = int(samples)
+    if not 1 <= samples <= MAX_SIMULATION_SAMPLES:
+        raise ValueError(f"samples must be between 1 and {MAX_SIMULATION_SAMPLES}")
+
+    started = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    draws = {field: _draw(assessment_data.get(field, 0), samples, rng, field) for field in SIMULATED_FIELDS}
+    results = calculate_risk_assessment_batch(
+        np.broadcast_to(draws["budget"], (samples,)),
+        assessment_data.get("timeline", ""),
+        assessment_data.get("location", ""),
+        float(assessment_data.get("number_of_cofounders", 0)),
+        float(assessment_data.get("technical_complexity", 5)),
+        draws["total_revenue"],
+        draws["total_expense"],
+    )
+
+    scores = results["risk_score"]
+    level_probabilities = {"Low": 0.0, "Medium": 0.0, "High": 0.0}
+    for level, count in zip(*np.unique(results["risk_level"], return_counts=True)):
+        level_probabilities[str(level)] = int(count) / samples
+    hard_rule_count = len(results["hard_rules"])
+    rule_hits = np.bincount(results["explanation_code"], minlength=hard_rule_count)[:hard_rule_count]
+    hard_rule_probabilities = {rule_id: int(hits) / samples for rule_id, hits in zip(results["hard_rules"], rule_hits)}
+    most_frequent_rule = None
+    if rule_hits.any():
+        most_frequent_rule = results["hard_rules"][int(rule_hits.argmax())]
+
+    return {
+        "samples": samples,
+        "ruleset_version": results["ruleset_version"],
+        "score": {
+            "mean": float(scores.mean()),
+            "std": float(scores.std()),
+            "min": float(scores.min()),
+            "max": float(scores.max()),
+            "percentiles": {f"p{p}": float(v) for p, v in zip(SCORE_PERCENTILES, np.percentile(scores, SCORE_PERCENTILES))},
+        },
+        "risk_level_probabilities": level_probabilities,
+        "hard_rule_probabilities": hard_rule_probabilities,
+        "most_frequent_hard_rule": most_frequent_rule,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
@@ -0,0 +1,93 @@
+import time
+import sqlite3
+import threading
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key within one process: the first caller runs the
+    function and every caller that arrives while it is in flight receives the same result
+    (or exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """Runs fn() for key unless a call for key is already in flight, and returns its result."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {"done": threading.Event(), "result": None, "error": None}
+
+        if not leader:
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+
+        try:
+            call["result"] = fn()
+            return call["result"]
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call["done"].set()
+
+class SQLiteLease:
+    """
+    A lightweight cross-process lease on a key, stored in SQLite. Only one owner holds a key at a
+    time; a lease that isn't released (e.g. the worker died) expires after its ttl.
+    """
+
+    def __init__(self, path, table="leases"):
+        self.path = path
+        self.table = table
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                key TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        ''')
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            self._local.conn = conn
+        return conn
+
+    def acquire(self, key, owner, ttl):
+        """Takes the lease if it is free or expired. Returns True if owner now holds it."""
+        now = time.time()
+        conn = self._connection()
+        try:
+            cursor = conn.execute(
+                f'INSERT INTO {self.table} (key, owner, expires_at) VALUES (?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at '
+                f'WHERE {self.table}.expires_at < ? OR {self.table}.owner = excluded.owner',
+                (key, owner, now + ttl, now)
+            )
+            conn.commit()
+            return cursor.rowcount == 1
+        except sqlite3.Error as e:
+            conn.rollback()
+            print(f"Lease error for {key}: {e}. Proceeding without a lease.")
+            return True # Failing open only costs a duplicate upstream call
+
+    def release(self, key, owner):
+        conn = self._connection()
+        try:
+            conn.execute(f'DELETE FROM {self.table} WHERE key = ? AND owner = ?', (key, owner))
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            print(f"Error releasing lease for {key}: {e}")
@@ -0,0 +1,45 @@
+import os
+import uuid
+
+import pytest
+
+from db_pool import ConnectionPool
+from repository import SqliteStorage
+
+TEST_DATABASE_URL = os.getenv('TEST_DATABASE_URL', '') # PostgreSQL for the postgres runs; each run uses its own schema, dropped afterwards
+
+def _sqlite_storage(tmp_path):
+    return SqliteStorage(ConnectionPool(str(tmp_path / 'test.db'))), None
+
+def _postgres_storage(tmp_path):
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    psycopg = pytest.importorskip('psycopg')
+    from psycopg.conninfo import make_conninfo
+    from repository_postgres import PostgresStorage
+    schema = f"test_{uuid.uuid4().hex[:12]}"
+    with psycopg.connect(TEST_DATABASE_URL, autocommit=True) as conn:
+        conn.execute(f'CREATE SCHEMA {schema}')
+    storage = PostgresStorage(make_conninfo(TEST_DATABASE_URL, options=f'-c search_path={schema}'))
+
+    def drop():
+        if storage._pool is not None:
+            storage._pool.close()
+        with psycopg.connect(TEST_DATABASE_URL, autocommit=True) as conn:
+            conn.execute(f'DROP SCHEMA {schema} CASCADE')
+    return storage, drop
+
+@pytest.fixture(params=['sqlite', 'postgres'])
+def storage(request, tmp_path):
+    """An empty, unmigrated database on each backend."""
+    storage, cleanup = (_sqlite_storage if request.param == 'sqlite' else _postgres_storage)(tmp_path)
+    yield storage
+    if cleanup:
+        cleanup()
+
+@pytest.fixture
+def repo(storage):
+    """A repository on a migrated database."""
+    storage.migrate()
+    with storage.session() as repo:
+        yield repo
@@ -0,0 +1,29 @@
+import gemini_advisor_service as advisor
+
+def conversation(turns):
+    messages = []
+    for i in range(turns):
+        messages.append({'role': 'user', 'text': f"Question {i}: " + "details " * 150})
+        messages.append({'role': 'model', 'text': f"Answer {i}: " + "advice " * 150})
+    return messages
+
+def test_stateless_compaction_summarizes_fixed_windows(monkeypatch):
+    calls = []
+    def summarize(summary, messages):
+        calls.append((summary, [msg['text'][:12] for msg in messages]))
+        return f"{summary or ''}|{len(messages)}"
+    monkeypatch.setattr(advisor, '_summarize', summarize)
+
+    window = 2 * advisor.ADVISOR_RECENT_TURNS
+    seen = []
+    for turns in range(1, 30):
+        calls.clear()
+        messages = conversation(turns)
+        summary, recent = advisor._compact_stateless(messages)
+        assert len(recent) >= 2 * advisor.ADVISOR_RECENT_TURNS or summary is None
+        assert recent == messages[len(messages) - len(recent):]
+        # Every fold is one window, and the folds repeat the previous request's before adding new ones
+        assert all(len(texts) == window for _, texts in calls)
+        assert calls[:len(seen)] == seen
+        seen = list(calls)
+    assert seen # The history went over budget
@@ -0,0 +1,33 @@
+import pytest
+
+from answer_cache import AnswerCache, numeric_tokens, normalize_question
+
+BUCKET = "technology-software:Medium"
+
+@pytest.fixture
+def cache(tmp_path):
+    return AnswerCache("test", path=str(tmp_path / "cache.db"))
+
+def test_exact_and_near_hits(cache):
+    cache.set("How do I find investors for my startup?", BUCKET, "Start with angels.")
+    assert cache.get("how do I find investors for my startup", BUCKET) == ("Start with angels.", "exact", 1.0)
+    answer, match, similarity = cache.get("How do I find investors for my startups", BUCKET)
+    assert (answer, match) == ("Start with angels.", "near") and similarity >= cache.similarity_threshold
+    assert cache.get("How do I find investors for my startup?", "other-bucket") == (None, None, 0.0)
+
+@pytest.mark.parametrize("cached, asked", [
+    # Similar enough to MinHash (0.8-0.9) but different questions
+    ("How can I reduce expenses in year one?", "How can I reduce expenses in year two?"),
+    ("Is a budget of 5 lakh enough?", "Is a budget of 50 lakh enough?"),
+    ("Which customer acquisition channels and pricing models work best in the first year for fintech",
+     "Which customer acquisition channels and pricing models work best in the first year for healthtech startups"),
+    # Above the threshold, but the figures differ
+    ("Is a budget of 5 lakh enough for an MVP?", "Is a budget of 50 lakh enough for an MVP?"),
+])
+def test_different_questions_miss(cache, cached, asked):
+    cache.set(cached, BUCKET, "cached answer")
+    assert cache.get(asked, BUCKET) == (None, None, 0.0)
+
+def test_numeric_tokens():
+    assert numeric_tokens(normalize_question("Hire 2 engineers in year one, or 3 by the second?")) == ["2", "one", "3", "second"]
+    assert numeric_tokens(normalize_question("How do I raise a seed round?")) == []
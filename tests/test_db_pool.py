@@ -0,0 +1,43 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from db_pool import ConnectionPool, PoolTimeout
+
+@pytest.fixture
+def pool(tmp_path):
+    return ConnectionPool(str(tmp_path / 'test.db'), max_idle=1, max_size=2, timeout=0.1)
+
+def test_connections_are_reused(pool):
+    conn = pool.acquire()
+    pool.release(conn)
+    assert pool.acquire() is conn
+    assert pool.stats()["opened"] == 1 and pool.stats()["reused"] == 1
+
+def test_acquire_times_out_at_max_size(pool):
+    held = [pool.acquire(), pool.acquire()]
+    started = time.monotonic()
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    assert time.monotonic() - started >= 0.1
+    assert pool.stats()["timeouts"] == 1
+    # Beyond max_idle, released connections are closed but still free their slot
+    for conn in held:
+        pool.release(conn)
+    assert pool.stats()["idle"] == 1 and pool.stats()["in_use"] == 0
+    assert len({pool.acquire(), pool.acquire()}) == 2
+
+def test_acquire_waits_for_a_release(pool):
+    held = [pool.acquire(), pool.acquire()]
+    threading.Timer(0.05, pool.release, args=(held[0],)).start()
+    assert pool.acquire(timeout=2) is held[0]
+
+def test_broken_connection_frees_its_slot(pool):
+    held = [pool.acquire(), pool.acquire()]
+    held[0].close() # Its rollback now fails, so release() discards it
+    pool.release(held[0])
+    conn = pool.acquire()
+    assert conn is not held[0]
+    conn.execute('SELECT 1')
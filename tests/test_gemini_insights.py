@@ -0,0 +1,105 @@
+import json
+import time
+import threading
+
+import pytest
+
+import gemini_service
+from ai_cache import PersistentCache
+from singleflight import SQLiteLease
+
+ASSESSMENT = {
+    "project_name": "Solar farm", "industry": "energy", "description": "Rooftop panels", "budget": 100000,
+    "timeline": "6-12months", "location": "country", "number_of_cofounders": 2, "technical_complexity": 5,
+    "total_revenue": 80000, "total_expense": 50000, "z_score_analysis": {},
+}
+
+class Response:
+    def __init__(self, text):
+        self.text = text
+
+class SlowModel:
+    """Answers the SWOT prompt at once and the comparison prompt after `delay` seconds."""
+    def __init__(self, delay):
+        self.delay = delay
+
+    def generate_content(self, prompt):
+        if "SWOT" in prompt:
+            return Response(json.dumps({"strengths": ["Fast"]}))
+        time.sleep(self.delay)
+        return Response(json.dumps({"lessons_learned": ["Too late"]}))
+
+class CountingModel:
+    """Counts calls and holds each one until `release` is set."""
+    def __init__(self):
+        self.calls = 0
+        self.lock = threading.Lock()
+        self.release = threading.Event()
+
+    def generate_content(self, prompt):
+        with self.lock:
+            self.calls += 1
+        self.release.wait(5)
+        return Response(json.dumps({"strengths": [f"Call {self.calls}"]}))
+
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+@pytest.fixture
+def insights_cache(tmp_path, monkeypatch):
+    path = str(tmp_path / "ai_cache.db")
+    monkeypatch.setattr(gemini_service, '_insights_cache', PersistentCache("gemini_insights", 3600, 100, path=path))
+    monkeypatch.setattr(gemini_service, '_insights_lease', SQLiteLease(path, table="insight_leases"))
+
+def test_refresh_does_not_join_a_cached_flight(monkeypatch, insights_cache):
+    model = CountingModel()
+    monkeypatch.setattr(gemini_service, 'genai_model', model)
+    results = {}
+    def run(name, bypass_cache):
+        results[name] = gemini_service.get_gemini_insights(ASSESSMENT, bypass_cache=bypass_cache)
+    threads = [threading.Thread(target=run, args=("first", False)), threading.Thread(target=run, args=("same", False))]
+    threads[0].start()
+    assert wait_for(lambda: model.calls == 2) # Both sections of the first request are in flight
+    threads[1].start()
+    threads.append(threading.Thread(target=run, args=("refresh", True)))
+    threads[2].start()
+    refreshed = wait_for(lambda: model.calls == 4) # The refresh makes its own calls rather than joining the first request's
+    model.release.set()
+    for thread in threads:
+        thread.join()
+    assert refreshed and model.calls == 4 and len(results) == 3
+
+def test_sections_share_one_deadline(monkeypatch):
+    monkeypatch.setattr(gemini_service, 'genai_model', SlowModel(delay=1.0))
+    monkeypatch.setattr(gemini_service, 'GEMINI_CALL_TIMEOUT', 0.2)
+    started = time.perf_counter()
+    insights, complete = gemini_service._generate_insights(ASSESSMENT)
+    assert time.perf_counter() - started < 0.8
+    assert insights["swot"] == {"strengths": ["Fast"]}
+    assert insights["comparison"] == gemini_service.get_mock_company_comparison() # Not done by the deadline
+    assert not complete
+
+class RefusingModel:
+    """Answers the SWOT prompt with JSON and the comparison prompt with plain text."""
+    def generate_content(self, prompt):
+        if "SWOT" in prompt:
+            return Response(json.dumps({"strengths": ["Fast"]}))
+        return Response("Sorry, I can't help with that.")
+
+def test_unparseable_section_is_not_cached(monkeypatch, insights_cache):
+    monkeypatch.setattr(gemini_service, 'genai_model', RefusingModel())
+    insights = gemini_service.get_gemini_insights(ASSESSMENT)
+    assert insights["comparison"] == gemini_service.get_mock_company_comparison()
+    assert gemini_service._insights_cache.get(gemini_service.insights_cache_key(ASSESSMENT)) is None
+
+def test_parse_json_section():
+    mock = lambda: {"mock": True}
+    assert gemini_service._parse_json_section('Here: {"a": 1} done', "SWOT", mock) == ({"a": 1}, True)
+    assert gemini_service._parse_json_section("Sorry, I can't help with that.", "SWOT", mock) == ({"mock": True}, False)
+    assert gemini_service._parse_json_section("} backwards {", "SWOT", mock) == ({"mock": True}, False)
+    assert gemini_service._parse_json_section('{"a": ', "SWOT", mock) == ({"mock": True}, False)
@@ -0,0 +1,85 @@
+import json
+import math
+
+import pytest
+from werkzeug.datastructures import MultiDict
+
+from organization_matching import OrganizationIndex, parse_focus, _ticket_fit
+
+from test_repository import create_user
+
+ASSESSMENT = {"industry": "fintech-payments", "location": "country", "budget": 500000}
+
+def register(repo, name, industries=None, scopes=None, min_ticket=None, max_ticket=None):
+    focus = {"focus_industries": json.dumps(industries) if industries else None, "min_ticket": min_ticket,
+             "max_ticket": max_ticket, "location_scopes": json.dumps(scopes) if scopes else None}
+    email = f"{name.lower()}@example.com"
+    return repo.create_organization(create_user(repo, email), name, email, focus=focus)
+
+def test_top_matches_ranking(repo):
+    register(repo, 'Alpha', ['fintech-payments'], ['country'], 100000, 1000000) # 3 + 2 + 2 = 7
+    register(repo, 'Charlie', ['fintech-payments'], None, 1000000, 5000000) # 3 + 1 + 2 * (1 - log10(2))
+    register(repo, 'Bravo', None, ['country']) # 1 + 2 + 1 = 4
+    register(repo, 'Aardvark', None, ['country']) # Ties with Bravo; names break the tie
+    register(repo, 'Echo') # 1 + 1 + 1 = 3
+    register(repo, 'Foxtrot', None, ['global'], 100000000) # 1 + 0 + 0
+    register(repo, 'Delta', ['healthcare-digital'], ['country']) # Another industry: never visited
+
+    index = OrganizationIndex()
+    matches = index.top_matches(repo, ASSESSMENT)
+    assert [(org['name'], org['score']) for org in matches] == [
+        ('Alpha', 7.0), ('Charlie', round(4 + 2 * (1 - math.log10(2)), 2)), ('Aardvark', 4.0), ('Bravo', 4.0), ('Echo', 3.0),
+    ]
+    assert matches[1]['match'] == {"industry": True, "location": False, "ticket_size": False}
+    assert matches[2]['match'] == {"industry": False, "location": True, "ticket_size": True}
+    everyone = [org['name'] for org in index.top_matches(repo, ASSESSMENT, k=50)]
+    assert everyone[-1] == 'Foxtrot' and 'Delta' not in everyone
+
+def test_any_posting_lists(repo):
+    register(repo, 'Open')
+    index = OrganizationIndex()
+    for industry, location in (('agriculture', 'local'), ('other', 'global')):
+        matches = index.top_matches(repo, {"industry": industry, "location": location, "budget": 1000})
+        assert [(org['name'], org['match']['industry'], org['match']['location']) for org in matches] == [('Open', False, False)]
+
+def test_refresh_picks_up_new_registrations(repo):
+    index = OrganizationIndex()
+    assert index.top_matches(repo, ASSESSMENT) == []
+    register(repo, 'Late', ['fintech-payments'])
+    assert [org['name'] for org in index.top_matches(repo, ASSESSMENT)] == ['Late']
+
+@pytest.mark.parametrize("budget, low, high, fit", [
+    (500, 100, 1000, 1.0),
+    (100, 100, 1000, 1.0), # Bounds are inclusive
+    (500, None, None, 1.0),
+    (2000, 100, 1000, 1 - math.log10(2)),
+    (50, 100, None, 1 - math.log10(2)), # Falls off the same way below the range
+    (10000, 100, 1000, 0.0), # Ten times beyond the range
+    (1, 100, 1000, 0.0),
+    (0, 100, 1000, 0.0),
+])
+def test_ticket_fit(budget, low, high, fit):
+    assert _ticket_fit(budget, low, high) == pytest.approx(fit)
+
+def test_parse_focus():
+    focus, errors = parse_focus(MultiDict([
+        ('focus_industries', 'fintech-payments'), ('focus_industries', 'agriculture'), ('location_scopes', 'global'),
+        ('min_ticket', '1000'), ('max_ticket', ''),
+    ]))
+    assert errors == {}
+    assert focus == {"focus_industries": '["fintech-payments", "agriculture"]', "min_ticket": 1000.0, "max_ticket": None,
+                     "location_scopes": '["global"]'}
+    assert parse_focus(MultiDict()) == ({"focus_industries": None, "min_ticket": None, "max_ticket": None,
+                                         "location_scopes": None}, {})
+
+@pytest.mark.parametrize("form, field", [
+    ([('focus_industries', 'space-mining')], 'focus_industries'),
+    ([('location_scopes', 'orbit')], 'location_scopes'),
+    ([('min_ticket', 'lots')], 'min_ticket'),
+    ([('min_ticket', '-5')], 'min_ticket'),
+    ([('max_ticket', '-5')], 'max_ticket'),
+    ([('min_ticket', '5000'), ('max_ticket', '1000')], 'max_ticket'),
+])
+def test_parse_focus_errors(form, field):
+    _, errors = parse_focus(MultiDict(form))
+    assert list(errors) == [field]
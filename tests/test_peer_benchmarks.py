@@ -0,0 +1,61 @@
+from peer_benchmarks import PeerBenchmarks
+
+from test_repository import assessment, create_user
+
+def submit(repo, user_id, overall_risk, industry='fintech', budget=100000, total_expense=50000, total_revenue=80000):
+    values = dict(assessment(f'Risk {overall_risk}', industry=industry), overall_risk=overall_risk, budget=budget,
+                  total_expense=total_expense, total_revenue=total_revenue)
+    assessment_id = repo.create_assessment(user_id, values)
+    return dict(values, id=assessment_id)
+
+def test_percentile_excludes_the_assessment_itself(repo):
+    user_id = create_user(repo)
+    for risk in (10, 20, 40, 50):
+        submit(repo, user_id, risk)
+    mine = submit(repo, user_id, 30)
+    submit(repo, user_id, 90, industry='healthtech') # Other industries aren't peers
+    result = PeerBenchmarks().percentiles(repo, mine)
+    assert result['overall_risk'] == {"value": 30, "percentile": 50.0, "peers": 4}
+    # Every budget is the same: no one below, three ties counted half
+    assert result['budget'] == {"value": 100000, "percentile": 50.0, "peers": 4}
+    assert result['expense_ratio']['percentile'] == 50.0
+
+def test_ties_count_half(repo):
+    user_id = create_user(repo)
+    for risk in (10, 20, 40):
+        submit(repo, user_id, risk)
+    mine = submit(repo, user_id, 20)
+    # One peer below (10), one tie (the other 20) and one above (40): (1 + 0.5) / 3
+    assert PeerBenchmarks().percentiles(repo, mine)['overall_risk'] == {"value": 20, "percentile": 50.0, "peers": 3}
+
+def test_no_peers_and_no_revenue(repo):
+    user_id = create_user(repo)
+    mine = submit(repo, user_id, 30, total_revenue=0)
+    result = PeerBenchmarks().percentiles(repo, mine)
+    assert result['overall_risk'] == {"value": 30, "percentile": None, "peers": 0}
+    assert result['expense_ratio'] == {"value": None, "percentile": None, "peers": 0}
+
+def test_new_rows_are_added_and_deletes_reload(repo):
+    user_id = create_user(repo)
+    benchmarks = PeerBenchmarks()
+    rows = [submit(repo, user_id, risk) for risk in (10, 20, 30)]
+    assert benchmarks.refresh(repo, 'fintech').values['overall_risk'] == [10, 20, 30]
+
+    submit(repo, user_id, 40)
+    entry = benchmarks.refresh(repo, 'fintech')
+    assert entry.values['overall_risk'] == [10, 20, 30, 40] and entry.rows == 4
+
+    # A delete (or a move to another industry) leaves the count short of the cached rows, forcing a full reload
+    repo._write('DELETE FROM assessments WHERE id = ?', (rows[0]['id'],))
+    repo._write('UPDATE assessments SET industry = ? WHERE id = ?', ('healthtech', rows[1]['id']))
+    entry = benchmarks.refresh(repo, 'fintech')
+    assert entry.values['overall_risk'] == [30, 40] and entry.rows == 2
+    assert benchmarks.refresh(repo, 'healthtech').values['overall_risk'] == [20]
+
+def test_ttl_reloads_rescored_values(repo):
+    user_id = create_user(repo)
+    benchmarks = PeerBenchmarks(ttl_seconds=-1) # Always expired
+    row = submit(repo, user_id, 10)
+    benchmarks.refresh(repo, 'fintech')
+    repo._write('UPDATE assessments SET overall_risk = ? WHERE id = ?', (70, row['id'])) # Same count, new value
+    assert benchmarks.refresh(repo, 'fintech').values['overall_risk'] == [70]
@@ -0,0 +1,27 @@
+import pytest
+
+from db_pool import ConnectionPool
+from repository import SqliteStorage, check_query_plans, HOT_QUERY_PLANS, ASSESSMENTS_SEARCH_QUERY
+
+@pytest.fixture
+def conn(tmp_path):
+    storage = SqliteStorage(ConnectionPool(str(tmp_path / 'test.db')))
+    storage.migrate()
+    with storage.session() as repo:
+        yield repo.conn
+
+def test_hot_queries_use_their_indexes(conn):
+    failures = [(query, plan) for query, plan, ok in check_query_plans(conn) if not ok]
+    assert failures == []
+
+def test_missing_index_fails(conn):
+    conn.execute('DROP INDEX idx_assessments_user_created')
+    failed = [query for query, _, ok in check_query_plans(conn) if not ok]
+    assert failed == [query for query, _, expected in HOT_QUERY_PLANS if expected == 'idx_assessments_user_created']
+
+def test_fts_plan_must_match_and_read_in_rowid_order(conn):
+    expected = next(step for query, _, step in HOT_QUERY_PLANS if query == ASSESSMENTS_SEARCH_QUERY)
+    # Without MATCH, or ordered by something else, FTS5 picks a different plan
+    unmatched = ('SELECT rowid FROM assessments_fts f WHERE f.rowid < ? ORDER BY f.rowid DESC LIMIT ?', (1, 25), expected)
+    sorted_by_rank = (ASSESSMENTS_SEARCH_QUERY.replace('ORDER BY f.rowid DESC', 'ORDER BY f.rank'), ('"x"', 1, 25), expected)
+    assert [ok for _, _, ok in check_query_plans(conn, [unmatched, sorted_by_rank])] == [False, False]
@@ -0,0 +1,115 @@
+import json
+
+from migrations import LATEST_VERSION, MIGRATIONS
+from repository import StorageError
+
+import pytest
+
+def assessment(project_name, description='A small project', industry='other', risk_level='Medium', score_version='v1'):
+    return {
+        "project_name": project_name, "industry": industry, "description": description, "budget": 100000,
+        "timeline": "12 months", "location": "country", "number_of_cofounders": 2, "technical_complexity": 5,
+        "total_expense": 50000, "total_revenue": 80000, "resumes_uploaded": 0, "overall_risk": 42.0,
+        "risk_level": risk_level, "z_score_analysis": json.dumps({"explanation": ""}), "score_version": score_version,
+    }
+
+def create_user(repo, email='ann@example.com'):
+    return repo.create_user('Ann', 'Lee', email, 'hash')
+
+def walk(list_page, limit):
+    """Every row of a paginated listing, checking no page repeats a row."""
+    rows, cursor, seen = [], None, set()
+    while True:
+        page, cursor = list_page(cursor=cursor, limit=limit)
+        assert len(page) <= limit
+        for row in page:
+            assert row['id'] not in seen
+            seen.add(row['id'])
+        rows.extend(page)
+        if cursor is None:
+            return rows
+
+def test_migrations_apply_once(storage):
+    assert storage.migrate() == [version for version, _, _ in MIGRATIONS]
+    assert storage.migrate() == []
+    with storage.session() as repo:
+        assert repo._one('SELECT MAX(version) AS version FROM schema_migrations')['version'] == LATEST_VERSION
+
+def test_users_and_organizations(repo):
+    user_id = create_user(repo)
+    assert repo.get_user(user_id)['email'] == 'ann@example.com'
+    assert repo.get_user_by_email('ann@example.com')['password_hash'] == 'hash'
+    with pytest.raises(StorageError):
+        create_user(repo) # email is UNIQUE
+    org_id = repo.create_organization(create_user(repo, 'org@example.com'), 'Solar Capital', 'org@example.com', 'Sam',
+                                      focus={"min_ticket": 1000.0, "max_ticket": None})
+    assert repo.organization_name_taken('Solar Capital') and not repo.organization_name_taken('Wind Capital')
+    assert not repo.is_organization(user_id)
+    assert [org['id'] for org in repo.organizations_since()] == [org_id]
+    assert repo.count_organizations() == 1
+
+def test_submissions_and_history_pages(repo):
+    user_id = create_user(repo)
+    other_id = create_user(repo, 'bob@example.com')
+    ids = repo.create_assessments([(user_id, assessment(f'Project {i}')) for i in range(23)])
+    repo.create_assessment(other_id, assessment('Not mine'))
+    latest_id = repo.create_assessment(user_id, assessment('Latest'))
+    ids.append(latest_id)
+
+    # Most rows share a created_at second, so the id tie-break decides the order across page boundaries
+    rows = walk(lambda **page: repo.list_assessments(user_id, **page), limit=5)
+    assert [row['id'] for row in rows] == sorted(ids, reverse=True)
+    assert repo.latest_assessment(user_id)['id'] == latest_id
+    assert repo.get_assessment(latest_id, other_id) is None
+    assert {row['id'] for row in repo.get_assessments(user_id, ids[:3])} == set(ids[:3])
+
+    stats = repo.assessment_stats(user_id)
+    assert stats['total'] == 25 and stats['user_total'] == 24 and stats['by_risk_level'] == {'Medium': 25}
+
+def test_search(repo):
+    user_id = create_user(repo)
+    matching = repo.create_assessments([
+        (user_id, assessment('Payments app', 'Mobile payments for shops')),
+        (user_id, assessment('Ledger', 'Instant payment settlement')),
+        (user_id, assessment('Solar farm', 'Rooftop panels')),
+        (user_id, assessment('Card payments', 'Payment terminals')),
+    ])
+    repo.create_assessment(create_user(repo, 'bob@example.com'), assessment('Payments too', 'Not this user'))
+    # Stemmed whole words, newest first, scoped to the user
+    rows = walk(lambda **page: repo.list_assessments(user_id, query='payment', **page), limit=2)
+    assert [row['id'] for row in rows] == [matching[3], matching[1], matching[0]]
+    assert len(repo.list_assessments(user_id, query='"payment*)')[0]) == 3 # FTS5 syntax in the input is ignored
+    assert repo.list_assessments(user_id, query='wind')[0] == []
+
+    owner = create_user(repo, 'org@example.com')
+    repo.create_organization(owner, 'Green Ventures', 'org@example.com', 'Pat Green')
+    assert [org['name'] for org in repo.list_organizations(query='green')[0]] == ['Green Ventures']
+
+def test_organization_pages(repo):
+    names = [f'Org {i:02d}' for i in range(11)]
+    for i, name in enumerate(reversed(names)):
+        repo.create_organization(create_user(repo, f'org{i}@example.com'), name, f'org{i}@example.com')
+    rows = walk(repo.list_organizations, limit=4)
+    assert [row['name'] for row in rows] == names
+    # Each organization's page cursor opens a directory page that starts with it
+    assert repo.organization_page_cursor('Org 00') is None
+    for name in ('Org 04', 'Org 10'):
+        page, _ = repo.list_organizations(repo.organization_page_cursor(name), limit=4)
+        assert page[0]['name'] == name
+
+def test_update_scores(repo):
+    user_id = create_user(repo)
+    ids = repo.create_assessments([(user_id, assessment(f'Project {i}', score_version='old')) for i in range(5)])
+    repo.create_assessment(user_id, assessment('Current', score_version='v2'))
+    assert repo.count_stale_assessments('v2') == 5
+
+    stale = repo.stale_assessments('v2', after_id=ids[1], limit=10)
+    assert [row['id'] for row in stale] == ids[2:]
+    assert stale[0]['budget'] == 100000 and stale[0]['timeline'] == '12 months'
+
+    repo.update_scores([(80, 'High', json.dumps({"explanation": "x"}), 'v2', row['id']) for row in stale])
+    assert repo.count_stale_assessments('v2') == 2
+    assert repo.get_assessment(ids[4], user_id)['risk_level'] == 'High'
+    # The counters follow the updated risk levels
+    assert repo.assessment_stats()['by_risk_level'] == {'Medium': 3, 'High': 3}
+    assert repo.rebuild_assessment_stats() == {}
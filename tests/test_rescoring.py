@@ -0,0 +1,39 @@
+import sqlite3
+
+from rescoring import init_rescoring_schema, rescore_assessments
+from risk_rules import get_ruleset
+
+from test_repository import assessment, create_user
+
+def jobs_database(tmp_path):
+    path = str(tmp_path / 'jobs.db')
+    conn = sqlite3.connect(path)
+    init_rescoring_schema(conn)
+    conn.close()
+    return path
+
+def test_rescore_assessments(repo, storage, tmp_path):
+    user_id = create_user(repo)
+    ids = repo.create_assessments([(user_id, assessment(f'Project {i}', score_version='old')) for i in range(7)])
+    job = rescore_assessments(jobs_database(tmp_path), storage, chunk_size=3, pause=0)
+    assert job['status'] == 'completed' and job['rows_done'] == job['rows_total'] == 7
+    assert repo.count_stale_assessments(get_ruleset().version) == 0
+    assert repo.get_assessment(ids[0], user_id)['score_version'] == get_ruleset().version
+
+def test_rescoring_stops_when_its_lease_is_taken_over(repo, storage, tmp_path):
+    user_id = create_user(repo)
+    repo.create_assessments([(user_id, assessment(f'Project {i}', score_version='old')) for i in range(7)])
+    database = jobs_database(tmp_path)
+    chunks = []
+    def take_over(job):
+        chunks.append(job['rows_done'])
+        conn = sqlite3.connect(database)
+        conn.execute("UPDATE rescoring_jobs SET owner = 'other-worker'") # As if this worker's lease had expired
+        conn.commit()
+        conn.close()
+
+    assert rescore_assessments(database, storage, chunk_size=3, pause=0, progress=take_over) is None
+    assert chunks == [3] # Stopped after the chunk that found the lease gone, without writing its progress
+    conn = sqlite3.connect(database)
+    assert conn.execute('SELECT status, owner, rows_done FROM rescoring_jobs').fetchone() == ('running', 'other-worker', 3)
+    conn.close()
@@ -0,0 +1,134 @@
+import itertools
+
+import numpy as np
+import pytest
+
+import risk_rules
+from risk_calculator import calculate_better_risk_assessment, calculate_risk_assessment_batch
+
+# Inputs at and around every threshold the rules and bands use, plus values off the maps
+BUDGETS = [0, 1, 40000, 50000, 79999, 80000, 100000, 125000, 1000000]
+REVENUES = [0, 1, 25000, 33333, 100000]
+EXPENSES = [0, 1, 50000, 60000, 80000, 80001, 90000, 100000, 150000, 200000]
+TIMELINES = ["1-3months", "3-6months", "6-12months", "1-2years", "2+years", ""]
+LOCATIONS = ["local", "country", "global", "mars"]
+COFOUNDERS = [0, 1, 2, 3, 4, 6]
+COMPLEXITIES = [1, 2, 3, 4, 5, 6, 7, 8, 10]
+
+def original_risk_assessment(data):
+    """calculate_better_risk_assessment as it was before the rules moved into risk_rules.py."""
+    budget = data.get("budget", 0)
+    timeline_months = {"1-3months": 2, "3-6months": 4.5, "6-12months": 9, "1-2years": 18, "2+years": 30}.get(data.get("timeline", ""), 8)
+    location_score = {"local": 1, "country": 2, "global": 3}.get(data.get("location", ""), 2)
+    cofounders = data.get("number_of_cofounders", 0)
+    complexity = data.get("technical_complexity", 5)
+    revenue = data.get("total_revenue", 0)
+    expense = data.get("total_expense", 0)
+
+    if revenue == 0 and expense > budget * 0.8:
+        return ("High", 95, "No revenue but expenses exceed 80% of budget. Critical financial risk.")
+    if revenue > 0 and expense > 3 * revenue:
+        return ("High", 90, "Expenses are more than triple the revenue, indicating severe financial strain.")
+    if cofounders == 1 and complexity >= 8:
+        return ("High", 85, "Single founder with very high technical complexity poses significant execution risk.")
+    if budget < expense * 0.5:
+        return ("High", 80, "Budget is less than half of expected expenses. Insufficient funding risk.")
+
+    risk_score = 0
+    if revenue > 0:
+        profit_margin = (revenue - expense) / revenue
+        if profit_margin < -0.5:
+            risk_score += 30
+        elif profit_margin < 0:
+            risk_score += 20
+        elif profit_margin < 0.1:
+            risk_score += 10
+        elif profit_margin < 0.2:
+            risk_score += 5
+    else:
+        if expense > 0:
+            risk_score += 25
+        if expense > budget * 0.6:
+            risk_score += 15
+    if budget > 0:
+        budget_coverage = budget / (expense + 1)
+        if budget_coverage < 0.5:
+            risk_score += 20
+        elif budget_coverage < 0.8:
+            risk_score += 10
+        elif budget_coverage < 1.0:
+            risk_score += 5
+    if timeline_months > 24:
+        risk_score += 8
+    elif timeline_months > 18:
+        risk_score += 5
+    elif timeline_months > 12:
+        risk_score += 3
+    elif timeline_months < 3:
+        risk_score += 5
+    if location_score == 3:
+        risk_score += 4
+    elif location_score == 2:
+        risk_score += 3
+    else:
+        risk_score += 2
+    if cofounders == 1:
+        risk_score += 8
+    elif cofounders == 2:
+        risk_score += 3
+    elif cofounders >= 4:
+        risk_score += 2
+    if complexity >= 8:
+        risk_score += 15
+    elif complexity >= 6:
+        risk_score += 10
+    elif complexity >= 4:
+        risk_score += 6
+    elif complexity <= 2:
+        risk_score += 3
+
+    if risk_score >= 75:
+        return ("High", min(100, risk_score), "High overall risk due to a combination of financial, scope, and execution challenges.")
+    elif risk_score >= 45:
+        return ("Medium", min(100, risk_score), "Moderate risk, with some areas requiring attention in funding or project execution.")
+    return ("Low", min(100, risk_score), "Overall low risk, indicating a well-planned project with manageable challenges.")
+
+@pytest.fixture(autouse=True)
+def default_ruleset(monkeypatch):
+    # Compare against DEFAULT_RULESET, whatever RISK_RULESET_PATH the environment sets
+    monkeypatch.setattr(risk_rules, 'RISK_RULESET_PATH', None)
+    monkeypatch.setattr(risk_rules, '_active_ruleset', risk_rules.CompiledRuleset(risk_rules.DEFAULT_RULESET))
+
+def grid():
+    return [
+        {"budget": budget, "total_revenue": revenue, "total_expense": expense, "timeline": timeline,
+         "location": location, "number_of_cofounders": cofounders, "technical_complexity": complexity}
+        for budget, revenue, expense, timeline, location, cofounders, complexity in itertools.product(
+            BUDGETS, REVENUES, EXPENSES, TIMELINES, LOCATIONS, COFOUNDERS, COMPLEXITIES)
+    ]
+
+def test_scalar_matches_original():
+    for data in grid():
+        result = calculate_better_risk_assessment(data)
+        assert (result["risk_level"], result["risk_score"], result["explanation"]) == original_risk_assessment(data), data
+
+def test_batch_matches_original():
+    rows = grid()
+    columns = {key: [row[key] for row in rows] for key in rows[0]}
+    results = calculate_risk_assessment_batch(
+        columns["budget"], columns["timeline"], columns["location"], columns["number_of_cofounders"],
+        columns["technical_complexity"], columns["total_revenue"], columns["total_expense"],
+    )
+    expected = [original_risk_assessment(row) for row in rows]
+    assert results["risk_level"].tolist() == [level for level, _, _ in expected]
+    assert np.array_equal(results["risk_score"], [score for _, score, _ in expected])
+    assert [results["explanations"][code] for code in results["explanation_code"]] == [reason for _, _, reason in expected]
+
+def test_batch_broadcasts_scalar_columns():
+    budgets = np.array(BUDGETS)
+    results = calculate_risk_assessment_batch(budgets, "1-2years", "global", 2, 5, 100000, 80000)
+    for i, budget in enumerate(BUDGETS):
+        data = {"budget": budget, "timeline": "1-2years", "location": "global", "number_of_cofounders": 2,
+                "technical_complexity": 5, "total_revenue": 100000, "total_expense": 80000}
+        level, score, reason = original_risk_assessment(data)
+        assert (results["risk_level"][i], results["risk_score"][i], results["explanations"][results["explanation_code"][i]]) == (level, score, reason)
@@ -0,0 +1,46 @@
+import copy
+import json
+
+import pytest
+
+import risk_rules
+from risk_rules import CompiledRuleset, DEFAULT_RULESET
+
+def ruleset_with(version, **changes):
+    spec = copy.deepcopy(DEFAULT_RULESET)
+    spec["version"] = version
+    for path, value in changes.items():
+        target = spec
+        *keys, last = path.split("__")
+        for key in keys:
+            target = target[int(key) if isinstance(target, list) else key]
+        target[int(last) if isinstance(target, list) else last] = value
+    return spec
+
+@pytest.fixture
+def ruleset_file(tmp_path, monkeypatch):
+    path = tmp_path / "ruleset.json"
+    monkeypatch.setattr(risk_rules, 'RISK_RULESET_PATH', str(path))
+    monkeypatch.setattr(risk_rules, '_active_ruleset', CompiledRuleset(DEFAULT_RULESET))
+    monkeypatch.setattr(risk_rules, '_loaded_mtime', None)
+    return path
+
+@pytest.mark.parametrize("value", [float("inf"), float("-inf"), float("nan")])
+def test_non_finite_operands_are_rejected(value):
+    with pytest.raises(ValueError):
+        CompiledRuleset(ruleset_with("bad", hard_rules__0__when=[["expense", ">", ["budget", value]]]))
+    with pytest.raises(ValueError):
+        CompiledRuleset(ruleset_with("bad", factors__complexity__0={"upto": value, "points": 3}))
+
+def test_reload_keeps_the_active_ruleset_when_the_file_is_invalid(ruleset_file):
+    ruleset_file.write_text(json.dumps(ruleset_with("2025.2")))
+    assert risk_rules.reload_ruleset(force=True).version == "2025.2"
+
+    # json writes (and reads) non-finite floats as Infinity/NaN
+    ruleset_file.write_text(json.dumps(ruleset_with("2025.3", hard_rules__0__when=[["expense", ">", float("inf")]])))
+    active = risk_rules.reload_ruleset(force=True)
+    assert active.version == "2025.2"
+    assert active.evaluate({"budget": 1000, "total_expense": 10})["risk_level"] in ("Low", "Medium", "High")
+
+    ruleset_file.write_text("{not json")
+    assert risk_rules.reload_ruleset(force=True).version == "2025.2"
@@ -0,0 +1,80 @@
+import threading
+from contextlib import contextmanager
+
+import pytest
+
+from repository import StorageError
+from write_behind import AssessmentWriter, WriteQueueFull
+
+from test_repository import assessment, create_user
+
+class GatedStorage:
+    """Wraps a storage so each session waits for `open` to be set, holding the writer thread mid-batch."""
+    def __init__(self, storage):
+        self.storage = storage
+        self.open = threading.Event()
+        self.waiting = threading.Event()
+
+    @contextmanager
+    def session(self):
+        self.waiting.set()
+        self.open.wait(5)
+        with self.storage.session() as repo:
+            yield repo
+
+def test_burst_shares_one_batch(repo, storage):
+    user_id = create_user(repo)
+    gated = GatedStorage(storage)
+    writer = AssessmentWriter(gated, max_rows=64, max_wait_ms=0)
+    first = writer.submit(user_id, assessment('Project 0'))
+    assert gated.waiting.wait(2) # The writer holds the first row while the rest queue up
+    futures = [writer.submit(user_id, assessment(f'Project {i}')) for i in range(1, 20)]
+    gated.open.set()
+    ids = [future.result(5) for future in [first, *futures]]
+    assert writer.stats()["batches"] == 2 and writer.stats()["rows"] == 20 # The first row alone, then the 19 queued behind it
+    assert sorted(row['project_name'] for row in repo.get_assessments(user_id, ids, 'project_name')) == \
+        sorted(f'Project {i}' for i in range(20))
+
+def test_failed_batch_is_retried_row_by_row(repo, storage):
+    user_id = create_user(repo)
+    gated = GatedStorage(storage)
+    writer = AssessmentWriter(gated, max_rows=64, max_wait_ms=0)
+    writer.submit(user_id, assessment('Warm-up'))
+    assert gated.waiting.wait(2)
+    bad = dict(assessment('Bad'), project_name=None) # Violates NOT NULL, failing its batch
+    futures = [writer.submit(user_id, assessment(f'Project {i}')) for i in range(10)]
+    futures.insert(5, writer.submit(user_id, bad))
+    gated.open.set()
+
+    with pytest.raises(StorageError):
+        futures[5].result(5)
+    ids = [future.result(5) for i, future in enumerate(futures) if i != 5]
+    assert len(set(ids)) == 10 and len(repo.get_assessments(user_id, ids)) == 10
+    assert writer.stats()["rows"] == 11 # The warm-up row plus the ten good ones
+
+def test_ack_timeout_and_queue_limit(repo, storage):
+    user_id = create_user(repo)
+    gated = GatedStorage(storage)
+    writer = AssessmentWriter(gated, max_rows=64, max_wait_ms=0, queue_limit=2)
+    # The writer takes the row and then waits on the gate, so the caller gives up waiting for its ack
+    with pytest.raises(StorageError):
+        writer.create_assessment(user_id, assessment('Slow'), timeout=0.05)
+    assert gated.waiting.is_set()
+    queued = [writer.submit(user_id, assessment(f'Queued {i}')) for i in range(2)]
+    with pytest.raises(WriteQueueFull):
+        writer.submit(user_id, assessment('Refused'))
+
+    gated.open.set()
+    assert all(future.result(5) for future in queued)
+    # A timed-out submission may still commit; it did here, once the gate opened
+    assert sorted(row['project_name'] for row in repo.list_assessments(user_id)[0]) == ['Queued 0', 'Queued 1', 'Slow']
+
+def test_forked_process_starts_its_own_writer(repo, storage):
+    user_id = create_user(repo)
+    writer = AssessmentWriter(storage)
+    assert writer.create_assessment(user_id, assessment('Parent'))
+    parent_queue = writer._queue
+    writer._pid = -1 # As seen from a forked child: the queue and its thread belong to the parent
+    assert writer.create_assessment(user_id, assessment('Child'))
+    assert writer._queue is not parent_queue
+    assert sum(thread.name == "assessment-writer" and thread.is_alive() for thread in threading.enumerate()) >= 2
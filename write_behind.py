@@ -0,0 +1,123 @@
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from repository import StorageError
+
+WRITE_BEHIND_ENABLED = os.getenv('WRITE_BEHIND_ENABLED', '0') == '1' # Batch assessment submissions into shared transactions
+WRITE_BATCH_MAX_ROWS = int(os.getenv('WRITE_BATCH_MAX_ROWS', 64)) # A batch is written once it has this many rows...
+WRITE_BATCH_MAX_WAIT_MS = float(os.getenv('WRITE_BATCH_MAX_WAIT_MS', 0)) # ...or this long after its first row arrived
+WRITE_QUEUE_LIMIT = int(os.getenv('WRITE_QUEUE_LIMIT', 1000)) # Submissions waiting per worker process before new ones are refused
+WRITE_ACK_TIMEOUT = 30 # Seconds a request waits for its batch to commit
+
+class WriteQueueFull(Exception):
+    """Raised when WRITE_QUEUE_LIMIT submissions are already waiting in this worker."""
+
+class AssessmentWriter:
+    """
+    Write-behind queue for new assessments. Request threads queue their insert and wait; one
+    writer thread per worker process takes the first waiting insert, gathers more until it has
+    max_rows or max_wait_ms has passed, and commits them all in one transaction. Under a burst,
+    hundreds of submissions share a handful of commits (and SQLite write locks) instead of taking
+    one each. Each caller is answered only after its batch commits.
+
+    With max_wait_ms=0 (the default) a batch is whatever queued up while the previous one was
+    committing, so batches grow with load and a lone submission isn't delayed. A few milliseconds
+    of wait only pays off where a commit costs more than that, e.g. an fsync on slow disks or a
+    round trip to a remote PostgreSQL.
+
+    If a batch fails, its rows are retried one at a time, so one bad row doesn't fail the others.
+    The thread starts on first use, and again in a forked process.
+    """
+
+    def __init__(self, storage, max_rows=WRITE_BATCH_MAX_ROWS, max_wait_ms=WRITE_BATCH_MAX_WAIT_MS,
+                 queue_limit=WRITE_QUEUE_LIMIT):
+        self.storage = storage
+        self.max_rows = max_rows
+        self.max_wait = max_wait_ms / 1000
+        self.queue_limit = queue_limit
+        self._lock = threading.Lock()
+        self._queue = None
+        self._pid = None
+        self._batches = 0
+        self._rows = 0
+
+    def _pending(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                # A queue inherited from the parent has no writer thread in this process
+                self._queue = queue.Queue(maxsize=self.queue_limit)
+                self._pid = os.getpid()
+                threading.Thread(target=self._run, args=(self._queue,), name="assessment-writer", daemon=True).start()
+            return self._queue
+
+    def submit(self, user_id, values):
+        """
+        Queues an assessment insert (see Repository.create_assessment) and returns a Future of its
+        id. Raises WriteQueueFull when WRITE_QUEUE_LIMIT inserts are already waiting.
+        """
+        future = Future()
+        try:
+            self._pending().put_nowait((user_id, values, future))
+        except queue.Full:
+            raise WriteQueueFull()
+        return future
+
+    def create_assessment(self, user_id, values, timeout=WRITE_ACK_TIMEOUT):
+        """Queues an insert and returns its id once its batch has committed. Raises StorageError if it wasn't stored."""
+        try:
+            return self.submit(user_id, values).result(timeout)
+        except FutureTimeout:
+            # Still queued or being written, so it may yet commit
+            raise StorageError(f"Timed out after {timeout}s waiting for the assessment batch to commit")
+
+    def _run(self, pending):
+        while True:
+            batch = [pending.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_rows:
+                try:
+                    remaining = deadline - time.monotonic()
+                    batch.append(pending.get(timeout=remaining) if remaining > 0 else pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except Exception as e: # Keep the thread alive; every caller in the batch gets the error
+                print(f"Error writing assessment batch: {e}")
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _write(self, batch):
+        with self.storage.session() as repo:
+            try:
+                ids = repo.create_assessments([(user_id, values) for user_id, values, _ in batch])
+            except StorageError as e:
+                if len(batch) == 1:
+                    raise
+                print(f"Assessment batch of {len(batch)} failed ({e}); writing its rows one at a time")
+                ids = None
+            if ids is not None:
+                self._count(1, len(batch))
+                for (_, _, future), assessment_id in zip(batch, ids):
+                    future.set_result(assessment_id)
+                return
+            for user_id, values, future in batch:
+                try:
+                    future.set_result(repo.create_assessment(user_id, values))
+                    self._count(1, 1)
+                except StorageError as e:
+                    future.set_exception(e)
+
+    def _count(self, batches, rows):
+        with self._lock:
+            self._batches += batches
+            self._rows += rows
+
+    def stats(self):
+        with self._lock:
+            return {"batches": self._batches, "rows": self._rows,
+                    "queued": self._queue.qsize() if self._queue is not None else 0}